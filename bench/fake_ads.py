@@ -0,0 +1,426 @@
+"""
+fake_ads.py – offline stand-in for GoogleAdsClient / GoogleAdsService
+
+Answers any GAQL query with synthetic rows built from the real GoogleAdsRow
+protos (so proto-plus access, `_pb`, enums and the flattener all behave as in
+production), with configurable sizes, latency and injected failures. Calls slower than
+their gRPC `timeout` raise DeadlineExceeded after it, as the real API does.
+
+    client = FakeGoogleAdsClient(FakeAdsConfig(accounts=1000, latency=0.05))
+    leaves = list_leaf_accounts(client, client.root_cid, refresh=True)
+
+Row shapes:
+  • customer_client        synthetic MCC tree (root → sub-managers → leaves)
+  • conversion_action      `actions_per_account` rows per account
+  • customer               one row
+  • anything else          `metric_rows` rows (capped by LIMIT)
+Every SELECT field is filled with a deterministic value for its proto type.
+"""
+
+import asyncio
+import hashlib
+import importlib
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from google.api_core import exceptions
+from google.protobuf.descriptor import FieldDescriptor
+
+from packages.google_ads_kpi.catalog import api_version
+from packages.google_ads_kpi.query import select_fields
+
+VERSION = api_version()
+_services = importlib.import_module(
+    f"google.ads.googleads.{VERSION}.services.types.google_ads_service"
+)
+_errors = importlib.import_module(f"google.ads.googleads.{VERSION}.errors.types.errors")
+_field = importlib.import_module(
+    f"google.ads.googleads.{VERSION}.resources.types.google_ads_field"
+)
+GoogleAdsRow = _services.GoogleAdsRow
+
+_FROM_RE = re.compile(r"\bFROM\s+(\w+)", re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)", re.IGNORECASE)
+_LEVEL_RE = re.compile(r"customer_client\.level\s*<=\s*(\d+)")
+
+
+@dataclass
+class FakeAdsConfig:
+    accounts: int = 100              # leaf accounts
+    sub_managers: int = 10           # managers below the root
+    actions_per_account: int = 20    # conversion_action rows per account
+    metric_rows: int = 1_000         # rows for any other resource
+    latency: float = 0.05            # median seconds per call
+    latency_jitter: float = 0.5      # lognormal sigma (0 = fixed latency)
+    account_skew: float = 0.0        # lognormal sigma of a stable per-account slowdown
+    row_latency: float = 0.0         # extra seconds per 1,000 rows returned
+    error_rate: float = 0.0          # share of calls raising ServiceUnavailable
+    quota_error_rate: float = 0.0    # share of calls raising a quota error
+    quota_retry_delay: float = 1.0   # retry_delay carried by quota errors
+    dead_rate: float = 0.0           # share of leaves failing with CUSTOMER_NOT_ENABLED
+    batch_size: int = 10_000         # rows per search_stream batch
+    seed: int = 0
+
+
+@dataclass
+class FakeStats:
+    calls: dict = field(default_factory=dict)       # resource -> count
+    latency: dict = field(default_factory=dict)     # (cid, resource) -> seconds
+    rows: int = 0
+    errors: int = 0
+    quota_errors: int = 0
+    account_errors: int = 0
+    channels: int = 0                               # get_service() calls
+
+
+def _stable(*parts) -> int:
+    return int(hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:12], 16)
+
+
+class FakeGoogleAdsService:
+    def __init__(self, client: "FakeGoogleAdsClient"):
+        self._client = client
+        self.config = client.config
+
+    # ── GoogleAdsService surface ───────────────────────────────────────────
+    def search(self, customer_id, query, retry=None, timeout=None, **kwargs):
+        call = lambda: self._respond(customer_id, query, timeout)
+        rows = retry(call)() if retry is not None else call()
+        return iter(rows)
+
+    def search_stream(self, customer_id, query, retry=None, timeout=None, **kwargs):
+        call = lambda: self._respond(customer_id, query, timeout)
+        rows = retry(call)() if retry is not None else call()
+        size = self.config.batch_size
+        return iter(
+            _services.SearchGoogleAdsStreamResponse(results=rows[i:i + size])
+            for i in range(0, len(rows), size)
+        )
+
+    # ── internals ──────────────────────────────────────────────────────────
+    def _respond(self, customer_id: str, query: str, timeout=None) -> list:
+        start = time.perf_counter()
+        rows, resource, delay = self._prepare(customer_id, query)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise exceptions.DeadlineExceeded("fake: deadline exceeded")
+        time.sleep(delay)
+        self._client._record_rows(customer_id, resource, len(rows), time.perf_counter() - start)
+        return rows
+
+    def _prepare(self, customer_id: str, query: str) -> tuple[list, str, float]:
+        """(rows, resource, simulated latency); raises the injected errors."""
+        cfg = self.config
+        resource = _FROM_RE.search(query).group(1)
+        self._client._record(resource)
+        if resource != "customer_client" and self._client.is_dead(customer_id):
+            self._client._record_error(quota=False, account=True)
+            raise self._client.account_exception()
+
+        roll = self._client._random()
+        if roll < cfg.error_rate:
+            self._client._record_error(quota=False)
+            raise exceptions.ServiceUnavailable("fake: backend unavailable")
+        if roll < cfg.error_rate + cfg.quota_error_rate:
+            self._client._record_error(quota=True)
+            raise self._client.quota_exception()
+
+        rows = self._rows(customer_id, resource, query)
+        delay = cfg.latency * self._client.slowdown(customer_id) * (
+            self._client._lognormal(cfg.latency_jitter) if cfg.latency_jitter else 1.0
+        )
+        return rows, resource, delay + cfg.row_latency * len(rows) / 1000
+
+    def _rows(self, customer_id: str, resource: str, query: str) -> list:
+        if resource == "customer_client":
+            limit = _LEVEL_RE.search(query)
+            return self._client.tree_rows(customer_id, int(limit.group(1)) if limit else None)
+
+        if resource == "conversion_action":
+            count = self.config.actions_per_account
+        elif resource == "customer":
+            count = 1
+        else:
+            count = self.config.metric_rows
+        limit = _LIMIT_RE.search(query)
+        if limit:
+            count = min(count, int(limit.group(1)))
+
+        fields = select_fields(query)
+        return [
+            _synthetic_row(fields, _stable(self.config.seed, customer_id, resource, i))
+            for i in range(count)
+        ]
+
+
+class FakeAsyncGoogleAdsService(FakeGoogleAdsService):
+    """`get_service(…, is_async=True)`: awaits the simulated latency."""
+
+    async def search(self, customer_id, query, retry=None, timeout=None, **kwargs):
+        rows = await self._respond_async(customer_id, query, timeout)
+        return _AsyncRows(rows)
+
+    def search_stream(self, customer_id, query, retry=None, timeout=None, **kwargs):
+        return self._stream(customer_id, query, timeout)
+
+    async def _stream(self, customer_id, query, timeout):
+        rows = await self._respond_async(customer_id, query, timeout)
+        size = self.config.batch_size
+        for i in range(0, len(rows), size):
+            yield _services.SearchGoogleAdsStreamResponse(results=rows[i:i + size])
+
+    async def _respond_async(self, customer_id: str, query: str, timeout=None) -> list:
+        start = time.perf_counter()
+        rows, resource, delay = self._prepare(customer_id, query)
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise exceptions.DeadlineExceeded("fake: deadline exceeded")
+        await asyncio.sleep(delay)
+        self._client._record_rows(customer_id, resource, len(rows), time.perf_counter() - start)
+        return rows
+
+
+class _AsyncRows:
+    """Stand-in for SearchAsyncPager."""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def __aiter__(self):
+        for row in self._rows:
+            yield row
+
+
+class FakeGoogleAdsFieldService:
+    def __init__(self, client: "FakeGoogleAdsClient"):
+        self._client = client
+
+    def search_google_ads_fields(self, query=None, **kwargs):
+        self._client._record("google_ads_field")
+        time.sleep(self._client.config.latency)
+        return list(self._client.field_catalog())
+
+
+class FakeGoogleAdsClient:
+    """Drop-in for GoogleAdsClient as far as this repo uses it."""
+
+    def __init__(self, config: FakeAdsConfig | None = None):
+        self.config = config or FakeAdsConfig()
+        self.stats = FakeStats()
+        self.root_cid = "1000000000"
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._tree = self._build_tree()
+        self._catalog = None
+
+    def get_service(self, name: str, version=None, is_async: bool = False, **kwargs):
+        self.stats.channels += 1                    # the real client opens a channel here
+        if name == "GoogleAdsService":
+            return (FakeAsyncGoogleAdsService if is_async else FakeGoogleAdsService)(self)
+        if name == "GoogleAdsFieldService":
+            return FakeGoogleAdsFieldService(self)
+        raise ValueError(f"fake client has no {name}")
+
+    # ── synthetic MCC ──────────────────────────────────────────────────────
+    def _build_tree(self) -> dict[str, list[tuple[str, str, bool]]]:
+        """{manager_cid: [(child_cid, name, is_manager), …]}"""
+        cfg = self.config
+        managers = [self.root_cid] + [str(2000000000 + i) for i in range(cfg.sub_managers)]
+        tree = {m: [] for m in managers}
+        for i, mgr in enumerate(managers[1:]):
+            parent = managers[i // 4]          # up to 4 sub-managers per manager
+            tree[parent].append((mgr, f"Sub-manager {i}", True))
+        for j in range(cfg.accounts):
+            tree[managers[j % len(managers)]].append(
+                (str(3000000000 + j), f"Account {j}", False)
+            )
+        return tree
+
+    def leaf_cids(self) -> list[str]:
+        return [c for kids in self._tree.values() for c, _, m in kids if not m]
+
+    def tree_rows(self, cid: str, max_level: int | None) -> list:
+        rows = []
+
+        def _add(child, name, manager, level):
+            row = GoogleAdsRow()
+            cc = row.customer_client
+            cc.client_customer = f"customers/{child}"
+            cc.descriptive_name = name
+            cc.manager = manager
+            cc.level = level
+            rows.append(row)
+
+        def _walk(mgr, level):
+            if max_level is not None and level > max_level:
+                return
+            for child, name, manager in self._tree.get(mgr, ()):
+                _add(child, name, manager, level)
+                if manager:
+                    _walk(child, level + 1)
+
+        _add(cid, f"Manager {cid}", cid in self._tree, 0)
+        _walk(cid, 1)
+        return rows
+
+    def slowdown(self, cid: str) -> float:
+        """Stable latency factor of `cid` (big accounts stay slow across runs)."""
+        if not self.config.account_skew:
+            return 1.0
+        rng = random.Random(_stable("skew", self.config.seed, cid))
+        return rng.lognormvariate(0.0, self.config.account_skew)
+
+    # ── errors ─────────────────────────────────────────────────────────────
+    def is_dead(self, cid: str) -> bool:
+        """Stable per account: the same leaves fail on every call and run."""
+        return _stable("dead", self.config.seed, cid) % 10_000 < self.config.dead_rate * 10_000
+
+    def quota_exception(self):
+        return _ads_exception(
+            _errors.ErrorCode(quota_error="RESOURCE_EXHAUSTED"),
+            "fake: too many requests",
+            _errors.ErrorDetails(
+                quota_error_details=_errors.QuotaErrorDetails(
+                    retry_delay={"seconds": int(self.config.quota_retry_delay)}
+                )
+            ),
+        )
+
+    def account_exception(self):
+        return _ads_exception(
+            _errors.ErrorCode(authorization_error="CUSTOMER_NOT_ENABLED"),
+            "fake: the customer account can't be accessed because it is not yet enabled",
+        )
+
+    # ── field catalog ──────────────────────────────────────────────────────
+    def field_catalog(self):
+        if self._catalog is None:
+            self._catalog = list(_catalog_from_row())
+        return self._catalog
+
+    # ── thread-safe bookkeeping ────────────────────────────────────────────
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _lognormal(self, sigma: float) -> float:
+        with self._lock:
+            return self._rng.lognormvariate(0.0, sigma)
+
+    def _record(self, resource: str) -> None:
+        with self._lock:
+            self.stats.calls[resource] = self.stats.calls.get(resource, 0) + 1
+
+    def _record_rows(self, cid: str, resource: str, n: int, seconds: float) -> None:
+        with self._lock:
+            self.stats.rows += n
+            self.stats.latency[(cid, resource)] = seconds
+
+    def _record_error(self, quota: bool, account: bool = False) -> None:
+        with self._lock:
+            if account:
+                self.stats.account_errors += 1
+            elif quota:
+                self.stats.quota_errors += 1
+            else:
+                self.stats.errors += 1
+
+
+def _ads_exception(error_code, message: str, details=None):
+    from google.ads.googleads.errors import GoogleAdsException
+
+    failure = _errors.GoogleAdsFailure(
+        errors=[_errors.GoogleAdsError(error_code=error_code, message=message, details=details)]
+    )
+    return GoogleAdsException(None, None, failure, "fake-request")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Synthetic values
+# ──────────────────────────────────────────────────────────────────────────────
+_INTS = {
+    FieldDescriptor.TYPE_INT32, FieldDescriptor.TYPE_INT64,
+    FieldDescriptor.TYPE_UINT32, FieldDescriptor.TYPE_UINT64,
+    FieldDescriptor.TYPE_SINT32, FieldDescriptor.TYPE_SINT64,
+    FieldDescriptor.TYPE_FIXED32, FieldDescriptor.TYPE_FIXED64,
+}
+_FLOATS = {FieldDescriptor.TYPE_DOUBLE, FieldDescriptor.TYPE_FLOAT}
+
+
+def _value(fd: FieldDescriptor, seed: int):
+    if fd.type == FieldDescriptor.TYPE_ENUM:
+        values = [v.number for v in fd.enum_type.values if v.number >= 2]
+        return values[seed % len(values)] if values else 0
+    if fd.type in _INTS:
+        return seed % 100_000
+    if fd.type in _FLOATS:
+        return (seed % 1_000_000) / 100.0
+    if fd.type == FieldDescriptor.TYPE_BOOL:
+        return bool(seed & 1)
+    if fd.type == FieldDescriptor.TYPE_STRING:
+        if fd.name == "date":
+            return f"2024-01-{seed % 28 + 1:02d}"
+        return f"{fd.name}_{seed % 10_000}"
+    return None
+
+
+def _synthetic_row(fields, seed: int):
+    row = GoogleAdsRow()
+    pb = row._pb
+    for n, path in enumerate(fields):
+        target, descriptor, fd = pb, pb.DESCRIPTOR, None
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            fd = descriptor.fields_by_name.get(part) or descriptor.fields_by_name.get(part + "_")
+            if fd is None:
+                break
+            if i < len(parts) - 1:
+                target, descriptor = getattr(target, fd.name), fd.message_type
+        if fd is None or fd.label == FieldDescriptor.LABEL_REPEATED:
+            continue
+        value = _value(fd, _stable(seed, n))
+        if value is not None:
+            setattr(target, fd.name, value)
+    return row
+
+
+def _catalog_from_row(max_depth: int = 3):
+    """GoogleAdsField entries for every scalar path reachable from GoogleAdsRow."""
+    categories = {"metrics": "METRIC", "segments": "SEGMENT"}
+
+    def _walk(descriptor, prefix, depth, category):
+        for fd in descriptor.fields:
+            name = fd.name.rstrip("_")
+            path = f"{prefix}.{name}" if prefix else name
+            if fd.type == FieldDescriptor.TYPE_MESSAGE:
+                if depth < max_depth:
+                    yield from _walk(fd.message_type, path, depth + 1, category)
+                continue
+            yield _field.GoogleAdsField(
+                name=path,
+                category=category,
+                selectable=True,
+                filterable=True,
+                sortable=fd.label != FieldDescriptor.LABEL_REPEATED,
+                is_repeated=fd.label == FieldDescriptor.LABEL_REPEATED,
+            )
+
+    fields, resources = [], []
+    for top in GoogleAdsRow.pb().DESCRIPTOR.fields:
+        category = categories.get(top.name, "ATTRIBUTE")
+        if category == "ATTRIBUTE":
+            resources.append(top.name)
+        fields.extend(_walk(top.message_type, top.name, 1, category))
+
+    # permissive: every resource is selectable with every other one and with
+    # all metrics and segments
+    compatible = resources + [f.name for f in fields if f.category.name != "ATTRIBUTE"]
+    for name in resources:
+        yield _field.GoogleAdsField(
+            name=name, category="RESOURCE", selectable=False,
+            filterable=False, sortable=False, selectable_with=compatible,
+        )
+    yield from fields
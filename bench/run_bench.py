@@ -0,0 +1,216 @@
+"""
+run_bench.py – offline benchmarks for the KPI pipeline (no credentials)
+
+Runs the real code paths against bench.fake_ads and reports throughput,
+per-KPI latency and memory:
+
+  • hierarchy  – resolve_hierarchy from the root (cold, no disk cache)
+  • scan       – run_kpi_all's pipeline: scan_accounts + streamed report
+                 (--async: scan_accounts_async on one event loop)
+  • showcase   – show_data.build_showcase for one account
+
+    python -m bench.run_bench --accounts 1000 --workers 8 --latency 0.05
+    python -m bench.run_bench --scenario scan --error-rate 0.01 --json out.json
+    python -m bench.run_bench --memory      # extra tracemalloc pass per scenario
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.fake_ads import FakeAdsConfig, FakeGoogleAdsClient
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Scenarios – each takes a fresh fake client and returns a result dict
+# ──────────────────────────────────────────────────────────────────────────────
+def bench_hierarchy(client, args) -> dict:
+    from packages.google_ads_kpi.hierarchy import list_leaf_accounts
+
+    start = time.perf_counter()
+    leaves = list_leaf_accounts(client, client.root_cid, refresh=True)
+    elapsed = time.perf_counter() - start
+    return {"accounts": len(leaves), "seconds": round(elapsed, 3)}
+
+
+def bench_scan(client, args) -> dict:
+    from packages.google_ads_kpi.metrics import RECORDER
+    from packages.google_ads_kpi.report import open_table
+    from packages.google_ads_kpi.timeouts import POLICY, RUN_DEADLINE
+    from packages.kpis.breaker import BREAKER
+    from packages.kpis.scan import scan_accounts, scan_columns
+    from packages.kpis.schedule import AccountSchedule
+    from packages.kpis.spec import compile_plan
+    from packages.kpis.tracking import KPI_SPECS
+    from packages.kpis.vectorized import scan_accounts_vectorized
+
+    plan = compile_plan(KPI_SPECS)
+    leaves = {cid: f"Account {cid}" for cid in client.leaf_cids()}
+    scan = scan_accounts_vectorized if args.vectorized else scan_accounts
+    output = os.path.join(tempfile.mkdtemp(prefix="kpi_bench_"), f"scan.{args.format}")
+
+    schedule = AccountSchedule() if args.schedule else None
+
+    async def _scan_async(client, out):
+        from packages.kpis.aio import scan_accounts_async
+
+        async for row in scan_accounts_async(
+            client, plan, leaves, concurrency=args.concurrency, schedule=schedule
+        ):
+            out.write(row)
+
+    def _run(client, path):
+        with contextlib.redirect_stdout(io.StringIO()), open_table(path, scan_columns(plan)) as out:
+            if args.use_async:
+                asyncio.run(_scan_async(client, out))
+            else:
+                for row in scan(client, plan, leaves, workers=args.workers, schedule=schedule):
+                    out.write(row)
+
+    if schedule is not None:
+        # untimed pass on a twin client: every account's duration is learned
+        _run(FakeGoogleAdsClient(client.config), output)
+        schedule.save()
+
+    RECORDER.reset()
+    POLICY.reset()
+    POLICY.hedge = args.hedge
+    RUN_DEADLINE.start(args.deadline)
+    BREAKER.reset()
+    start = time.perf_counter()
+    _run(client, output)
+    elapsed = time.perf_counter() - start
+
+    summary = RECORDER.summary()
+    return {
+        "accounts": len(leaves),
+        "seconds": round(elapsed, 3),
+        "accounts_per_sec": round(len(leaves) / elapsed, 2),
+        "queries": sum(client.stats.calls.values()),
+        "errors_injected": client.stats.errors + client.stats.quota_errors,
+        "account_errors": client.stats.account_errors,
+        "channels_opened": client.stats.channels,
+        "per_kpi": summary.get("kpi", {}),
+        "per_query": summary.get("query", {}),
+        "slowest_accounts": summary["slowest"].get("account", []),
+        "timeouts": POLICY.stats(),
+        "breaker": BREAKER.stats(),
+        "schedule": schedule.report() if schedule is not None else None,
+    }
+
+
+def bench_showcase(client, args) -> dict:
+    import show_data
+
+    cid = client.leaf_cids()[0]
+    output = os.path.join(tempfile.mkdtemp(prefix="kpi_bench_"), "showcase.xlsx")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        show_data.build_showcase(client, cid, output=output, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": client.stats.rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(client.stats.rows / elapsed, 1),
+    }
+
+
+SCENARIOS = {
+    "hierarchy": bench_hierarchy,
+    "scan": bench_scan,
+    "showcase": bench_showcase,
+}
+
+
+def run(name: str, config: FakeAdsConfig, args) -> dict:
+    result = SCENARIOS[name](FakeGoogleAdsClient(config), args)
+    if args.memory:
+        tracemalloc.start()
+        SCENARIOS[name](FakeGoogleAdsClient(config), args)
+        result["peak_heap_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--sub-managers", type=int, default=10)
+    parser.add_argument("--actions", type=int, default=20, help="conversion actions per account")
+    parser.add_argument("--metric-rows", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="median seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.5, help="lognormal sigma")
+    parser.add_argument("--skew", type=float, default=0.0,
+                        help="lognormal sigma of a stable per-account slowdown")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--dead-rate", type=float, default=0.0,
+                        help="share of accounts failing with CUSTOMER_NOT_ENABLED")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--qps", type=float, default=1000.0, help="rate-limiter ceiling")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="scan: columnar conversion-action KPIs")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="scan: asyncio engine (kpis.aio) instead of worker threads")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="accounts in flight with --async")
+    parser.add_argument("--hedge", action="store_true",
+                        help="scan: hedge unary reads slower than their p95")
+    parser.add_argument("--deadline", type=float, help="scan: run deadline in seconds")
+    parser.add_argument("--schedule", action="store_true",
+                        help="scan: learn durations in an untimed run, then dispatch LPT")
+    parser.add_argument("--format", choices=["xlsx", "csv", "parquet"], default="xlsx")
+    parser.add_argument("--memory", action="store_true", help="tracemalloc pass per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    from packages.google_ads_kpi.ratelimit import RATE_LIMITER
+
+    os.environ["KPI_CACHE_DIR"] = tempfile.mkdtemp(prefix="kpi_bench_cache_")
+    RATE_LIMITER.reset(args.qps)
+
+    config = FakeAdsConfig(
+        accounts=args.accounts,
+        sub_managers=args.sub_managers,
+        actions_per_account=args.actions,
+        metric_rows=args.metric_rows,
+        latency=args.latency,
+        latency_jitter=args.jitter,
+        account_skew=args.skew,
+        error_rate=args.error_rate,
+        quota_error_rate=args.quota_error_rate,
+        dead_rate=args.dead_rate,
+        seed=args.seed,
+    )
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = {"config": vars(config), "workers": args.workers}
+    for name in names:
+        print(f"▶ {name} …", end=" ", flush=True)
+        results[name] = run(name, config, args)
+        print(f"{results[name]['seconds']}s")
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+startup.py – cold-start benchmark for the CLI entry points
+
+Imports each entry point in a fresh interpreter (what a short Windmill job
+pays before `main()` runs) and reports the median wall time plus any heavy
+dependency that got imported eagerly. `--check` exits non-zero when a heavy
+module is loaded at import time or the median exceeds `--budget`.
+
+    python -m bench.startup
+    python -m bench.startup --runs 10 --check --budget 0.5 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ("run_kpi", "run_kpi_all", "show_data")
+
+# Must only be imported once real work starts (client creation, first query)
+HEAVY = ("google.ads", "google.api_core", "grpc", "pandas", "openpyxl", "pyarrow")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted({{m.split(".")[0] if m.split(".")[0] != "google" else ".".join(m.split(".")[:2])
+                for m in sys.modules if m.startswith({heavy!r})}})
+print(elapsed, ",".join(heavy))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str, runs: int) -> dict:
+    """Import `module` in `runs` fresh interpreters; return timings."""
+    script = _PROBE.format(module=module, heavy=HEAVY)
+    import_s, process_s, heavy = [], [], set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        process_s.append(time.perf_counter() - start)
+        import_s.append(float(out[0]))
+        if len(out) > 1:
+            heavy.update(out[1].split(","))
+    return {
+        "import_median_s": round(statistics.median(import_s), 4),
+        "import_max_s": round(max(import_s), 4),
+        "process_median_s": round(statistics.median(process_s), 4),
+        "heavy_imports": sorted(heavy),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.5, help="max median import seconds")
+    parser.add_argument("--check", action="store_true", help="fail on regressions")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = {m: measure(m, args.runs) for m in args.modules}
+    for module, r in results.items():
+        heavy = ", ".join(r["heavy_imports"]) or "none"
+        print(
+            f"▶ {module:<12} import {r['import_median_s'] * 1000:7.1f} ms "
+            f"(process {r['process_median_s'] * 1000:7.1f} ms)  heavy: {heavy}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+    failed = [
+        m for m, r in results.items()
+        if r["heavy_imports"] or r["import_median_s"] > args.budget
+    ]
+    if args.check and failed:
+        print("❌ startup regression in:", ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
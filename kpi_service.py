@@ -0,0 +1,41 @@
+"""
+Long-lived local KPI service: one warm Google Ads client answering
+single-account audits over HTTP on localhost.
+
+    python kpi_service.py
+    curl http://127.0.0.1:8765/kpis/7192753145
+    curl http://127.0.0.1:8765/kpis/7192753145?refresh=1
+    curl http://127.0.0.1:8765/stats
+
+Results are served from memory for KPI_SERVICE_TTL seconds (default 300),
+and concurrent requests for the same CID share one computation. Point
+run_kpi.py at it with KPI_SERVICE_URL=http://127.0.0.1:8765. Bind address
+and port: KPI_SERVICE_HOST / KPI_SERVICE_PORT (see packages.kpis.service).
+"""
+
+from packages.google_ads_kpi.auth import get_client, get_service, load_env
+
+load_env()  # before the modules below read their env defaults
+
+from packages.google_ads_kpi.gaql import GaqlError  # noqa: E402
+from packages.kpis.service import KpiService, serve  # noqa: E402
+from packages.kpis.spec import compile_plan, validate_plan  # noqa: E402
+from packages.kpis.tracking import KPI_SPECS  # noqa: E402
+
+# KPIs reading the same resource share one GAQL query per account
+PLAN = compile_plan(KPI_SPECS)
+
+
+def main() -> None:
+    client = get_client()
+    try:
+        validate_plan(PLAN, client)
+    except GaqlError as exc:
+        raise SystemExit(f"❌ {exc}") from None
+    get_service(client)              # open the pooled channel before the first request
+    print(f"{len(PLAN.specs)} KPIs compiled into {len(PLAN.queries)} queries")
+    serve(KpiService(client, PLAN))
+
+
+if __name__ == "__main__":
+    main()
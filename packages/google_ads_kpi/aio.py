@@ -0,0 +1,391 @@
+"""
+aio.py – asyncio counterparts of the GAQL helpers (gRPC aio transport)
+
+`paged_search_async` and `list_leaf_accounts_async` behave like their blocking
+namesakes in query.py / hierarchy.py: the same retry policy, the shared
+RATE_LIMITER, metrics spans and the hierarchy disk cache. The difference is
+that they await instead of blocking a thread, so one event loop can keep
+hundreds of GAQL calls in flight. Cancelling the awaiting task cancels the
+underlying RPC.
+
+Async services come from `client.get_service(…, is_async=True)`. gRPC aio
+channels belong to the event loop that created them, so `get_async_service`
+keeps one set per (client, loop).
+
+Typical use:
+    async def main():
+        client = get_client()
+        leaves = await list_leaf_accounts_async(client, "9168266268")
+        ga = get_async_service(client)
+        async for row in paged_search_async(ga, cid, query):
+            ...
+        await close_async_services(client)
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import inspect
+import os
+import threading
+import time
+import weakref
+from dataclasses import asdict
+from functools import cache
+
+from packages.google_ads_kpi.cache import read_json, write_json
+from packages.google_ads_kpi.cassette import CASSETTE
+from packages.google_ads_kpi.hierarchy import (
+    HIERARCHY_TTL,
+    AccountNode,
+    _add_node,
+    _cache_key,
+    _set_parent,
+    _sub_managers,
+    _tree_query,
+)
+from packages.google_ads_kpi.metrics import RECORDER, note_retry
+from packages.google_ads_kpi.query import (
+    DEFAULT_TIMEOUT,
+    QUOTA_ATTEMPTS,
+    STREAM_TIMEOUT,
+    call_timeout,
+    query_name,
+    should_stream,
+)
+from packages.google_ads_kpi.ratelimit import (
+    RATE_LIMITER,
+    is_quota_error,
+    retry_delay,
+)
+from packages.google_ads_kpi.records import aproject
+from packages.google_ads_kpi.timeouts import (
+    POLICY,
+    RUN_DEADLINE,
+    TimeoutPolicy,
+    is_timeout,
+)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Async services – a few aio channels per (client, event loop)
+# ──────────────────────────────────────────────────────────────────────────────
+class _AsyncServices:
+    def __init__(self, loop, services: list):
+        self.loop = loop
+        self.services = services
+        self._turn = 0
+
+    def next(self):
+        self._turn = (self._turn + 1) % len(self.services)
+        return self.services[self._turn]
+
+
+# client -> {(service name, version): _AsyncServices}; dropped with the client
+_SERVICES: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_SERVICES_LOCK = threading.Lock()
+
+
+def get_async_service(
+    client,
+    name: str = "GoogleAdsService",
+    *,
+    version: str | None = None,
+    channels: int | None = None,
+):
+    """
+    Shared async service for `client` on the running event loop.
+
+    channels – aio channels to spread calls over (default KPI_CHANNELS, 1);
+               each one multiplexes many concurrent calls
+    """
+    loop = asyncio.get_running_loop()
+    with _SERVICES_LOCK:
+        per_client = _SERVICES.setdefault(client, {})
+        entry = per_client.get((name, version))
+        if entry is None or entry.loop is not loop:
+            size = channels or int(os.getenv("KPI_CHANNELS", "1"))
+            kwargs = {"version": version} if version else {}
+            entry = per_client[(name, version)] = _AsyncServices(loop, [
+                client.get_service(name, is_async=True, **kwargs) for _ in range(size)
+            ])
+        return entry.next()
+
+
+async def close_async_services(client) -> None:
+    """Close the aio channels `client` opened on the running loop."""
+    loop = asyncio.get_running_loop()
+    with _SERVICES_LOCK:
+        per_client = _SERVICES.get(client, {})
+        entries = [k for k, e in per_client.items() if e.loop is loop]
+        services = [s for k in entries for s in per_client.pop(k).services]
+    for service in services:
+        transport = getattr(service, "transport", None)
+        if transport is not None:
+            await transport.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Retry / rate limiting
+# ──────────────────────────────────────────────────────────────────────────────
+@cache
+def default_async_retry():
+    """query.default_retry() as an AsyncRetry (same policy, same accounting)."""
+    from google.api_core import exceptions
+    from google.api_core.retry import if_exception_type
+    from google.api_core.retry_async import AsyncRetry
+
+    return AsyncRetry(
+        predicate=if_exception_type(
+            exceptions.ServiceUnavailable,      # 503
+            exceptions.DeadlineExceeded         # 504 / socket timeout
+        ),
+        initial=2.0,
+        maximum=32.0,
+        multiplier=2.0,
+        timeout=60.0,
+        on_error=note_retry,
+    )
+
+
+async def acquire_async(limiter=None) -> None:
+    """limiter.acquire() without blocking the loop."""
+    wait = (limiter or RATE_LIMITER).reserve()
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+async def rate_limited_async(call, *, limiter=None, attempts: int = QUOTA_ATTEMPTS):
+    """query.rate_limited for a coroutine function: waits without blocking the loop."""
+    limiter = limiter or RATE_LIMITER
+    for attempt in range(1, attempts + 1):
+        await acquire_async(limiter)
+        try:
+            result = await call()
+        except Exception as exc:
+            if attempt == attempts or not is_quota_error(exc):
+                raise
+            limiter.on_quota_error(retry_delay(exc))
+            note_retry(exc)
+            continue
+        limiter.on_success()
+        return result
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Search
+# ──────────────────────────────────────────────────────────────────────────────
+async def hedged_async(call, delay: float, *, before_hedge=None, policy: TimeoutPolicy = POLICY):
+    """
+    timeouts.hedged for a coroutine function: after `delay` seconds a second
+    `call()` races the first; the loser (and both, if the caller is
+    cancelled) is cancelled.
+    """
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            if before_hedge is not None:
+                await before_hedge()
+            policy.note_hedge()
+            tasks.append(asyncio.ensure_future(call()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if len(tasks) > 1:
+                        policy.note_hedge(won=task is tasks[1])
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+            task.add_done_callback(_retrieve)
+
+
+def _retrieve(task) -> None:
+    """Mark a dropped task's outcome as seen (no 'never retrieved' warning)."""
+    if not task.cancelled():
+        task.exception()
+
+
+def paged_search_async(
+    ga_service,
+    customer_id: str,
+    query: str,
+    *,
+    page_size: int = 1000,
+    retry=None,
+    timeout: float | None = None,
+    limiter=None,
+    stream: bool | None = None,
+    expected_rows: int | None = None,
+    fields=None,
+):
+    """
+    Async iterator of GAQL rows; arguments as for query.paged_search, with
+    `ga_service` from get_async_service() and `retry` an AsyncRetry
+    (default_async_retry() if None).
+
+    Each call is recorded as a "query" sample in `metrics.RECORDER`, and
+    uses the same adaptive timeouts, hedging and run deadline
+    (timeouts.POLICY) and the same KPI_CASSETTE recordings.
+    """
+    shape = query_name(query)
+    rows = CASSETTE.arows(customer_id, query, lambda: _search(
+        ga_service, customer_id, query, page_size,
+        default_async_retry() if retry is None else retry, timeout,
+        limiter, stream, expected_rows, shape,
+    ))
+    rows = RECORDER.atrace("query", shape, rows, customer_id)
+    return rows if fields is None else aproject(rows, fields)
+
+
+async def _open_stream(ga_service, customer_id, query, timeout):
+    """Start search_stream and pull the first batch so start-up errors surface here."""
+    call = ga_service.search_stream(
+        customer_id=customer_id, query=query, retry=None, timeout=timeout
+    )
+    if inspect.isawaitable(call) and not hasattr(call, "__aiter__"):
+        call = await call
+    batches = aiter(call)
+    return await anext(batches, None), batches
+
+
+async def _search(
+    ga_service, customer_id, query, page_size, retry, timeout,
+    limiter, stream, expected_rows, shape,
+):
+    if stream is None:
+        stream = should_stream(query, page_size, expected_rows)
+    retry = RUN_DEADLINE.cap_retry(retry)
+
+    # transient errors are retried here rather than by the gapic layer, so
+    # the retry covers opening the stream, not just creating the call object
+    if stream:
+        budget = call_timeout(shape, timeout, STREAM_TIMEOUT)
+        start = time.perf_counter()
+        try:
+            first, batches = await rate_limited_async(
+                retry(lambda: _open_stream(ga_service, customer_id, query, budget)),
+                limiter=limiter,
+            )
+            if first is not None:
+                for row in first.results:
+                    yield row
+                async for batch in batches:
+                    for row in batch.results:
+                        yield row
+        except Exception as exc:
+            if is_timeout(exc):
+                POLICY.observe(shape, budget, timed_out=True)
+            raise
+        POLICY.observe(shape, time.perf_counter() - start)
+        return
+
+    budget = call_timeout(shape, timeout, DEFAULT_TIMEOUT)
+    delay = POLICY.hedge_delay(shape)
+    call = retry(lambda: ga_service.search(
+        customer_id=customer_id,
+        query=query,
+        retry=None,
+        timeout=budget,
+    ))
+
+    async def _timed():
+        start = time.perf_counter()
+        try:
+            if delay is None:
+                result = await call()
+            else:
+                result = await hedged_async(
+                    call, delay, before_hedge=lambda: acquire_async(limiter)
+                )
+        except Exception as exc:
+            if is_timeout(exc):
+                POLICY.observe(shape, budget, timed_out=True)
+            raise
+        POLICY.observe(shape, time.perf_counter() - start)
+        return result
+
+    pager = await rate_limited_async(_timed, limiter=limiter)
+    async for row in _paged_rows_async(pager, limiter or RATE_LIMITER):
+        yield row
+
+
+async def _paged_rows_async(pager, limiter):
+    """query._paged_rows for an async pager: a token before each further page."""
+    pages = getattr(pager, "pages", None)
+    if pages is None:                           # plain async iterable of rows
+        async for row in pager:
+            yield row
+        return
+    page = await anext(pages, None)             # first page: already fetched
+    while page is not None:
+        for row in page.results:
+            yield row
+        if not page.next_page_token:
+            return
+        await acquire_async(limiter)
+        try:
+            page = await anext(pages, None)
+        except Exception as exc:
+            if is_quota_error(exc):
+                limiter.on_quota_error(retry_delay(exc))
+            raise
+        limiter.on_success()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Hierarchy
+# ──────────────────────────────────────────────────────────────────────────────
+async def _fetch_tree(ga_service, root_cid: str, resolve_parents: bool) -> list[AccountNode]:
+    nodes: dict[str, AccountNode] = {}
+    async for row in paged_search_async(ga_service, root_cid, _tree_query(), stream=True):
+        _add_node(nodes, row, root_cid)
+
+    if resolve_parents:
+        async def _children(mgr):
+            return mgr, [
+                row async for row in paged_search_async(
+                    ga_service, mgr.cid, _tree_query(max_level=1)
+                )
+            ]
+
+        # every sub-manager is asked concurrently
+        for mgr, rows in await asyncio.gather(*map(_children, _sub_managers(nodes))):
+            for row in rows:
+                _set_parent(nodes, mgr, row)
+
+    return sorted(nodes.values(), key=lambda n: n.level)
+
+
+async def resolve_hierarchy_async(
+    client,
+    manager_cid: str,
+    *,
+    ttl: float | None = None,
+    refresh: bool = False,
+    resolve_parents: bool = False,
+) -> list[AccountNode]:
+    """hierarchy.resolve_hierarchy on the event loop (same disk cache)."""
+    key = _cache_key(manager_cid, resolve_parents)
+    if not refresh:
+        cached = read_json(key, HIERARCHY_TTL if ttl is None else ttl)
+        if cached is not None:
+            return [AccountNode(**n) for n in cached]
+
+    nodes = await _fetch_tree(get_async_service(client), manager_cid, resolve_parents)
+    write_json(key, [asdict(n) for n in nodes])
+    return nodes
+
+
+async def list_leaf_accounts_async(client, manager_cid: str, **kwargs) -> dict[str, str]:
+    """{leaf_cid: descriptive_name} under `manager_cid` (see list_leaf_accounts)."""
+    return {
+        node.cid: node.name
+        for node in await resolve_hierarchy_async(client, manager_cid, **kwargs)
+        if not node.manager
+    }
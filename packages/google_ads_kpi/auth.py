@@ -1,11 +1,47 @@
-from dotenv import load_dotenv, find_dotenv
+"""
+auth.py – Google Ads client and pooled, thread-safe service stubs
+
+`client.get_service()` opens a fresh gRPC channel (and TLS session) on every
+call. `get_service(client)` instead hands out a shared service per
+(client, service, version), backed by a small pool of long-lived channels:
+a new channel is only opened when every existing one is busy, up to
+KPI_CHANNELS (default 1).
+
+Typical use:
+    client = get_client()
+    ga = get_service(client)                    # GoogleAdsService
+    fields = get_service(client, "GoogleAdsFieldService")
+    print(pool_stats(client))
+"""
+
 import os
-from google.ads.googleads.client import GoogleAdsClient
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.ads.googleads.client import GoogleAdsClient
+
+_ENV_LOADED = False
 
-load_dotenv(find_dotenv())
 
-def get_client() -> GoogleAdsClient:
+def load_env() -> None:
+    """Load the nearest .env into os.environ (once; existing vars win)."""
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv, find_dotenv
+
+        load_dotenv(find_dotenv())
+        _ENV_LOADED = True
+
+
+def get_client() -> "GoogleAdsClient":
     """Return an authenticated Google Ads client (uses manager login)."""
+    # google-ads pulls in grpc and every proto module: import on first use
+    from google.ads.googleads.client import GoogleAdsClient
+
+    load_env()
     cfg = {
         "developer_token":  os.getenv("GOOGLE_DEVELOPER_TOKEN"),
         "client_id":        os.getenv("GOOGLE_CLIENT_ID"),
@@ -15,3 +51,175 @@ def get_client() -> GoogleAdsClient:
         "login_customer_id": os.getenv("LOGIN_CUSTOMER_ID"),  # manager CID
     }
     return GoogleAdsClient.load_from_dict(cfg)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Pooled services – one long-lived gRPC channel (or a few) per client/service
+# ──────────────────────────────────────────────────────────────────────────────
+class PooledService:
+    """
+    Proxy for one service client (= one channel) that counts its calls. A call
+    that returns a pager or a stream stays in flight until that is exhausted,
+    closed or dropped: its later pages / batches still use the channel.
+    """
+
+    def __init__(self, service, index: int):
+        self._service = service
+        self._lock = threading.Lock()
+        self.index = index
+        self.opened = time.time()
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.busy = 0.0                      # seconds spent inside calls
+
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls += 1
+                self.in_flight += 1
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                self._done(start, failed=True)
+                raise
+            if hasattr(result, "pages") or hasattr(result, "__next__"):
+                return _InFlight(result, self, start)
+            self._done(start)
+            return result
+
+        return call
+
+    def _done(self, start: float, failed: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.busy += time.perf_counter() - start
+            self.errors += failed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "busy_s": round(self.busy, 3),
+                "age_s": round(time.time() - self.opened, 1),
+            }
+
+
+class _InFlight:
+    """Pager / stream of a PooledService call; ends the call once, when done."""
+
+    def __init__(self, result, member: PooledService, start: float):
+        self._result = result
+        self._member = member
+        self._start = start
+        self._open = True
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)   # cancel(), metadata, …
+
+    @property
+    def pages(self):
+        return self._track(self._result.pages)
+
+    def __iter__(self):
+        return self._track(self._result)
+
+    def _track(self, items):
+        failed = False
+        try:
+            yield from items
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.close(failed)
+
+    def close(self, failed: bool = False) -> None:
+        if self._open:
+            self._open = False
+            self._member._done(self._start, failed)
+
+    def __del__(self):
+        self.close()
+
+
+class ServicePool:
+    """Up to `size` channels for one service; hands out the least busy one."""
+
+    def __init__(self, name: str, version: str | None, size: int):
+        if size < 1:
+            raise ValueError("pool size must be >= 1")
+        self.name = name
+        self.version = version
+        self.size = size
+        self.checkouts = 0
+        self._members: list[PooledService] = []
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def get(self, client) -> PooledService:
+        with self._lock:
+            self.checkouts += 1
+            if len(self._members) < self.size and all(m.in_flight for m in self._members):
+                # channels connect lazily, so opening one here is cheap
+                kwargs = {"version": self.version} if self.version else {}
+                member = PooledService(client.get_service(self.name, **kwargs), len(self._members))
+                self._members.append(member)
+                return member
+            self._turn = (self._turn + 1) % len(self._members)
+            order = self._members[self._turn:] + self._members[:self._turn]
+            return min(order, key=lambda m: m.in_flight)
+
+    def stats(self) -> dict:
+        with self._lock:
+            members = list(self._members)
+        return {
+            "channels": len(members),
+            "max_channels": self.size,
+            "checkouts": self.checkouts,
+            "per_channel": [m.stats() for m in members],
+        }
+
+
+# client -> {(service name, version): ServicePool}; dropped with the client
+_POOLS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_POOLS_LOCK = threading.Lock()
+
+
+def get_service(
+    client,
+    name: str = "GoogleAdsService",
+    *,
+    version: str | None = None,
+    channels: int | None = None,
+) -> PooledService:
+    """
+    Shared, thread-safe service for `client`.
+
+    channels – max gRPC channels for this service (default KPI_CHANNELS, 1);
+               only honoured when the pool is first created
+    """
+    with _POOLS_LOCK:
+        pools = _POOLS.setdefault(client, {})
+        pool = pools.get((name, version))
+        if pool is None:
+            size = channels or int(os.getenv("KPI_CHANNELS", "1"))
+            pool = pools[(name, version)] = ServicePool(name, version, size)
+    return pool.get(client)
+
+
+def pool_stats(client) -> dict:
+    """{service name: channel stats} for every pooled service of `client`."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.get(client, {}).values())
+    return {
+        pool.name if pool.version is None else f"{pool.name}@{pool.version}": pool.stats()
+        for pool in pools
+    }
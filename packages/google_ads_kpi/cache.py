@@ -0,0 +1,46 @@
+"""
+cache.py – small JSON-on-disk helpers for results that outlive one run
+
+Env:
+    KPI_CACHE_DIR   directory for on-disk caches (default ".cache")
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# On-disk JSON cache with a time-to-live
+# ──────────────────────────────────────────────────────────────────────────────
+def cache_path(name: str) -> Path:
+    """Path of cache entry `name` inside KPI_CACHE_DIR."""
+    return Path(os.getenv("KPI_CACHE_DIR", ".cache")) / f"{name}.json"
+
+
+def read_json(name: str, ttl: float | None = None):
+    """
+    Return the data stored under `name`, or None when missing, unreadable or
+    older than `ttl` seconds (ttl=None never expires).
+    """
+    try:
+        with open(cache_path(name), encoding="utf-8") as fh:
+            entry = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if ttl is not None and time.time() - entry.get("saved_at", 0) > ttl:
+        return None
+    return entry.get("data")
+
+
+def write_json(name: str, data) -> Path:
+    """Atomically store `data` (JSON-serialisable) under `name`."""
+    path = cache_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"saved_at": time.time(), "data": data}, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
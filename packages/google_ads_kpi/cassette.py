@@ -0,0 +1,325 @@
+"""
+cassette.py – record / replay of GAQL responses
+
+With KPI_CASSETTE=record every `paged_search` (and the field catalog fetch)
+also writes the rows it returned to a compact local file keyed by customer ID
+and the normalized query; with KPI_CASSETTE=replay those files are served
+instead and no request is sent at all (no rate limiter, retries or timeouts
+either). KPI logic and sheets can then be re-run against a captured
+production snapshot at disk speed, reproducibly.
+
+  • record   live calls; each complete result (or account-level
+             GoogleAdsException) is saved as it streams through
+  • replay   recordings only; a query without one raises CassetteMiss
+  • auto     replay what was recorded, record the rest
+
+One gzip file per (customer, query) under KPI_CASSETTE_DIR:
+
+    <dir>/<customer_id>/<resource>-<sha1(query)[:16]>.gaql.gz
+
+holding tagged frames (1-byte tag, 4-byte big-endian length, payload):
+H header JSON, T message type ("module:qualname"), R one serialized row,
+E a recorded GoogleAdsException. Rows are written and read one at a time, so
+neither side holds a whole result in memory. Transient errors are not
+recorded, nor are results abandoned before the end, unless every row the
+query's LIMIT allows was already read (a LIMIT 1 lookup stops right there).
+
+Env:
+    KPI_CASSETTE       record | replay | auto (default: off, live API)
+    KPI_CASSETTE_DIR   recordings directory (default "cassettes")
+
+Typical use:
+    KPI_CASSETTE=record python run_kpi_all.py     # capture a snapshot
+    KPI_CASSETTE=replay python run_kpi_all.py     # re-run it offline
+
+    rows = CASSETTE.rows(cid, query, lambda: live_rows())
+"""
+
+import base64
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+
+MODES = ("record", "replay", "auto")
+_FRAME = struct.Struct(">cI")
+
+
+class CassetteMiss(LookupError):
+    """Replay mode and no recording for this (customer, query)."""
+
+
+def _type_name(obj) -> str:
+    cls = type(obj)
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+# Recordings are data, not code: only Google Ads message types are loaded
+_TYPE_PACKAGE = "google.ads.googleads."
+
+
+def _load_type(name: str):
+    module, _, qualname = name.partition(":")
+    if not module.startswith(_TYPE_PACKAGE):
+        raise ValueError(f"cassette names a non-Google-Ads type: {name!r}")
+    obj = importlib.import_module(module)
+    for part in qualname.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _serialize(message) -> bytes:
+    """Wire bytes of a proto-plus (or raw protobuf) message."""
+    return getattr(message, "_pb", message).SerializeToString()
+
+
+def _deserialize(cls, data: bytes):
+    if hasattr(cls, "deserialize"):                     # proto-plus
+        return cls.deserialize(data)
+    return cls.FromString(data)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Frames
+# ──────────────────────────────────────────────────────────────────────────────
+def _write_frame(fh, tag: bytes, payload: bytes) -> None:
+    fh.write(_FRAME.pack(tag, len(payload)))
+    fh.write(payload)
+
+
+def _read_frames(fh):
+    while True:
+        head = fh.read(_FRAME.size)
+        if not head:
+            return
+        tag, size = _FRAME.unpack(head)
+        yield tag, fh.read(size)
+
+
+def _limit(query: str) -> int | None:
+    """LIMIT of `query`, or None (also for queries gaql cannot parse)."""
+    from packages.google_ads_kpi.gaql import GaqlError, parse
+
+    try:
+        return parse(query).limit
+    except GaqlError:
+        return None
+
+
+def _error_payload(exc: BaseException) -> bytes | None:
+    """E frame for an account-level GoogleAdsException (kpis.breaker's
+    ACCOUNT_ERRORS: the deterministic kind, worth replaying), else None."""
+    from packages.kpis.breaker import account_error     # kpis sits above this package
+
+    failure = getattr(exc, "failure", None)
+    if failure is None or account_error(exc) is None:
+        return None
+    return json.dumps({
+        "failure_type": _type_name(failure),
+        "failure": base64.b64encode(_serialize(failure)).decode("ascii"),
+        "request_id": getattr(exc, "request_id", None),
+    }).encode("utf-8")
+
+
+def _replayed_error(payload: bytes) -> Exception:
+    from google.ads.googleads.errors import GoogleAdsException
+
+    entry = json.loads(payload)
+    failure = _deserialize(_load_type(entry["failure_type"]), base64.b64decode(entry["failure"]))
+    return GoogleAdsException(None, None, failure, entry["request_id"])
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Cassette
+# ──────────────────────────────────────────────────────────────────────────────
+class Cassette:
+    """Routes GAQL row streams to / from recordings according to `mode`."""
+
+    def __init__(self, mode: str | None = None, directory: str = "cassettes"):
+        if mode not in (None, *MODES):
+            raise ValueError(f"KPI_CASSETTE must be one of {MODES}, not {mode!r}")
+        self.mode = mode
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    def path(self, customer_id: str, query: str) -> Path:
+        """Recording of `query` for `customer_id` (which may not exist)."""
+        # query.py routes its calls through CASSETTE: import it on first use
+        from packages.google_ads_kpi.query import _FROM_RE, normalize_query
+
+        query = normalize_query(query)
+        resource = _FROM_RE.search(query)
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+        name = f"{resource.group(1) if resource else 'fields'}-{digest}.gaql.gz"
+        return self.directory / (customer_id or "_") / name
+
+    def _replaying(self, path: Path) -> bool:
+        return self.mode == "replay" or (self.mode == "auto" and path.exists())
+
+    def _count(self, attr: str) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    # ── sync ──────────────────────────────────────────────────────────────
+    def rows(self, customer_id: str, query: str, fetch):
+        """
+        Rows of `query` for `customer_id`: `fetch()` (an iterable of rows)
+        when off, the recording when replaying, `fetch()` teed into a new
+        recording when recording.
+        """
+        if self.mode is None:
+            return fetch()
+        path = self.path(customer_id, query)
+        if self._replaying(path):
+            return self._replay(path, customer_id, query)
+        return self._record(path, customer_id, query, fetch)
+
+    def _replay(self, path: Path, customer_id: str, query: str):
+        try:
+            fh = gzip.open(path, "rb")
+        except FileNotFoundError:
+            self._count("misses")
+            raise CassetteMiss(f"no recording of {query!r} for {customer_id or '-'}") from None
+        self._count("replayed")
+        with fh:
+            cls = None
+            for tag, payload in _read_frames(fh):
+                if tag == b"R":
+                    yield _deserialize(cls, payload)
+                elif tag == b"T":
+                    cls = _load_type(payload.decode("utf-8"))
+                elif tag == b"E":
+                    raise _replayed_error(payload)
+
+    def _record(self, path: Path, customer_id: str, query: str, fetch):
+        writer = _Writer(path, customer_id, query)
+        try:
+            for row in fetch():
+                writer.row(row)
+                yield row
+        except GeneratorExit:
+            self._abandoned(writer, query)
+            raise
+        except Exception as exc:
+            if not writer.error(exc):
+                writer.discard()
+            else:
+                self._count("recorded")
+            raise
+        writer.commit()
+        self._count("recorded")
+
+    # ── async ─────────────────────────────────────────────────────────────
+    async def arows(self, customer_id: str, query: str, fetch):
+        """`rows` for an async iterator of rows (aio.paged_search_async)."""
+        if self.mode is None:
+            async for row in fetch():
+                yield row
+            return
+        path = self.path(customer_id, query)
+        if self._replaying(path):
+            for row in self._replay(path, customer_id, query):
+                yield row
+            return
+
+        writer = _Writer(path, customer_id, query)
+        try:
+            async for row in fetch():
+                writer.row(row)
+                yield row
+        except GeneratorExit:
+            self._abandoned(writer, query)
+            raise
+        except BaseException as exc:            # includes cancellation
+            if isinstance(exc, Exception) and writer.error(exc):
+                self._count("recorded")
+            else:
+                writer.discard()
+            raise
+        writer.commit()
+        self._count("recorded")
+
+    def _abandoned(self, writer: "_Writer", query: str) -> None:
+        """The consumer stopped reading: publish the recording only if it
+        already holds every row the LIMIT allows, otherwise it is partial."""
+        limit = _limit(query)
+        if limit is not None and writer.rows >= limit:
+            writer.commit()
+            self._count("recorded")
+        else:
+            writer.discard()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses,
+            }
+
+
+class _Writer:
+    """One recording being written to a temp file, published by commit()."""
+
+    def __init__(self, path: Path, customer_id: str, query: str):
+        from packages.google_ads_kpi.query import normalize_query
+
+        self.path = path
+        self.tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self.header = {
+            "customer_id": customer_id,
+            "query": normalize_query(query),
+            "recorded_at": time.time(),
+        }
+        self.rows = 0
+        self._fh = None
+        self._type = None
+
+    def _open(self):
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = gzip.open(self.tmp, "wb", compresslevel=6)
+            _write_frame(self._fh, b"H", json.dumps(self.header).encode("utf-8"))
+        return self._fh
+
+    def row(self, row) -> None:
+        fh = self._open()
+        if self._type is None:
+            self._type = _type_name(row)
+            _write_frame(fh, b"T", self._type.encode("utf-8"))
+        _write_frame(fh, b"R", _serialize(row))
+        self.rows += 1
+
+    def error(self, exc: BaseException) -> bool:
+        """Record a replayable error and publish; False if it is not one."""
+        payload = _error_payload(exc)
+        if payload is None or self.rows:
+            return False
+        _write_frame(self._open(), b"E", payload)
+        self.commit()
+        return True
+
+    def commit(self) -> None:
+        self._open().close()
+        os.replace(self.tmp, self.path)
+
+    def discard(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self.tmp.unlink(missing_ok=True)
+
+
+CASSETTE = Cassette(
+    os.getenv("KPI_CASSETTE", "").lower() or None,
+    os.getenv("KPI_CASSETTE_DIR", "cassettes"),
+)
@@ -0,0 +1,100 @@
+"""
+catalog.py – GoogleAdsFieldService catalog, cached on disk per API version
+
+The field catalog only changes when the API version does, so it is fetched
+once and kept under KPI_CACHE_DIR as `field_catalog_<version>_<hash>.json`
+for FIELD_CATALOG_TTL seconds (default 7 days). The hash is of
+CATALOG_QUERY, so adding a column never serves an older cached copy.
+
+Resources also carry `selectable_with` (the segments, metrics and attributed
+resources usable with them), which gaql.py checks queries against; it is
+left empty on other fields to keep the file small.
+
+Typical use:
+    catalog = load_field_catalog(client)      # [{'name': 'campaign.name', …}]
+    catalog = cached_field_catalog()          # disk only; None if never fetched
+"""
+
+import hashlib
+import os
+
+from packages.google_ads_kpi.auth import get_service
+from packages.google_ads_kpi.cache import read_json, write_json
+from packages.google_ads_kpi.cassette import CASSETTE
+from packages.google_ads_kpi.query import rate_limited
+
+CATALOG_TTL = float(os.getenv("FIELD_CATALOG_TTL", str(7 * 24 * 3600)))
+
+CATALOG_QUERY = """
+  SELECT
+    name,
+    category,
+    selectable,
+    filterable,
+    sortable,
+    selectable_with
+"""
+
+
+def api_version(version: str | None = None) -> str:
+    """`version`, or the google-ads library's default API version."""
+    if version:
+        return version
+    from google.ads.googleads import client as ads_client
+
+    return getattr(ads_client, "_DEFAULT_VERSION", "default")
+
+
+def _fetch(client, version: str | None) -> list[dict]:
+    field_service = get_service(client, "GoogleAdsFieldService", version=version)
+    fields = CASSETTE.rows(              # recorded under the API version, not a CID
+        api_version(version),
+        CATALOG_QUERY,
+        lambda: rate_limited(
+            lambda: field_service.search_google_ads_fields(query=CATALOG_QUERY)
+        ),
+    )
+    return [
+        {
+            "name": f.name,
+            "category": f.category.name,
+            "selectable": f.selectable,
+            "filterable": f.filterable,
+            "sortable": f.sortable,
+            "selectable_with": (
+                list(f.selectable_with) if f.category.name == "RESOURCE" else []
+            ),
+        }
+        for f in fields
+    ]
+
+
+def _cache_key(version: str | None) -> str:
+    digest = hashlib.sha1(CATALOG_QUERY.encode("utf-8")).hexdigest()[:8]
+    return f"field_catalog_{api_version(version)}_{digest}"
+
+
+def cached_field_catalog(
+    *, version: str | None = None, ttl: float | None = None
+) -> list[dict] | None:
+    """The catalog on disk if one is younger than `ttl` (None: any age), else
+    None; never sends a request."""
+    return read_json(_cache_key(version), ttl)
+
+
+def load_field_catalog(
+    client,
+    *,
+    version: str | None = None,
+    ttl: float | None = None,
+    refresh: bool = False,
+) -> list[dict]:
+    """Every GAQL field as a dict, from disk when the cached copy is fresh."""
+    if not refresh:
+        cached = cached_field_catalog(version=version, ttl=CATALOG_TTL if ttl is None else ttl)
+        if cached is not None:
+            return cached
+
+    catalog = _fetch(client, version)
+    write_json(_cache_key(version), catalog)
+    return catalog
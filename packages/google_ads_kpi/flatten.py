@@ -0,0 +1,133 @@
+"""
+flatten.py – columnar GAQL row flattener
+
+Replaces `MessageToDict` + `pd.json_normalize`: the SELECT field paths are
+resolved once against the row descriptor, then each path is read straight off
+the raw protobuf with `operator.attrgetter` into a per-column list. Numbers
+stay native (int64 / float64 columns), enums become their names.
+
+Typical use:
+    fields = select_fields(query)
+    df = rows_to_frame(paged_search(ga, cid, query), fields)
+
+    for values in iter_records(paged_search(ga, cid, query), fields):
+        sheet.append(values)          # streaming, one tuple per row
+"""
+
+from itertools import chain
+from operator import attrgetter
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from google.protobuf.descriptor import FieldDescriptor
+
+
+def _raw(row):
+    """Underlying protobuf of a proto-plus row (raw rows pass through)."""
+    return getattr(row, "_pb", row)
+
+
+def _resolve(descriptor, path: str) -> "tuple[FieldDescriptor, str]":
+    """
+    Leaf descriptor of a GAQL path and the matching protobuf attribute path.
+
+    Fields named after Python keywords/builtins carry a trailing underscore in
+    the generated protos (GAQL `conversion_action.type` → `type_`).
+    """
+    fd, attrs = None, []
+    for part in path.split("."):
+        if descriptor is None:
+            raise ValueError(f"{path!r}: {fd.name!r} is not a message")
+        fd = descriptor.fields_by_name.get(part) or descriptor.fields_by_name.get(part + "_")
+        if fd is None:
+            raise ValueError(f"{path!r}: no field {part!r} in {descriptor.full_name}")
+        attrs.append(fd.name)
+        descriptor = fd.message_type
+    return fd, ".".join(attrs)
+
+
+def _converter(fd: "FieldDescriptor"):
+    """Python value for the raw attribute, or None to keep it as is."""
+    repeated = fd.label == fd.LABEL_REPEATED
+    if fd.type == fd.TYPE_ENUM:
+        names = {v.number: v.name for v in fd.enum_type.values}
+        if repeated:
+            return lambda v: [names.get(x, x) for x in v]
+        return lambda v: names.get(v, v)
+    if fd.type == fd.TYPE_MESSAGE:
+        from google.protobuf.json_format import MessageToDict
+
+        to_dict = lambda m: MessageToDict(m, preserving_proto_field_name=True)
+        if repeated:
+            return lambda v: [to_dict(m) for m in v]
+        return to_dict
+    if repeated:
+        return list
+    return None
+
+
+def compile_getters(descriptor, fields) -> list:
+    """One callable per field path: raw protobuf row -> plain Python value."""
+    getters = []
+    for path in fields:
+        fd, attr_path = _resolve(descriptor, path)
+        get = attrgetter(attr_path)
+        convert = _converter(fd)
+        if convert is None:
+            getters.append(get)
+        else:
+            getters.append(lambda pb, get=get, convert=convert: convert(get(pb)))
+    return getters
+
+
+def iter_records(rows, fields):
+    """Yield one tuple of values per row, in `fields` order (streaming)."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    getters = compile_getters(_raw(first).DESCRIPTOR, fields)
+    for row in chain((first,), rows):
+        pb = _raw(row)
+        yield tuple(get(pb) for get in getters)
+
+
+def rows_to_columns(rows, fields) -> dict[str, list]:
+    """Extract `fields` from every row into per-column lists."""
+    fields = list(fields)
+    columns: dict[str, list] = {f: [] for f in fields}
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return columns
+
+    getters = compile_getters(_raw(first).DESCRIPTOR, fields)
+    appenders = [(columns[f].append, get) for f, get in zip(fields, getters)]
+    for row in chain((first,), rows):
+        pb = _raw(row)
+        for append, get in appenders:
+            append(get(pb))
+    return columns
+
+
+def rows_to_frame(rows, fields, *, categorical_enums: bool = True):
+    """
+    Build a DataFrame with one column per field path in a single step.
+
+    Enum columns become pandas categoricals unless `categorical_enums=False`.
+    """
+    import pandas as pd
+
+    fields = list(fields)
+    rows = iter(rows)
+    first = next(rows, None)
+    columns = rows_to_columns(chain((first,), rows) if first is not None else (), fields)
+    frame = pd.DataFrame(columns, columns=fields)
+
+    if categorical_enums and first is not None:
+        descriptor = _raw(first).DESCRIPTOR
+        for path in fields:
+            fd, _ = _resolve(descriptor, path)
+            if fd.type == fd.TYPE_ENUM and fd.label != fd.LABEL_REPEATED:
+                frame[path] = frame[path].astype("category")
+    return frame
@@ -0,0 +1,332 @@
+"""
+gaql.py – local GAQL parser and validator against the field catalog
+
+A misspelt or unselectable field in a GAQL string otherwise only shows up as
+a failing API call, once per account of the scan. `parse()` checks the
+syntax without any I/O; `FieldCatalog.check()` then checks every field
+against the cached GoogleAdsFieldService catalog (catalog.py):
+
+  • the FROM resource exists
+  • SELECT / WHERE / ORDER BY fields exist and are selectable / filterable /
+    sortable respectively
+  • each field can be used with the FROM resource: its own fields, or fields
+    (or attributed resources) in the resource's `selectable_with`
+  • a date segment in SELECT comes with a filter on a date segment in WHERE
+    (segments.date, or a coarser one such as segments.week / segments.month)
+
+Both are cached per normalized query, so each query is parsed and checked
+once per process however many accounts run it. Problems are raised together
+as one GaqlError. Validation is a safety net, not a dependency: if the
+catalog cannot be loaded it is skipped with a warning.
+
+Env:
+    KPI_VALIDATE_GAQL   0 to skip the catalog check at start-up (default 1)
+
+Typical use:
+    q = parse("SELECT campaign.name FROM campaign LIMIT 5")
+    q.resource, q.fields, q.limit               # 'campaign', ('campaign.name',), 5
+
+    catalog = FieldCatalog(load_field_catalog(client))
+    catalog.check(query)                        # raises GaqlError if invalid
+    validate_queries(client, queries)           # all at once, at start-up
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from packages.google_ads_kpi.query import normalize_query
+
+
+class GaqlError(ValueError):
+    """A GAQL query that is malformed or invalid against the field catalog."""
+
+
+@dataclass(frozen=True)
+class Condition:
+    field: str
+    operator: str                  # upper case: "=", "IN", "NOT LIKE", "DURING", …
+    values: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class GaqlQuery:
+    text: str                      # normalized
+    resource: str
+    fields: tuple[str, ...]
+    where: tuple[Condition, ...] = ()
+    order_by: tuple[tuple[str, str], ...] = ()      # (field, "ASC" | "DESC")
+    limit: int | None = None
+    parameters: tuple[tuple[str, str], ...] = ()
+
+    @property
+    def where_fields(self) -> tuple[str, ...]:
+        return tuple(c.field for c in self.where)
+
+    @property
+    def order_fields(self) -> tuple[str, ...]:
+        return tuple(f for f, _ in self.order_by)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Parsing
+# ──────────────────────────────────────────────────────────────────────────────
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<op>!=|>=|<=|=|>|<)
+      | (?P<punct>[(),])
+      | (?P<word>-?\d+(?:\.\d+)?|[A-Za-z_][\w.]*)
+    )""", re.VERBOSE)
+_FIELD_RE = re.compile(r"[a-z][a-z0-9_]*(?:\.[a-z][a-z0-9_]*)*")
+
+# operator words → operator, in longest-first order
+_WORD_OPERATORS = (
+    ("NOT", "REGEXP_MATCH"), ("CONTAINS", "ANY"), ("CONTAINS", "ALL"),
+    ("CONTAINS", "NONE"), ("IS", "NOT", "NULL"), ("IS", "NULL"), ("NOT", "IN"),
+    ("NOT", "LIKE"), ("IN",), ("LIKE",), ("DURING",), ("BETWEEN",),
+    ("REGEXP_MATCH",),
+)
+DATE_SEGMENTS = frozenset({
+    "segments.date", "segments.week", "segments.month",
+    "segments.quarter", "segments.year",
+})
+
+
+def _tokenize(text: str) -> list[str]:
+    tokens, pos, text = [], 0, text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None or match.end() == pos:
+            raise GaqlError(f"unexpected character {text[pos:].lstrip()[:1]!r} at {pos}")
+        tokens.append(match.group(match.lastgroup))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> str | None:
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def keyword(self, *words: str) -> bool:
+        """Consume `words` (case-insensitive) if they come next."""
+        found = [self.peek(i) for i in range(len(words))]
+        if [w.upper() if w else w for w in found] != list(words):
+            return False
+        self.pos += len(words)
+        return True
+
+    def expect(self, *words: str) -> None:
+        if not self.keyword(*words):
+            raise GaqlError(f"expected {' '.join(words)} at {self.peek() or 'end of query'!r}")
+
+    def take(self, what: str) -> str:
+        token = self.peek()
+        if token is None:
+            raise GaqlError(f"expected {what} at end of query")
+        self.pos += 1
+        return token
+
+    def field(self) -> str:
+        token = self.take("a field")
+        if not _FIELD_RE.fullmatch(token):
+            raise GaqlError(f"not a field name: {token!r}")
+        return token
+
+    def field_list(self) -> tuple[str, ...]:
+        fields = [self.field()]
+        while self.keyword(","):
+            fields.append(self.field())
+        return tuple(fields)
+
+    def value(self) -> tuple[str, ...]:
+        if not self.keyword("("):
+            return (self.take("a value"),)
+        values = []
+        while not self.keyword(")"):
+            token = self.take("')'")
+            if token != ",":
+                values.append(token)
+        return tuple(values)
+
+    def condition(self) -> Condition:
+        field = self.field()
+        token = self.peek()
+        if token in ("=", "!=", ">", ">=", "<", "<="):
+            self.pos += 1
+            return Condition(field, token, self.value())
+        for words in _WORD_OPERATORS:
+            if self.keyword(*words):
+                operator = " ".join(words)
+                break
+        else:
+            raise GaqlError(f"expected an operator after {field}, got {token!r}")
+        if operator.startswith("IS"):
+            return Condition(field, operator, ())
+        if operator == "BETWEEN":
+            low = self.take("a value")
+            self.expect("AND")
+            return Condition(field, operator, (low, self.take("a value")))
+        return Condition(field, operator, self.value())
+
+    def parse(self, text: str) -> GaqlQuery:
+        self.expect("SELECT")
+        fields = self.field_list()
+        self.expect("FROM")
+        resource = self.field()
+        where, order_by, limit, parameters = [], [], None, []
+        if self.keyword("WHERE"):
+            where.append(self.condition())
+            while self.keyword("AND"):
+                where.append(self.condition())
+        if self.keyword("ORDER", "BY"):
+            while True:
+                field = self.field()
+                direction = "DESC" if self.keyword("DESC") else "ASC"
+                self.keyword("ASC")
+                order_by.append((field, direction))
+                if not self.keyword(","):
+                    break
+        if self.keyword("LIMIT"):
+            token = self.take("a row count")
+            if not token.isdigit() or int(token) < 1:
+                raise GaqlError(f"LIMIT must be a positive integer, not {token!r}")
+            limit = int(token)
+        if self.keyword("PARAMETERS"):
+            while True:
+                name = self.take("a parameter")
+                self.expect("=")
+                parameters.append((name, self.take("a parameter value")))
+                if not self.keyword(","):
+                    break
+        if self.peek() is not None:
+            raise GaqlError(f"unexpected {self.peek()!r}")
+        if len(set(fields)) != len(fields):
+            raise GaqlError("a field is selected twice")
+        return GaqlQuery(
+            text, resource, fields, tuple(where), tuple(order_by), limit, tuple(parameters)
+        )
+
+
+@lru_cache(maxsize=1024)
+def _parse(text: str) -> GaqlQuery:
+    try:
+        return _Parser(text).parse(text)
+    except GaqlError as exc:
+        raise GaqlError(f"{exc} in: {text}") from None
+
+
+def parse(query: str) -> GaqlQuery:
+    """Parsed form of a GAQL query (cached per normalized text)."""
+    return _parse(normalize_query(query))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Validation against the field catalog
+# ──────────────────────────────────────────────────────────────────────────────
+class FieldCatalog:
+    """Index of catalog.load_field_catalog() entries for query checks."""
+
+    def __init__(self, entries: list[dict]):
+        self.fields = {e["name"]: e for e in entries}
+        self._checked: dict[str, GaqlQuery | GaqlError] = {}
+
+    def problems(self, query: GaqlQuery) -> list[str]:
+        """Every catalog problem of a parsed query (empty if valid)."""
+        resource = self.fields.get(query.resource)
+        if resource is None or resource.get("category") != "RESOURCE":
+            return [f"unknown resource {query.resource!r}"]
+        compatible = set(resource.get("selectable_with", ()))
+
+        problems = []
+        uses = (
+            [(f, "selectable") for f in query.fields]
+            + [(f, "filterable") for f in query.where_fields]
+            + [(f, "sortable") for f in query.order_fields]
+        )
+        for name, flag in uses:
+            entry = self.fields.get(name)
+            if entry is None:
+                problems.append(f"unknown field {name!r}")
+            elif not entry.get(flag):
+                problems.append(f"{name} is not {flag}")
+            elif not self._compatible(query.resource, name, compatible):
+                problems.append(f"{name} cannot be used with FROM {query.resource}")
+        if DATE_SEGMENTS.intersection(query.fields) and not DATE_SEGMENTS.intersection(
+            query.where_fields
+        ):
+            problems.append("date segments in SELECT need a date segment filter in WHERE")
+        return list(dict.fromkeys(problems))
+
+    @staticmethod
+    def _compatible(resource: str, name: str, compatible: set) -> bool:
+        prefix = name.split(".", 1)[0]
+        if prefix == resource:
+            return True
+        if prefix in ("metrics", "segments"):
+            return name in compatible
+        return prefix in compatible or name in compatible   # attributed resource
+
+    def check(self, query: str) -> GaqlQuery:
+        """Parsed `query` if it is valid, else GaqlError (cached per query)."""
+        text = normalize_query(query)
+        result = self._checked.get(text)
+        if result is None:
+            try:
+                parsed = _parse(text)
+                problems = self.problems(parsed)
+                result = parsed if not problems else GaqlError(
+                    "; ".join(problems) + f" in: {text}"
+                )
+            except GaqlError as exc:
+                result = exc
+            self._checked[text] = result
+        if isinstance(result, GaqlError):
+            raise result
+        return result
+
+
+def validate_queries(
+    client,
+    queries,
+    *,
+    catalog: FieldCatalog | None = None,
+    cached_only: bool = False,
+) -> None:
+    """
+    Check every query in `queries` (strings, or {label: query}) against the
+    field catalog; one GaqlError lists all invalid ones. Nothing is checked
+    (nor the catalog loaded) with KPI_VALIDATE_GAQL=0.
+
+    A catalog that fails to load skips the check with a warning. With
+    `cached_only`, only a catalog already on disk is used (any age): a cold
+    cache skips the check instead of costing a download.
+    """
+    if os.getenv("KPI_VALIDATE_GAQL", "1").lower() in ("0", "false", "no"):
+        return
+    if catalog is None:
+        from packages.google_ads_kpi.catalog import cached_field_catalog, load_field_catalog
+
+        try:
+            entries = cached_field_catalog() if cached_only else load_field_catalog(client)
+        except Exception as exc:
+            print(f"⚠️  GAQL not validated: field catalog unavailable ({exc})")
+            return
+        if entries is None:
+            return                                  # cached_only, nothing on disk
+        catalog = FieldCatalog(entries)
+    items = queries.items() if isinstance(queries, dict) else enumerate(queries)
+    errors = []
+    for label, query in items:
+        try:
+            catalog.check(query)
+        except GaqlError as exc:
+            errors.append(f"  • {label}: {exc}" if isinstance(label, str) else f"  • {exc}")
+    if errors:
+        raise GaqlError("invalid GAQL:\n" + "\n".join(errors))
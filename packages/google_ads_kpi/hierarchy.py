@@ -3,6 +3,11 @@
 Hierarchy utilities: identify all *leaf* (non-manager) accounts that sit
 under a given manager/MCC.
 
+`customer_client` queried at the root already lists every descendant with
+its level and manager flag, so the whole tree is resolved with ONE streamed
+query and cached on disk (KPI_CACHE_DIR) for HIERARCHY_CACHE_TTL seconds
+(default 24h). Warm reruns skip the API entirely.
+
 Typical use:
     from google_ads_kpi.auth import get_client
     from google_ads_kpi.hierarchy import list_leaf_accounts
@@ -12,61 +17,135 @@ Typical use:
     print(leaves)   # {'7192753145': 'Scarlett Gaming', ...}
 """
 
-from google.api_core.retry import Retry, if_exception_type
-from google.api_core import exceptions
+import os
+from dataclasses import asdict, dataclass
 
-# Retry spec reused across GAQL calls
-DEFAULT_RETRY = Retry(
-    predicate=if_exception_type(
-        exceptions.ServiceUnavailable,
-        exceptions.DeadlineExceeded,
-    ),
-    initial=2.0, maximum=32.0, multiplier=2.0, deadline=60.0,
-)
+from packages.google_ads_kpi.auth import get_service
+from packages.google_ads_kpi.cache import read_json, write_json
+# Retry spec and rate-limited search shared with every other GAQL call
+from packages.google_ads_kpi.query import paged_search
 
-def list_leaf_accounts(client, manager_cid: str) -> dict[str, str]:
-    """
-    Recursively walk the customer_client tree starting at `manager_cid`
-    and return {leaf_cid: descriptive_name} for every non-manager child.
+HIERARCHY_TTL = float(os.getenv("HIERARCHY_CACHE_TTL", str(24 * 3600)))
+
+
+@dataclass(frozen=True)
+class AccountNode:
+    cid: str                 # 10-digit, no dashes
+    name: str
+    manager: bool
+    parent: str | None       # None when not resolved (see resolve_hierarchy)
+    level: int               # 0 = the root itself
+
+
+def _client_cid(row) -> str:
+    return (
+        row.customer_client.client_customer  # "customers/1234567890"
+        .split("/")[1]
+        .replace("-", "")
+    )
 
-    manager_cid  – 10-digit string, no dashes
-    """
-    ga_service = client.get_service("GoogleAdsService")
 
-    # GAQL grabs client CID, name and manager flag
-    query = """
+def _tree_query(max_level: int | None = None) -> str:
+    level = f"\n        AND customer_client.level <= {max_level}" if max_level else ""
+    return f"""
       SELECT
         customer_client.client_customer,
         customer_client.descriptive_name,
-        customer_client.manager
+        customer_client.manager,
+        customer_client.level
       FROM customer_client
-      WHERE customer_client.status = 'ENABLED'
+      WHERE customer_client.status = 'ENABLED'{level}
     """
 
-    leaves: dict[str, str] = {}
-    visited: set[str] = set()
-
-    def _walk(cid: str):
-        if cid in visited:
-            return
-        visited.add(cid)
-
-        for row in ga_service.search(
-            customer_id=cid,
-            query=query,
-            retry=DEFAULT_RETRY,
-            timeout=15.0,
-        ):
-            child_cid = (
-                row.customer_client.client_customer  # "customers/1234567890"
-                .split("/")[1]
-                .replace("-", "")
-            )
-            name = row.customer_client.descriptive_name
-            if row.customer_client.manager:
-                _walk(child_cid)              # recurse into sub-manager
-            else:
-                leaves[child_cid] = name      # store leaf
-
-    _walk(manager_cid)
-    return leaves
+
+def _add_node(nodes: dict[str, AccountNode], row, root_cid: str) -> None:
+    cid = _client_cid(row)
+    level = row.customer_client.level
+    if cid in nodes and nodes[cid].level <= level:
+        return                                # keep the shallowest path
+    nodes[cid] = AccountNode(
+        cid=cid,
+        name=row.customer_client.descriptive_name,
+        manager=bool(row.customer_client.manager),
+        parent=root_cid if level == 1 else None,
+        level=level,
+    )
+
+
+def _set_parent(nodes: dict[str, AccountNode], mgr: AccountNode, row) -> None:
+    child = nodes.get(_client_cid(row))
+    if child is not None and child.level == mgr.level + 1:
+        nodes[child.cid] = AccountNode(**{**asdict(child), "parent": mgr.cid})
+
+
+def _sub_managers(nodes: dict[str, AccountNode]) -> list[AccountNode]:
+    return [n for n in nodes.values() if n.manager and n.level >= 1]
+
+
+def _fetch_tree(ga_service, root_cid: str, resolve_parents: bool) -> list[AccountNode]:
+    nodes: dict[str, AccountNode] = {}
+    for row in paged_search(
+        ga_service,
+        root_cid,
+        _tree_query(),
+        stream=True,
+    ):
+        _add_node(nodes, row, root_cid)
+
+    if resolve_parents:
+        # customer_client has no parent field: ask each sub-manager for its
+        # direct children (one extra query per sub-manager, cached with the tree)
+        for mgr in _sub_managers(nodes):
+            for row in paged_search(ga_service, mgr.cid, _tree_query(max_level=1)):
+                _set_parent(nodes, mgr, row)
+
+    return sorted(nodes.values(), key=lambda n: n.level)
+
+
+def _cache_key(manager_cid: str, resolve_parents: bool) -> str:
+    return f"hierarchy_{manager_cid}{'_parents' if resolve_parents else ''}"
+
+
+def resolve_hierarchy(
+    client,
+    manager_cid: str,
+    *,
+    ttl: float | None = None,
+    refresh: bool = False,
+    resolve_parents: bool = False,
+) -> list[AccountNode]:
+    """
+    Return every ENABLED account under `manager_cid` (root included), shallowest
+    first, from the on-disk cache when it is younger than `ttl` seconds.
+
+    manager_cid      – 10-digit string, no dashes
+    ttl              – cache lifetime (default HIERARCHY_TTL)
+    refresh          – ignore the cache and re-query
+    resolve_parents  – fill `parent` below level 1 as well (costs one query
+                       per sub-manager); otherwise only level-1 accounts have
+                       a parent (the root)
+    """
+    key = _cache_key(manager_cid, resolve_parents)
+    if not refresh:
+        cached = read_json(key, HIERARCHY_TTL if ttl is None else ttl)
+        if cached is not None:
+            return [AccountNode(**n) for n in cached]
+
+    ga_service = get_service(client)
+    nodes = _fetch_tree(ga_service, manager_cid, resolve_parents)
+    write_json(key, [asdict(n) for n in nodes])
+    return nodes
+
+
+def list_leaf_accounts(client, manager_cid: str, **kwargs) -> dict[str, str]:
+    """
+    Return {leaf_cid: descriptive_name} for every non-manager account under
+    `manager_cid` (keyword args as for `resolve_hierarchy`).
+
+    manager_cid  – 10-digit string, no dashes
+    """
+    return {
+        node.cid: node.name
+        for node in resolve_hierarchy(client, manager_cid, **kwargs)
+        if not node.manager
+    }
@@ -0,0 +1,272 @@
+"""
+metrics.py – per-query / per-KPI / per-account instrumentation
+
+`paged_search` records one "query" sample per GAQL call, the KPI plan records
+one "kpi" sample per KPI evaluation and `scan_account` one "account" sample
+per account. Each sample carries wall time, rows returned, retries attempted
+and the error class (if any). At the end of a run the process-wide
+`RECORDER` writes a p50/p95/p99 summary as JSON and in Prometheus textfile
+format (for node_exporter's textfile collector). Counts, totals and maxima
+are exact; quantiles come from the last LATENCY_WINDOW samples per series,
+so memory stays flat however long the process (e.g. the KPI service) runs.
+
+Typical use:
+    with RECORDER.span("kpi", "auto_tagging", customer_id=cid) as span:
+        span.rows = len(rows)
+    RECORDER.write_json("kpi_metrics.json")
+    RECORDER.write_prometheus("kpi_metrics.prom")
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+QUANTILES = (0.5, 0.95, 0.99)
+SLOWEST_KEPT = 10                       # per kind, for "who is slow?" triage
+LATENCY_WINDOW = 2_000                  # most recent latencies kept per series
+_DONE = object()
+
+
+@dataclass
+class Span:
+    kind: str                            # "query" | "kpi" | "account"
+    name: str
+    customer_id: str | None = None
+    rows: int = 0
+    retries: int = 0
+    error: str | None = None             # exception class name
+    start: float = field(default_factory=time.perf_counter)
+    seconds: float = 0.0
+
+
+@dataclass
+class _Series:
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    retries: int = 0
+    errors: Counter = field(default_factory=Counter)
+
+
+def _quantile(ordered: list[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted list."""
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class Recorder:
+    """Thread-safe collector of spans, aggregated per (kind, name)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # active spans, per thread and per asyncio task (tasks copy the stack
+        # of whoever created them, so an account's queries see its span)
+        self._stack: ContextVar[tuple[Span, ...]] = ContextVar("active_spans", default=())
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series: dict[tuple[str, str], _Series] = {}
+            self._slowest: dict[str, list] = {}
+            self.started = time.time()
+
+    # ── recording ─────────────────────────────────────────────────────────
+    def start(self, kind: str, name: str, customer_id: str | None = None) -> Span:
+        return Span(kind, name, customer_id)
+
+    def finish(self, span: Span, error: BaseException | None = None) -> Span:
+        span.seconds = time.perf_counter() - span.start
+        if error is not None:
+            span.error = type(error).__name__
+        self.record(span)
+        return span
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            series = self._series.setdefault((span.kind, span.name), _Series())
+            series.latencies.append(span.seconds)
+            series.count += 1
+            series.total += span.seconds
+            series.max = max(series.max, span.seconds)
+            series.rows += span.rows
+            series.retries += span.retries
+            if span.error:
+                series.errors[span.error] += 1
+
+            slowest = self._slowest.setdefault(span.kind, [])
+            item = (span.seconds, span.name, span.customer_id or "")
+            if len(slowest) < SLOWEST_KEPT:
+                heapq.heappush(slowest, item)
+            elif item > slowest[0]:
+                heapq.heapreplace(slowest, item)
+
+    @contextmanager
+    def span(self, kind: str, name: str, customer_id: str | None = None):
+        """Time a block; exceptions are recorded by class and re-raised."""
+        span = self.start(kind, name, customer_id)
+        try:
+            with self.active(span):
+                yield span
+        except Exception as exc:
+            self.finish(span, exc)
+            raise
+        self.finish(span)
+
+    def trace(self, kind: str, name: str, iterable, customer_id: str | None = None):
+        """
+        Yield from `iterable`, recording one span over the whole iteration.
+
+        The span counts the rows yielded and is only active (for retries)
+        while the underlying iterator runs, not while the consumer does.
+        """
+        span = self.start(kind, name, customer_id)
+        rows = iter(iterable)
+        try:
+            while True:
+                with self.active(span):
+                    row = next(rows, _DONE)
+                if row is _DONE:
+                    break
+                span.rows += 1
+                yield row
+        except GeneratorExit:                 # consumer stopped early
+            self.finish(span)
+            raise
+        except Exception as exc:
+            self.finish(span, exc)
+            raise
+        self.finish(span)
+
+    async def atrace(self, kind: str, name: str, aiterable, customer_id: str | None = None):
+        """`trace` for async iterables (see aio.paged_search_async)."""
+        span = self.start(kind, name, customer_id)
+        rows = aiter(aiterable)
+        try:
+            while True:
+                with self.active(span):
+                    row = await anext(rows, _DONE)
+                if row is _DONE:
+                    break
+                span.rows += 1
+                yield row
+        except GeneratorExit:
+            self.finish(span)
+            raise
+        except BaseException as exc:          # incl. CancelledError
+            self.finish(span, exc)
+            raise
+        self.finish(span)
+
+    # ── retry accounting (Retry(on_error=…) / quota retries) ───────────────
+    @contextmanager
+    def active(self, span: Span):
+        """Make `span` a target of `note_retry()` on this thread / task."""
+        token = self._stack.set(self._stack.get() + (span,))
+        try:
+            yield span
+        finally:
+            self._stack.reset(token)
+
+    def note_retry(self, exc: BaseException | None = None) -> None:
+        """Count a retry against every span active on this thread / task
+        (query, the KPIs waiting on it, the account being scanned)."""
+        for span in self._stack.get():
+            span.retries += 1
+
+    # ── reporting ─────────────────────────────────────────────────────────
+    def summary(self) -> dict:
+        # copy under the lock, sort outside it: recording never waits on a sort
+        with self._lock:
+            series = {
+                k: (list(s.latencies), s.count, s.total, s.max, s.rows, s.retries, dict(s.errors))
+                for k, s in self._series.items()
+            }
+            slowest = {k: sorted(v, reverse=True) for k, v in self._slowest.items()}
+
+        out: dict = {"started": self.started, "generated": time.time()}
+        for (kind, name), (recent, count, total, most, rows, retries, errors) in sorted(
+            series.items()
+        ):
+            recent.sort()
+            out.setdefault(kind, {})[name] = {
+                "count": count,
+                **{f"p{int(q * 100)}_s": round(_quantile(recent, q), 4) for q in QUANTILES},
+                "max_s": round(most, 4),
+                "total_s": round(total, 4),
+                "rows": rows,
+                "retries": retries,
+                "errors": errors,
+            }
+        out["slowest"] = {
+            kind: [
+                {"seconds": round(sec, 4), "name": name, "customer_id": cid}
+                for sec, name, cid in items
+            ]
+            for kind, items in slowest.items()
+        }
+        return out
+
+    def write_json(self, path: str) -> str:
+        _atomic_write(path, json.dumps(self.summary(), indent=2))
+        return path
+
+    def write_prometheus(self, path: str, prefix: str = "gads_kpi") -> str:
+        summary = self.summary()
+        lines = [
+            f"# HELP {prefix}_latency_seconds Wall time per KPI / query / account in the last run",
+            f"# TYPE {prefix}_latency_seconds summary",
+        ]
+        counters = {"rows": [], "retries": [], "errors": []}
+        for kind in ("kpi", "query", "account"):
+            for name, s in summary.get(kind, {}).items():
+                labels = f'kind="{kind}",name="{_escape(name)}"'
+                for q in QUANTILES:
+                    value = s[f"p{int(q * 100)}_s"]
+                    lines.append(f'{prefix}_latency_seconds{{{labels},quantile="{q}"}} {value}')
+                lines.append(f"{prefix}_latency_seconds_sum{{{labels}}} {s['total_s']}")
+                lines.append(f"{prefix}_latency_seconds_count{{{labels}}} {s['count']}")
+                counters["rows"].append(f"{prefix}_rows_total{{{labels}}} {s['rows']}")
+                counters["retries"].append(f"{prefix}_retries_total{{{labels}}} {s['retries']}")
+                for error, n in s["errors"].items():
+                    counters["errors"].append(
+                        f'{prefix}_errors_total{{{labels},error="{_escape(error)}"}} {n}'
+                    )
+        for metric, help_text in (
+            ("rows", "GAQL rows returned"),
+            ("retries", "Retries attempted (transient + quota)"),
+            ("errors", "Failures by exception class"),
+        ):
+            lines.append(f"# HELP {prefix}_{metric}_total {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric}_total counter")
+            lines.extend(counters[metric])
+        lines.append(f"# HELP {prefix}_last_run_timestamp_seconds End of the last run")
+        lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{prefix}_last_run_timestamp_seconds {summary['generated']:.0f}")
+        _atomic_write(path, "\n".join(lines) + "\n")
+        return path
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _atomic_write(path: str, text: str) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+
+
+RECORDER = Recorder()
+
+
+def note_retry(exc: BaseException | None = None) -> None:
+    """`Retry(on_error=…)` hook: count a retry against the active span."""
+    RECORDER.note_retry(exc)
@@ -2,23 +2,155 @@
 query.py – convenience wrappers for Google Ads GAQL calls
 """
 
-from google.api_core.retry import Retry, if_exception_type
-from google.api_core import exceptions
+import hashlib
+import re
+import time
+from functools import cache
+
+from packages.google_ads_kpi.cassette import CASSETTE
+from packages.google_ads_kpi.metrics import RECORDER, note_retry
+from packages.google_ads_kpi.ratelimit import (
+    RATE_LIMITER,
+    is_quota_error,
+    retry_delay,
+)
+from packages.google_ads_kpi.records import project
+from packages.google_ads_kpi.timeouts import (
+    POLICY,
+    RUN_DEADLINE,
+    hedged,
+    is_timeout,
+)
 
 
 # --------------------------------------------------------------------------- #
 # Default retry: handles transient 503/504                                         #
 # --------------------------------------------------------------------------- #
-DEFAULT_RETRY = Retry(
-    predicate=if_exception_type(
-        exceptions.ServiceUnavailable,      # 503
-        exceptions.DeadlineExceeded         # 504 / socket timeout
-    ),
-    initial=2.0,        # seconds
-    maximum=32.0,
-    multiplier=2.0,     # exponential back-off
-    deadline=60.0       # total wall-time per call
-)
+@cache
+def default_retry():
+    """Shared Retry policy; api_core is imported on first use, not at import."""
+    from google.api_core.retry import Retry, if_exception_type
+    from google.api_core import exceptions
+
+    return Retry(
+        predicate=if_exception_type(
+            exceptions.ServiceUnavailable,      # 503
+            exceptions.DeadlineExceeded         # 504 / socket timeout
+        ),
+        initial=2.0,        # seconds
+        maximum=32.0,
+        multiplier=2.0,     # exponential back-off
+        deadline=60.0,      # total wall-time per call
+        on_error=note_retry,  # count retries against the running query span
+    )
+
+
+def __getattr__(name):
+    # `from query import DEFAULT_RETRY` keeps working, lazily
+    if name == "DEFAULT_RETRY":
+        return default_retry()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Quota errors are not in DEFAULT_RETRY: they are retried here, after the
+# shared rate limiter has slowed down and waited out the server's delay.
+QUOTA_ATTEMPTS = 5
+
+
+def rate_limited(call, *, limiter=None, attempts: int = QUOTA_ATTEMPTS):
+    """
+    Invoke `call()` through the process-wide rate limiter.
+
+    Quota errors (RESOURCE_EXHAUSTED) slow the limiter down and are retried
+    up to `attempts` times; anything else propagates unchanged.
+    """
+    limiter = limiter or RATE_LIMITER
+    for attempt in range(1, attempts + 1):
+        limiter.acquire()
+        try:
+            result = call()
+        except Exception as exc:
+            if attempt == attempts or not is_quota_error(exc):
+                raise
+            limiter.on_quota_error(retry_delay(exc))
+            note_retry(exc)
+            continue
+        limiter.on_success()
+        return result
+
+
+# --------------------------------------------------------------------------- #
+# Streaming: one search_stream() call instead of one search() per page          #
+# --------------------------------------------------------------------------- #
+DEFAULT_TIMEOUT = 15.0      # unary search(), per page
+STREAM_TIMEOUT = 300.0      # search_stream(), whole result set
+
+# Resources whose result size is usually large enough to stream by default
+STREAM_RESOURCES = frozenset({
+    "keyword_view",
+    "search_term_view",
+    "ad_group_ad",
+    "ad_group_criterion",
+    "shopping_performance_view",
+    "change_event",
+})
+
+_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)", re.IGNORECASE)
+_FROM_RE = re.compile(r"\bFROM\s+(\w+)", re.IGNORECASE)
+_SELECT_RE = re.compile(r"\bSELECT\s+(.*?)\s+FROM\b", re.IGNORECASE | re.DOTALL)
+
+
+def select_fields(query: str) -> list[str]:
+    """Field paths in the SELECT clause, in order (e.g. 'metrics.clicks')."""
+    match = _SELECT_RE.search(query)
+    if not match:
+        raise ValueError("GAQL query has no SELECT … FROM clause")
+    return [f.strip() for f in match.group(1).split(",") if f.strip()]
+
+
+def normalize_query(query: str) -> str:
+    """Whitespace-insensitive form of a GAQL string (for keys and labels)."""
+    return " ".join(query.split())
+
+
+def query_name(query: str) -> str:
+    """Stable short label for a query shape, e.g. 'conversion_action#3f9a1c2e'."""
+    resource = _FROM_RE.search(query)
+    digest = hashlib.sha1(normalize_query(query).encode()).hexdigest()[:8]
+    return f"{resource.group(1) if resource else 'unknown'}#{digest}"
+
+
+def should_stream(query: str, page_size: int, expected_rows: int | None = None) -> bool:
+    """
+    Pick streaming when the result is expected to span more than one page.
+
+    Uses `expected_rows` if the caller knows it, else the query's LIMIT, else
+    a heuristic: date-segmented queries and STREAM_RESOURCES stream.
+    """
+    if expected_rows is None:
+        limit = _LIMIT_RE.search(query)
+        if limit:
+            expected_rows = int(limit.group(1))
+    if expected_rows is not None:
+        return expected_rows > page_size
+
+    resource = _FROM_RE.search(query)
+    return "segments.date" in query or (
+        resource is not None and resource.group(1) in STREAM_RESOURCES
+    )
+
+
+def _open_stream(ga_service, customer_id, query, retry, timeout):
+    """Start search_stream and pull the first batch so start-up errors surface here."""
+    batches = iter(
+        ga_service.search_stream(
+            customer_id=customer_id,
+            query=query,
+            retry=retry,
+            timeout=timeout,
+        )
+    )
+    return next(batches, None), batches
 
 
 def paged_search(
@@ -27,26 +159,135 @@ def paged_search(
     query: str,
     *,
     page_size: int = 1000,
-    retry=DEFAULT_RETRY,
-    timeout: float = 15.0,
+    retry=None,
+    timeout: float | None = None,
+    limiter=None,
+    stream: bool | None = None,
+    expected_rows: int | None = None,
+    fields=None,
 ):
     """
-    Generator yielding GAQL rows, using paged `search()` not `search_stream()`.
+    Generator yielding GAQL rows, using paged `search()` or `search_stream()`.
 
     Args:
-        ga_service    : client.get_service("GoogleAdsService")
+        ga_service    : auth.get_service(client) (or client.get_service(…))
         customer_id   : leaf CID (numeric str, no dashes)
         query         : GAQL string
-        retry, timeout: gRPC call options
+        page_size     : results expected per page; larger results stream
+        retry, timeout: gRPC call options (retry defaults to DEFAULT_RETRY;
+                        timeout to an adaptive one per query shape, at most
+                        DEFAULT_TIMEOUT, or STREAM_TIMEOUT when streaming –
+                        see timeouts.POLICY). Both are cut to the run
+                        deadline, if one is set.
+        limiter       : rate limiter (default: ratelimit.RATE_LIMITER)
+        stream        : True/False to force a mode, None to pick one from
+                        `expected_rows` / the query (see should_stream)
+        expected_rows : caller's estimate of the result size
+        fields        : SELECT paths to keep; rows are then projected into
+                        compact records as they arrive (records.project)
 
     Yields:
-        google.ads.googleads.v* resources (rows)
+        google.ads.googleads.v* resources (rows), or records with `fields`;
+        when streaming, one server batch is held in memory at a time.
+
+    Each call is recorded as a "query" sample in `metrics.RECORDER`. Slow
+    unary calls are hedged when KPI_HEDGE is set. With KPI_CASSETTE set,
+    results are recorded or replayed (see cassette.py).
     """
-    response = ga_service.search(
-        customer_id=customer_id,
-        query=query,
-        retry=retry,
-        timeout=timeout,
-    )
-    for row in response:
-        yield row
+    shape = query_name(query)
+    rows = CASSETTE.rows(customer_id, query, lambda: _search(
+        ga_service, customer_id, query, page_size,
+        default_retry() if retry is None else retry, timeout,
+        limiter, stream, expected_rows, shape,
+    ))
+    rows = RECORDER.trace("query", shape, rows, customer_id)
+    return rows if fields is None else project(rows, fields)
+
+
+def call_timeout(shape: str, timeout: float | None, default: float) -> float:
+    """Caller's timeout, else the policy's for `shape`; cut to the run deadline."""
+    if timeout is not None:
+        return RUN_DEADLINE.cap(timeout)
+    return POLICY.timeout(shape, default)
+
+
+def _search(
+    ga_service, customer_id, query, page_size, retry, timeout,
+    limiter, stream, expected_rows, shape,
+):
+    if stream is None:
+        stream = should_stream(query, page_size, expected_rows)
+    retry = RUN_DEADLINE.cap_retry(retry)
+
+    if stream:
+        budget = call_timeout(shape, timeout, STREAM_TIMEOUT)
+        start = time.perf_counter()
+        try:
+            first, batches = rate_limited(
+                lambda: _open_stream(ga_service, customer_id, query, retry, budget),
+                limiter=limiter,
+            )
+            if first is not None:
+                yield from first.results
+                for batch in batches:
+                    yield from batch.results
+        except Exception as exc:
+            if is_timeout(exc):
+                POLICY.observe(shape, budget, timed_out=True)
+            raise
+        POLICY.observe(shape, time.perf_counter() - start)
+        return
+
+    budget = call_timeout(shape, timeout, DEFAULT_TIMEOUT)
+    delay = POLICY.hedge_delay(shape)
+    def call():
+        return ga_service.search(
+            customer_id=customer_id,
+            query=query,
+            retry=retry,
+            timeout=budget,
+        )
+
+    def _timed():
+        start = time.perf_counter()
+        try:
+            if delay is None:
+                result = call()
+            else:
+                # read-only, so a duplicate request is safe
+                result = hedged(call, delay, before_hedge=(limiter or RATE_LIMITER).acquire)
+        except Exception as exc:
+            if is_timeout(exc):
+                POLICY.observe(shape, budget, timed_out=True)
+            raise
+        POLICY.observe(shape, time.perf_counter() - start)
+        return result
+
+    response = rate_limited(_timed, limiter=limiter)
+    yield from _paged_rows(response, limiter or RATE_LIMITER)
+
+
+def _paged_rows(response, limiter):
+    """
+    Rows of a search() pager. Every further page is a request of its own: it
+    takes a rate-limiter token first and reports quota errors to the limiter
+    (the page itself is not retried; the error reaches the caller).
+    """
+    pages = getattr(response, "pages", None)
+    if pages is None:                           # plain iterable of rows
+        yield from response
+        return
+    pages = iter(pages)
+    page = next(pages, None)                    # first page: already fetched
+    while page is not None:
+        yield from page.results
+        if not page.next_page_token:
+            return
+        limiter.acquire()
+        try:
+            page = next(pages, None)
+        except Exception as exc:
+            if is_quota_error(exc):
+                limiter.on_quota_error(retry_delay(exc))
+            raise
+        limiter.on_success()
@@ -0,0 +1,163 @@
+"""
+ratelimit.py – process-wide token bucket for Google Ads API calls
+
+Every GAQL request (`query.paged_search`, `query.rate_limited`) takes a
+token from `RATE_LIMITER` first: the initial search() / search_stream() call
+and each further search() page. A search_stream is one request however many
+batches it returns, so its batches take no tokens. Quota errors on the
+initial call are retried; on a later page they slow the limiter down and
+reach the caller. The bucket refills at `rate` requests/second and
+adapts to the server:
+
+  • quota error (RESOURCE_EXHAUSTED) → rate is cut (multiplicative decrease)
+    and all callers pause for the retry delay the server suggested
+  • successful call                    → rate creeps back up (additive
+    increase) towards the configured ceiling
+
+so a large scan settles at the highest rate the developer token sustains.
+
+Env:
+    GOOGLE_ADS_QPS    ceiling in requests/second (default 10)
+"""
+
+import os
+import threading
+import time
+from datetime import timedelta
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe AIMD token bucket."""
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        *,
+        burst: float | None = None,
+        min_rate: float = 0.5,
+        increase: float = 0.05,      # req/s added per successful call
+        decrease: float = 0.5,       # factor applied on a quota error
+        default_delay: float = 5.0,  # pause when the server gives no hint
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.increase = increase
+        self.decrease = decrease
+        self.default_delay = default_delay
+
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self.quota_errors = 0
+        self.waited = 0.0            # total seconds callers were held back
+
+    @property
+    def rate(self) -> float:
+        """Current sustained rate in requests/second."""
+        return self._rate
+
+    def reserve(self) -> float:
+        """Take one token; return how many seconds the caller must wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._stamp) * self._rate
+            )
+            self._stamp = now
+            self._tokens -= 1.0
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            wait = max(wait, self._paused_until - now)
+            self.waited += wait
+            return wait
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.increase)
+
+    def on_quota_error(self, retry_delay: float | None = None) -> float:
+        """Back off after a quota error; return the pause applied (seconds)."""
+        delay = retry_delay if retry_delay is not None else self.default_delay
+        with self._lock:
+            self.quota_errors += 1
+            self._rate = max(self.min_rate, self._rate * self.decrease)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._tokens = min(self._tokens, 0.0)
+        return delay
+
+    def reset(self, rate: float | None = None) -> None:
+        """Forget back-off state; optionally change the ceiling (requests/s)."""
+        with self._lock:
+            if rate is not None:
+                if rate <= 0:
+                    raise ValueError("rate must be > 0")
+                self.max_rate = rate
+                self.min_rate = min(self.min_rate, rate)
+                self.burst = max(rate, 1.0)
+            self._rate = self.max_rate
+            self._tokens = self.burst
+            self._stamp = time.monotonic()
+            self._paused_until = 0.0
+            self.quota_errors = 0
+            self.waited = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": round(self._rate, 3),
+                "max_rate": self.max_rate,
+                "quota_errors": self.quota_errors,
+                "waited_s": round(self.waited, 3),
+            }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Quota-error detection (api_core ResourceExhausted or GoogleAdsException)
+# ──────────────────────────────────────────────────────────────────────────────
+def is_quota_error(exc: BaseException) -> bool:
+    """True for RESOURCE_EXHAUSTED, however the client library surfaced it."""
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    failure = getattr(exc, "failure", None)         # GoogleAdsException
+    if failure is not None:
+        if any(err.error_code.quota_error for err in failure.errors):
+            return True
+    code = getattr(getattr(exc, "error", None), "code", None)
+    if callable(code):
+        return getattr(code(), "name", "") == "RESOURCE_EXHAUSTED"
+    return False
+
+
+def retry_delay(exc: BaseException) -> float | None:
+    """Server-suggested wait in seconds, if the error carries one."""
+    delays = []
+    failure = getattr(exc, "failure", None)
+    if failure is not None:
+        for err in failure.errors:
+            delays.append(err.details.quota_error_details.retry_delay)
+    for detail in getattr(exc, "details", None) or ():  # google.rpc.RetryInfo
+        if hasattr(detail, "retry_delay"):
+            delays.append(detail.retry_delay)
+
+    seconds = [_seconds(d) for d in delays]
+    seconds = [s for s in seconds if s]
+    return max(seconds) if seconds else None
+
+
+def _seconds(duration) -> float:
+    if isinstance(duration, timedelta):                  # proto-plus
+        return duration.total_seconds()
+    return getattr(duration, "seconds", 0) + getattr(duration, "nanos", 0) / 1e9
+
+
+RATE_LIMITER = AdaptiveRateLimiter(rate=float(os.getenv("GOOGLE_ADS_QPS", "10")))
@@ -0,0 +1,185 @@
+"""
+records.py – compact GAQL rows and single-pass aggregation
+
+A proto-plus GoogleAdsRow keeps the whole protobuf message (and a Python
+wrapper per nested message touched) alive, even when a KPI reads three
+scalars out of it. `project()` turns rows into `__slots__` records holding
+just the selected fields, converted once, as the rows stream in (enums become
+their names, as in flatten.py). For columns instead of records, feed the
+stream to `flatten.rows_to_columns`.
+
+Record attributes are the field paths with the FROM resource dropped and the
+remaining dots replaced by "_":
+
+    conversion_action.name                              → rec.name
+    conversion_action.value_settings.default_value      → rec.value_settings_default_value
+    metrics.clicks  (FROM campaign)                     → rec.metrics_clicks
+
+`rec["conversion_action.name"]` works with the full path too.
+
+The aggregators (Count, Collect, First) consume a stream once and keep only
+their result, so a KPI over thousands of rows never materialises them.
+
+Typical use:
+    for rec in project(paged_search(ga, cid, query), fields):
+        print(rec.name, rec.status)
+
+    totals = fold(
+        paged_search(ga, cid, query, fields=fields),
+        enabled=Count(lambda a: a.status == "ENABLED"),
+        names=Collect(lambda a: a.name),
+    )                                     # {'enabled': 12, 'names': [...]}
+"""
+
+from functools import cache
+
+from packages.google_ads_kpi.flatten import _raw, compile_getters, iter_records
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Compact records
+# ──────────────────────────────────────────────────────────────────────────────
+class Record:
+    """Base of the generated record types (see record_type)."""
+
+    __slots__ = ()
+    fields: tuple[str, ...] = ()          # GAQL paths, in slot order
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("records are read-only")
+
+    def __getitem__(self, path: str):
+        return getattr(self, self.__slots__[self.fields.index(path)])
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return (
+            type(other) is type(self) and tuple(self) == tuple(other)
+        )
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        values = ", ".join(f"{n}={getattr(self, n)!r}" for n in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+    def as_dict(self) -> dict:
+        """{GAQL path: value}."""
+        return dict(zip(self.fields, self))
+
+
+def attribute_names(fields) -> tuple[str, ...]:
+    """Record attribute for each GAQL path (see module docstring)."""
+    fields = tuple(fields)
+    resource = fields[0].split(".", 1)[0] if fields else ""
+    names = tuple(
+        (f.split(".", 1)[1] if f.startswith(resource + ".") else f).replace(".", "_")
+        for f in fields
+    )
+    if len(set(names)) != len(names):
+        raise ValueError(f"fields map to duplicate attributes: {fields}")
+    return names
+
+
+@cache
+def record_type(fields: tuple[str, ...]) -> type:
+    """The `__slots__` record class for a SELECT field list (one per list)."""
+    resource = fields[0].split(".", 1)[0] if fields else "row"
+    name = "".join(p.title() for p in resource.split("_")) + "Record"
+    return type(name, (Record,), {"__slots__": attribute_names(fields), "fields": fields})
+
+
+def project(rows, fields):
+    """Yield one compact record per GAQL row, holding only `fields`."""
+    fields = tuple(fields)
+    make = record_type(fields)
+    for values in iter_records(rows, fields):
+        yield make(*values)
+
+
+async def aproject(rows, fields):
+    """`project` for an async iterator of rows (aio.paged_search_async)."""
+    fields = tuple(fields)
+    make, getters = record_type(fields), None
+    async for row in rows:
+        pb = _raw(row)
+        if getters is None:
+            getters = compile_getters(pb.DESCRIPTOR, fields)
+        yield make(*(get(pb) for get in getters))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Single-pass aggregators
+# ──────────────────────────────────────────────────────────────────────────────
+class Count:
+    """Number of rows matching `where` (all rows if None)."""
+
+    __slots__ = ("where", "value")
+
+    def __init__(self, where=None):
+        self.where = where
+        self.value = 0
+
+    def add(self, row) -> None:
+        if self.where is None or self.where(row):
+            self.value += 1
+
+    def result(self) -> int:
+        return self.value
+
+
+class Collect:
+    """`key(row)` of the rows matching `where`, in order (at most `limit`)."""
+
+    __slots__ = ("key", "where", "limit", "value")
+
+    def __init__(self, key, where=None, limit: int | None = None):
+        self.key = key
+        self.where = where
+        self.limit = limit
+        self.value = []
+
+    def add(self, row) -> None:
+        if self.limit is not None and len(self.value) >= self.limit:
+            return
+        if self.where is None or self.where(row):
+            self.value.append(self.key(row))
+
+    def result(self) -> list:
+        return self.value
+
+
+class First:
+    """The first row (or `key(row)`) matching `where`; `default` if none."""
+
+    __slots__ = ("key", "where", "value", "found")
+
+    def __init__(self, key=None, where=None, default=None):
+        self.key = key
+        self.where = where
+        self.value = default
+        self.found = False
+
+    def add(self, row) -> None:
+        if not self.found and (self.where is None or self.where(row)):
+            self.value = row if self.key is None else self.key(row)
+            self.found = True
+
+    def result(self):
+        return self.value
+
+
+def fold(rows, **aggregators) -> dict:
+    """Feed every row to every aggregator in one pass; {name: result}."""
+    adds = [agg.add for agg in aggregators.values()]
+    for row in rows:
+        for add in adds:
+            add(row)
+    return {name: agg.result() for name, agg in aggregators.items()}
@@ -0,0 +1,211 @@
+"""
+report.py – streaming, constant-memory report writers
+
+Rows are written as they are produced instead of being collected into a
+DataFrame first, so memory stays flat however many accounts or query rows a
+report has. The sink is picked from the file extension:
+
+    .xlsx     openpyxl write-only workbook
+    .csv      csv module
+    .parquet  pyarrow (optional dependency), flushed in row groups
+
+Typical use:
+    with open_table("kpi_all_accounts.xlsx", columns) as out:
+        for row in rows:
+            out.write(row)            # dict; missing keys → blank cells
+
+    book = XlsxWorkbook("showcase.xlsx")
+    sheet = book.sheet("Campaigns", ["campaign.name", "metrics.clicks"])
+    sheet.write({...})
+    book.close()
+"""
+
+import csv
+import json
+from pathlib import Path
+
+
+def _scalarize(value):
+    """Turn lists / dicts into a JSON string so Excel/CSV can store it."""
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+class _TableWriter:
+    """Base class: one table with a fixed header, written row by row."""
+
+    def __init__(self, path, columns):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.rows = 0
+
+    def write(self, row: dict) -> None:
+        self._append([row.get(c) for c in self.columns])
+        self.rows += 1
+
+    def write_many(self, rows) -> None:
+        for row in rows:
+            self.write(row)
+
+    def _append(self, values: list) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# xlsx – openpyxl write-only mode streams rows to a temp file, not a cell grid
+# ──────────────────────────────────────────────────────────────────────────────
+class XlsxWorkbook:
+    """Write-only workbook; sheets keep the order they were created in."""
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = Path(path)
+        self._wb = Workbook(write_only=True)
+
+    def sheet(self, name: str, columns=None) -> "XlsxSheet":
+        """Add a sheet (name cut to Excel's 31 chars), with an optional header."""
+        return XlsxSheet(self._wb.create_sheet(name[:31]), columns)
+
+    def close(self) -> None:
+        self._wb.save(self.path)
+
+
+class XlsxSheet(_TableWriter):
+    def __init__(self, ws, columns=None):
+        self._ws = ws
+        self.columns = list(columns or ())
+        self.rows = 0
+        if self.columns:
+            ws.append(self.columns)
+
+    def append(self, values) -> None:
+        """Append a raw row (list of cell values)."""
+        self._append(list(values))
+
+    def _append(self, values):
+        self._ws.append([_scalarize(v) for v in values])
+
+    def close(self) -> None:
+        pass                                  # saved with the workbook
+
+
+class XlsxWriter(_TableWriter):
+    def __init__(self, path, columns, *, sheet: str = "Sheet1"):
+        super().__init__(path, columns)
+        self._book = XlsxWorkbook(path)
+        self._sheet = self._book.sheet(sheet, self.columns)
+
+    def _append(self, values):
+        self._sheet.append(values)
+
+    def close(self) -> None:
+        self._book.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# csv
+# ──────────────────────────────────────────────────────────────────────────────
+class CsvWriter(_TableWriter):
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        self._fh = open(self.path, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._fh)
+        self._csv.writerow(self.columns)
+
+    def _append(self, values):
+        self._csv.writerow(["" if v is None else _scalarize(v) for v in values])
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# parquet – buffered into row groups of `batch_size`
+# ──────────────────────────────────────────────────────────────────────────────
+class ParquetWriter(_TableWriter):
+    """
+    The schema is inferred from the first row group; columns that are empty
+    there are stored as strings. Later values that do not fit a string
+    column (a bool after a run of blanks, say) are written as their str().
+    """
+
+    def __init__(self, path, columns, *, batch_size: int = 10_000):
+        super().__init__(path, columns)
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ImportError("Parquet output needs `pip install pyarrow`") from exc
+        self.batch_size = batch_size
+        self._batch: list[list] = []
+        self._writer = None
+
+    def _append(self, values):
+        self._batch.append([_scalarize(v) for v in values])
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._batch and self._writer is not None:
+            return
+        cols = {c: [r[i] for r in self._batch] for i, c in enumerate(self.columns)}
+        self._batch = []
+        if self._writer is None:
+            table = pa.table(cols)
+            schema = pa.schema(
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                for f in table.schema
+            )
+            self._writer = pq.ParquetWriter(self.path, schema)
+        schema = self._writer.schema
+        table = pa.table(
+            [_column(cols[f.name], f) for f in schema], schema=schema
+        )
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+def _column(values: list, field):
+    """Arrow array of `values` as `field`'s type; strings take any value."""
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, type=field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if not pa.types.is_string(field.type):
+            raise TypeError(
+                f"parquet column {field.name!r} is {field.type}; "
+                f"cannot store {values!r:.80}"
+            ) from None
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+_SINKS = {".xlsx": XlsxWriter, ".csv": CsvWriter, ".parquet": ParquetWriter}
+
+
+def open_table(path, columns, **kwargs) -> _TableWriter:
+    """Open a streaming table writer chosen by the file extension of `path`."""
+    suffix = Path(path).suffix.lower()
+    try:
+        sink = _SINKS[suffix]
+    except KeyError:
+        raise ValueError(
+            f"unsupported report format {suffix!r} (use {', '.join(_SINKS)})"
+        ) from None
+    return sink(path, columns, **kwargs)
@@ -0,0 +1,291 @@
+"""
+timeouts.py – adaptive per-query timeouts, hedged reads and a run deadline
+
+A fixed 15 s timeout (and 60 s of retries) per call lets a handful of slow
+accounts set the length of the whole scan. Instead, `paged_search` asks the
+process-wide `POLICY`:
+
+  • timeout      learned per query shape (query.query_name): TIMEOUT_MULTIPLIER
+                 × this run's p99 for the shape, never below TIMEOUT_FLOOR nor
+                 above the caller's default. Calls that time out are recorded
+                 at their timeout, so a shape that keeps timing out loosens.
+  • hedge        (KPI_HEDGE=1) a unary GAQL read still running after the
+                 shape's p95 gets a duplicate request; the first answer wins.
+                 Hedges are capped at HEDGE_MAX_SHARE of calls and take a
+                 rate-limiter token like any other request.
+  • deadline     (KPI_RUN_DEADLINE seconds) every timeout and retry budget is
+                 cut to what is left of the run; once it has passed, new calls
+                 fail fast with RunDeadlineExceeded, so in-flight work ends by
+                 the deadline and the remaining accounts get blank KPI fields.
+
+Shapes need MIN_SAMPLES successful calls before anything is learned; until
+then the defaults apply.
+
+Env:
+    KPI_ADAPTIVE_TIMEOUTS   0 to always use the default timeouts (default 1)
+    KPI_HEDGE               1 to hedge slow unary reads (default 0)
+    KPI_RUN_DEADLINE        seconds the whole run may take (default: none)
+
+Typical use:
+    RUN_DEADLINE.start_from_env()            # once, at the start of a run
+    timeout = POLICY.timeout(shape, default=15.0)
+    print(POLICY.stats())
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+
+from packages.google_ads_kpi.metrics import _quantile
+
+TIMEOUT_MULTIPLIER = 3.0
+TIMEOUT_FLOOR = 2.0            # seconds; never time a call out sooner
+MIN_SAMPLES = 20               # per shape, before timeouts / hedges adapt
+WINDOW = 500                   # most recent latencies kept per shape
+HEDGE_QUANTILE = 0.95
+HEDGE_MAX_SHARE = 0.1          # at most this share of calls is duplicated
+
+
+class RunDeadlineExceeded(Exception):
+    """The run deadline (KPI_RUN_DEADLINE) passed before the call could start."""
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Run deadline
+# ──────────────────────────────────────────────────────────────────────────────
+class RunDeadline:
+    """Wall-clock deadline for the whole run, shared by every call."""
+
+    def __init__(self):
+        self.at: float | None = None         # unix seconds
+
+    def start(self, seconds: float | None) -> None:
+        self.at = None if seconds is None else time.time() + seconds
+
+    def start_from_env(self) -> None:
+        """
+        Start from KPI_RUN_DEADLINE (seconds). The absolute time is exported
+        as KPI_RUN_DEADLINE_AT so spawned shard processes share the deadline.
+        """
+        if os.getenv("KPI_RUN_DEADLINE_AT"):
+            self.at = float(os.environ["KPI_RUN_DEADLINE_AT"])
+        elif os.getenv("KPI_RUN_DEADLINE"):
+            self.start(float(os.environ["KPI_RUN_DEADLINE"]))
+            os.environ["KPI_RUN_DEADLINE_AT"] = repr(self.at)
+
+    def remaining(self) -> float | None:
+        return None if self.at is None else self.at - time.time()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def cap(self, seconds: float) -> float:
+        """`seconds`, cut to the time left; raises once the deadline has passed."""
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        if remaining <= 0:
+            raise RunDeadlineExceeded("run deadline exceeded")
+        return min(seconds, remaining)
+
+    def cap_retry(self, retry):
+        """api_core Retry whose total budget ends by the deadline."""
+        if self.at is None or retry is None:
+            return retry
+        return retry.with_timeout(self.cap(retry.timeout or float("inf")))
+
+
+RUN_DEADLINE = RunDeadline()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Latency tracking and the policy
+# ──────────────────────────────────────────────────────────────────────────────
+class LatencyTracker:
+    """Thread-safe sliding window of call latencies per query shape."""
+
+    def __init__(self, window: int = WINDOW, min_samples: int = MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque] = {}
+
+    def observe(self, shape: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(shape)
+            if samples is None:
+                samples = self._samples[shape] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def quantile(self, shape: str, q: float) -> float | None:
+        """q-quantile for `shape`, or None while it has too few samples."""
+        with self._lock:
+            samples = self._samples.get(shape)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return _quantile(ordered, q)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+class TimeoutPolicy:
+    """Adaptive timeouts and hedging decisions from a LatencyTracker."""
+
+    def __init__(
+        self,
+        tracker: LatencyTracker | None = None,
+        *,
+        adaptive: bool = True,
+        hedge: bool = False,
+        deadline: RunDeadline = RUN_DEADLINE,
+    ):
+        self.tracker = tracker or LatencyTracker()
+        self.adaptive = adaptive
+        self.hedge = hedge
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def timeout(self, shape: str, default: float) -> float:
+        """Per-attempt timeout for the next call of `shape`."""
+        seconds = default
+        if self.adaptive:
+            p99 = self.tracker.quantile(shape, 0.99)
+            if p99 is not None:
+                seconds = min(default, max(TIMEOUT_FLOOR, TIMEOUT_MULTIPLIER * p99))
+        return self.deadline.cap(seconds)
+
+    def hedge_delay(self, shape: str) -> float | None:
+        """Seconds to wait before hedging a call of `shape`; None = don't."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if self.hedges >= HEDGE_MAX_SHARE * self.calls:
+                return None
+        return self.tracker.quantile(shape, HEDGE_QUANTILE)
+
+    def observe(self, shape: str, seconds: float, *, timed_out: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.timeouts += timed_out
+        self.tracker.observe(shape, seconds)
+
+    def note_hedge(self, won: bool | None = None) -> None:
+        """Count a hedge sent (won=None) or its outcome."""
+        with self._lock:
+            if won is None:
+                self.hedges += 1
+            elif won:
+                self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "timeouts": self.timeouts,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "deadline_left_s": (
+                    None if self.deadline.at is None
+                    else round(self.deadline.remaining(), 1)
+                ),
+            }
+
+    def reset(self) -> None:
+        self.tracker.reset()
+        with self._lock:
+            self.calls = self.timeouts = self.hedges = self.hedge_wins = 0
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """True for DEADLINE_EXCEEDED, however the client library surfaced it."""
+    if type(exc).__name__ in ("DeadlineExceeded", "TimeoutError"):
+        return True
+    if type(exc).__name__ == "RetryError":              # retry budget spent
+        return exc.cause is not None and is_timeout(exc.cause)
+    code = getattr(getattr(exc, "error", None), "code", None)
+    return callable(code) and getattr(code(), "name", "") == "DEADLINE_EXCEEDED"
+
+
+POLICY = TimeoutPolicy(
+    adaptive=os.getenv("KPI_ADAPTIVE_TIMEOUTS", "1").lower() not in ("0", "false", "no"),
+    hedge=os.getenv("KPI_HEDGE", "").lower() in ("1", "true", "yes"),
+)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Hedged blocking calls
+# ──────────────────────────────────────────────────────────────────────────────
+class _HedgePool:
+    """
+    Threads for hedged calls. A caller holds at most two (its call and one
+    hedge), so the pool grows with the number of calls in flight instead of
+    capping it; idle threads are reused.
+    """
+
+    def __init__(self, min_size: int = 8):
+        self._lock = threading.Lock()
+        self._size = min_size
+        self._busy = 0
+        self._executor: ThreadPoolExecutor | None = None
+
+    def submit(self, fn) -> Future:
+        with self._lock:
+            self._busy += 1
+            if self._busy > self._size:
+                self._size = max(2 * self._size, self._busy)
+                self._executor.shutdown(wait=False)      # its running calls finish
+                self._executor = None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._size, thread_name_prefix="hedge")
+            future = self._executor.submit(fn)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._busy -= 1
+
+
+_HEDGE_POOL = _HedgePool()
+
+
+def hedged(call, delay: float, *, before_hedge=None, policy: TimeoutPolicy = POLICY):
+    """
+    Run `call()`; if it has not returned after `delay` seconds, run it again
+    concurrently and return whichever succeeds first (or the last error).
+
+    before_hedge – called before the duplicate is sent (e.g. to take a
+                   rate-limiter token). The losing call is not cancelled
+                   (blocking gRPC calls cannot be); its result is dropped.
+    """
+    # each attempt runs in a copy of the caller's context (metrics spans)
+    primary = _HEDGE_POOL.submit(partial(contextvars.copy_context().run, call))
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    if before_hedge is not None:
+        before_hedge()
+    policy.note_hedge()
+    backup = _HEDGE_POOL.submit(partial(contextvars.copy_context().run, call))
+    pending, error = {primary, backup}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                policy.note_hedge(won=future is backup)
+                return future.result()
+            error = future.exception()
+    raise error
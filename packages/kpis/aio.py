@@ -0,0 +1,221 @@
+"""
+aio.py – asyncio KPI execution (plans, accounts, whole scans)
+
+Async counterparts of spec.execute_plan / scan.scan_accounts built on
+google_ads_kpi.aio: the same compiled plan, pure KPI evaluators and
+ResultStore, but every GAQL call is awaited, so a single event loop keeps
+up to `concurrency` accounts in flight instead of one thread per account.
+An account's fused queries also run concurrently.
+
+Rows come back in input order, exactly as from scan_accounts. Leaving the
+`async for` early (break, exception, task cancellation) cancels the accounts
+still in flight.
+
+Typical use:
+    plan = compile_plan(KPI_SPECS)
+    async for row in scan_accounts_async(client, plan, leaves, concurrency=100):
+        out.write(row)
+
+    row = await execute_plan_async(plan, client, "7192753145")
+"""
+
+import asyncio
+import os
+import time
+
+from packages.google_ads_kpi.aio import get_async_service, paged_search_async
+from packages.google_ads_kpi.metrics import RECORDER, Span
+from packages.kpis.breaker import BREAKER
+from packages.kpis.scan import _PRINT_LOCK, _queried, _status
+from packages.kpis.spec import FusedQuery, KpiPlan, merge_results, subplan
+
+CONCURRENCY = int(os.getenv("KPI_CONCURRENCY", "50"))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# One account
+# ──────────────────────────────────────────────────────────────────────────────
+async def run_query_async(fused: FusedQuery, ga_service, customer_id: str) -> dict[str, dict]:
+    """spec.run_query, awaiting the fetch (same "kpi" samples); the records
+    are always materialised, since evaluators are synchronous."""
+    fetch = Span("query", fused.resource, customer_id)
+    try:
+        with RECORDER.active(fetch):
+            rows = [
+                row async for row in paged_search_async(
+                    ga_service, customer_id, fused.gaql, fields=fused.fields
+                )
+            ]
+    except BaseException as exc:
+        for spec in fused.specs:
+            failed = Span("kpi", spec.name, customer_id, retries=fetch.retries, start=fetch.start)
+            RECORDER.finish(failed, exc)
+        raise
+    fetched = time.perf_counter() - fetch.start
+
+    results = {}
+    for spec in fused.specs:
+        with RECORDER.span("kpi", spec.name, customer_id) as span:
+            span.start -= fetched
+            span.rows, span.retries = len(rows), fetch.retries
+            results[spec.name] = spec.evaluate(customer_id, rows)
+    return results
+
+
+async def evaluate_plan_async(
+    plan: KpiPlan, client, customer_id: str, *, raise_errors: bool = False
+) -> tuple[dict[str, dict], dict[str, BaseException]]:
+    """
+    spec.evaluate_plan with the fused queries issued concurrently. An account
+    that was dead on a past run (kpis.breaker) is probed with its first query
+    alone; the rest are only sent if it answers.
+    """
+    ga_service = get_async_service(client)
+
+    async def _run(fused):
+        BREAKER.check(customer_id)
+        try:
+            return await run_query_async(fused, ga_service, customer_id)
+        except Exception as exc:
+            BREAKER.record(customer_id, exc)
+            raise
+
+    queries, outcomes = plan.queries, []
+    if queries and BREAKER.suspect(customer_id):
+        outcomes = await asyncio.gather(_run(queries[0]), return_exceptions=True)
+        if not isinstance(outcomes[0], BaseException):
+            BREAKER.clear(customer_id)
+        queries = queries[1:]
+    outcomes += await asyncio.gather(*map(_run, queries), return_exceptions=True)
+
+    results: dict[str, dict] = {}
+    errors: dict[str, BaseException] = {}
+    for fused, outcome in zip(plan.queries, outcomes):
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            if raise_errors:
+                raise outcome
+            errors.update(dict.fromkeys((s.name for s in fused.specs), outcome))
+        else:
+            results.update(outcome)
+    return results, errors
+
+
+async def execute_plan_async(plan: KpiPlan, client, customer_id: str) -> dict:
+    """spec.execute_plan, awaited: the first query error is raised."""
+    results, _ = await evaluate_plan_async(plan, client, customer_id, raise_errors=True)
+    return merge_results(plan, results)
+
+
+async def _evaluate_incremental(client, plan: KpiPlan, cid: str, store, ttl):
+    """scan._evaluate_incremental, awaited; SQLite calls stay off the loop."""
+    stored = await asyncio.to_thread(store.fresh, cid, ttl)
+    pending = [s.name for s in plan.specs if s.name not in stored]
+    results, errors = {}, {}
+    if pending:
+        results, errors = await evaluate_plan_async(subplan(plan, pending), client, cid)
+        await asyncio.to_thread(store.save, cid, results, errors)
+
+    row = merge_results(plan, {**stored, **results})
+    return row, _status(plan, pending, errors), _queried(pending, errors)
+
+
+async def scan_account_async(
+    client,
+    plan: KpiPlan,
+    cid: str,
+    name: str,
+    *,
+    store=None,
+    ttl: float | None = None,
+) -> dict:
+    """Run every KPI for one account; never raises (except on cancellation)."""
+    return (await _scan_account_async(client, plan, cid, name, store, ttl))[0]
+
+
+async def _scan_account_async(client, plan: KpiPlan, cid: str, name: str, store, ttl):
+    """scan._scan_account, awaited."""
+    row = {"customer_id": cid, "account_name": name}
+    span, error, queried = RECORDER.start("account", "scan", cid), None, False
+    try:
+        with RECORDER.active(span):
+            if store is None:
+                pending = [s.name for s in plan.specs]
+                results, errors = await evaluate_plan_async(plan, client, cid)
+                row.update(merge_results(plan, results))
+                status = _status(plan, pending, errors)
+                error = next(iter(errors.values()), None)
+                queried = _queried(pending, errors)
+            else:
+                kpis, status, queried = await _evaluate_incremental(
+                    client, plan, cid, store, ttl
+                )
+                row.update(kpis)
+    except asyncio.CancelledError as exc:
+        RECORDER.finish(span, exc)
+        raise
+    except Exception as exc:
+        status, error = f"FAIL {exc}", exc
+    RECORDER.finish(span, error)
+    with _PRINT_LOCK:
+        print(f"▶ {name} ({cid}) … {status}")
+    return row, queried
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Many accounts
+# ──────────────────────────────────────────────────────────────────────────────
+async def scan_accounts_async(
+    client,
+    plan: KpiPlan,
+    leaves: dict[str, str],
+    *,
+    concurrency: int = CONCURRENCY,
+    store=None,
+    ttl: float | None = None,
+    schedule=None,
+):
+    """
+    Async generator of one row per `{cid: name}` entry, in input order.
+
+    concurrency – accounts in flight at once (default KPI_CONCURRENCY, 50);
+                  up to 4× as many are queued ahead so one slow account does
+                  not stall the rest
+    store, ttl, schedule – as for scan.scan_accounts
+    """
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def _scan(cid, name):
+        async with limit:
+            start = time.perf_counter()
+            row, queried = await _scan_account_async(client, plan, cid, name, store, ttl)
+            if schedule is not None:
+                schedule.observe(cid, time.perf_counter() - start, queried=queried)
+            return row
+
+    # tasks are started in dispatch order (longest-expected-first with a
+    # schedule); finished rows wait in `done` until it is their turn
+    order = iter(leaves if schedule is None else schedule.order(leaves, concurrency))
+    window: dict[str, asyncio.Task] = {}
+    done: dict[str, dict] = {}
+    ahead = 4 * max(1, concurrency)
+    try:
+        for cid in leaves:
+            while cid not in done:
+                while len(window) < ahead:
+                    nxt = next(order, None)
+                    if nxt is None:
+                        break
+                    window[nxt] = asyncio.create_task(_scan(nxt, leaves[nxt]))
+                finished, _ = await asyncio.wait(
+                    window.values(), return_when=asyncio.FIRST_COMPLETED
+                )
+                for key in [k for k, t in window.items() if t in finished]:
+                    done[key] = window.pop(key).result()
+            yield done.pop(cid)
+    finally:
+        for task in window.values():
+            task.cancel()
+        if window:
+            await asyncio.gather(*window.values(), return_exceptions=True)
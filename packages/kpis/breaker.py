@@ -0,0 +1,194 @@
+"""
+breaker.py – per-account circuit breaker and negative cache
+
+An account the credentials cannot read (permission revoked, customer not
+enabled, cancelled or suspended, wrong ID) fails every KPI query the same
+way, and it keeps failing on every run. The breaker stops paying for that:
+
+  • in a run     the first account-level error (see ACCOUNT_ERRORS) opens the
+                 account's circuit; its remaining KPI queries fail at once
+                 with AccountUnavailable instead of each costing a round trip
+  • across runs  open circuits are kept in the on-disk negative cache
+                 (KPI_CACHE_DIR/negative_accounts.json) for KPI_NEGATIVE_TTL
+                 seconds; until then the account is skipped without a call.
+                 Once the entry expires the next scan probes the account with
+                 its first query only, and either re-opens the circuit or
+                 scans it normally.
+
+Transient errors (timeouts, 503s, quota) and errors about the credentials
+themselves (expired token, unapproved developer token), which would fail
+every account alike, never open a circuit.
+
+Env:
+    KPI_NEGATIVE_TTL   seconds a dead account is skipped (default 86400;
+                       0 = only within the run)
+
+Typical use:
+    BREAKER.check(cid)                  # raises AccountUnavailable if open
+    try:
+        rows = list(paged_search(ga, cid, query))
+    except Exception as exc:
+        BREAKER.record(cid, exc)        # opens the circuit on account errors
+        raise
+"""
+
+import os
+import threading
+import time
+
+from packages.google_ads_kpi.cache import read_json, write_json
+
+NEGATIVE_TTL = float(os.getenv("KPI_NEGATIVE_TTL", str(24 * 3600)))
+CACHE_NAME = "negative_accounts"
+
+# (error_code field, enum name) that mean "this account cannot be read"
+ACCOUNT_ERRORS = frozenset({
+    ("authorization_error", "USER_PERMISSION_DENIED"),
+    ("authorization_error", "CUSTOMER_NOT_ENABLED"),
+    ("authorization_error", "ACTION_NOT_PERMITTED_FOR_SUSPENDED_ACCOUNT"),
+    ("authorization_error", "ACCESS_DENIED_FOR_ACCOUNT_TYPE"),
+    ("authorization_error", "MISSING_TOS"),
+    ("authentication_error", "CUSTOMER_NOT_FOUND"),
+    ("authentication_error", "CLIENT_CUSTOMER_ID_INVALID"),
+    ("request_error", "INVALID_CUSTOMER_ID"),
+})
+
+
+class AccountUnavailable(Exception):
+    """The account's circuit is open: its queries are not sent."""
+
+    def __init__(self, customer_id: str, error: str, cached: bool = False):
+        self.customer_id = customer_id
+        self.error = error
+        self.cached = cached
+        source = "negative cache" if cached else "circuit open"
+        super().__init__(f"skipped: {error} ({source})")
+
+
+def account_error(exc: BaseException) -> str | None:
+    """
+    "authorization_error.CUSTOMER_NOT_ENABLED"-style class of a
+    GoogleAdsException that condemns the account, else None.
+    """
+    failure = getattr(exc, "failure", None)
+    if failure is None:
+        return None
+    for err in failure.errors:
+        kind = err.error_code._pb.WhichOneof("error_code")
+        if kind is None:
+            continue
+        value = getattr(err.error_code, kind)
+        code = getattr(value, "name", str(value))
+        if (kind, code) in ACCOUNT_ERRORS:
+            return f"{kind}.{code}"
+    return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Breaker
+# ──────────────────────────────────────────────────────────────────────────────
+class AccountBreaker:
+    """Thread-safe open circuits for this run, backed by the negative cache."""
+
+    def __init__(self, ttl: float = NEGATIVE_TTL, name: str = CACHE_NAME):
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._open: dict[str, str] = {}         # cid -> error class, this run
+        self._known: dict | None = None         # cid -> entry, from disk
+        self.opened = 0
+        self.skipped = 0
+        self.probes = 0
+
+    def _entries(self) -> dict:
+        """Negative-cache entries (expired ones included); caller holds the lock."""
+        if self._known is None:
+            self._known = read_json(self.name) or {}
+        return self._known
+
+    def _fresh(self, entry: dict) -> bool:
+        return time.time() - entry["at"] <= self.ttl
+
+    def check(self, customer_id: str) -> None:
+        """Raise AccountUnavailable if `customer_id` is not to be queried."""
+        with self._lock:
+            error, cached = self._open.get(customer_id), False
+            if error is None and self.ttl > 0:
+                entry = self._entries().get(customer_id)
+                if entry is not None and self._fresh(entry):
+                    error, cached = entry["error"], True
+            if error is None:
+                return
+            self.skipped += 1
+        raise AccountUnavailable(customer_id, error, cached)
+
+    def suspect(self, customer_id: str) -> bool:
+        """True if the account was dead on a past run and its entry has since
+        expired: its first query should go alone, as a probe."""
+        with self._lock:
+            if self.ttl <= 0 or customer_id in self._open:
+                return False
+            entry = self._entries().get(customer_id)
+            suspect = entry is not None and not self._fresh(entry)
+            self.probes += suspect
+            return suspect
+
+    def record(self, customer_id: str, exc: BaseException) -> bool:
+        """Open the account's circuit if `exc` condemns it; True if it did."""
+        if isinstance(exc, AccountUnavailable):
+            return True
+        error = account_error(exc)
+        if error is None:
+            return False
+        with self._lock:
+            if customer_id in self._open:
+                return True
+            self._open[customer_id] = error
+            self.opened += 1
+            if self.ttl > 0:
+                entry = {"error": error, "message": str(exc)[:500], "at": time.time()}
+                self._persist({customer_id: entry})
+        return True
+
+    def clear(self, customer_id: str) -> None:
+        """A probe succeeded: drop the account's negative-cache entry."""
+        with self._lock:
+            if customer_id in self._entries():
+                self._persist({}, drop=customer_id)
+
+    def _persist(self, new: dict, drop: str | None = None) -> None:
+        """Merge with what other processes wrote and save; caller holds the
+        lock. Expired entries stay until their probe succeeds (clear)."""
+        entries = {**self._entries(), **(read_json(self.name) or {}), **new}
+        entries.pop(drop, None)
+        self._known = entries
+        write_json(self.name, entries)
+
+    def blocked(self, customer_id: str) -> bool:
+        """check() as a predicate (does not count as a skip)."""
+        with self._lock:
+            if customer_id in self._open:
+                return True
+            if self.ttl <= 0:
+                return False
+            entry = self._entries().get(customer_id)
+            return entry is not None and self._fresh(entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "opened": self.opened,
+                "skipped_queries": self.skipped,
+                "probes": self.probes,
+                "open": len(self._open),
+            }
+
+    def reset(self) -> None:
+        """Forget this run's circuits and reload the negative cache lazily."""
+        with self._lock:
+            self._open.clear()
+            self._known = None
+            self.opened = self.skipped = self.probes = 0
+
+
+BREAKER = AccountBreaker()
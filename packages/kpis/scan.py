@@ -0,0 +1,147 @@
+"""
+scan.py – run a compiled KPI plan across many accounts
+
+Rows always come back in the input order (one per account; the KPIs of a
+failed query are left blank, the others are kept), so the output is
+identical whether accounts are processed one after another or by a pool of
+worker threads.
+
+With a `ResultStore`, only KPIs that are stale (older than `ttl`), failed
+last time, or new are recomputed; the rest are merged from the store, so a
+crashed scan resumes where it stopped. With an AccountSchedule, workers pick
+up accounts longest-expected-first (see kpis.schedule).
+
+Typical use:
+    plan = compile_plan(KPI_SPECS)
+    for row in scan_accounts(client, plan, leaves, workers=8):
+        rows.append(row)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from packages.google_ads_kpi.metrics import RECORDER
+from packages.kpis.breaker import AccountUnavailable
+from packages.kpis.spec import (
+    KpiPlan,
+    evaluate_plan,
+    merge_results,
+    subplan,
+)
+
+_PRINT_LOCK = threading.Lock()          # keep worker log lines whole
+
+
+def scan_columns(plan: KpiPlan) -> tuple[str, ...]:
+    """Header of the rows produced by `scan_account` for `plan`."""
+    return ("customer_id", "account_name") + plan.columns[1:]
+
+
+def _evaluate_incremental(client, plan: KpiPlan, cid: str, store, ttl):
+    """Recompute only KPIs missing from the store; return (row, status, queried)."""
+    stored = store.fresh(cid, ttl)
+    pending = [s.name for s in plan.specs if s.name not in stored]
+    results, errors = {}, {}
+    if pending:
+        results, errors = evaluate_plan(subplan(plan, pending), client, cid)
+        store.save(cid, results, errors)
+
+    row = merge_results(plan, {**stored, **results})
+    return row, _status(plan, pending, errors), _queried(pending, errors)
+
+
+def _queried(pending, errors) -> bool:
+    """True if a query was sent for the account: some pending KPI was neither
+    served from the store nor skipped by the breaker."""
+    return any(not isinstance(errors.get(n), AccountUnavailable) for n in pending)
+
+
+def _status(plan: KpiPlan, pending, errors) -> str:
+    """Log line suffix for an incrementally evaluated account."""
+    if errors:
+        exc = next(iter(errors.values()))
+        return f"FAIL {exc}"
+    cached = len(plan.specs) - len(pending)
+    return f"OK ({cached} from store)" if cached else "OK"
+
+
+def scan_account(
+    client, plan: KpiPlan, cid: str, name: str, *, store=None, ttl: float | None = None
+) -> dict:
+    """Run every KPI for one account; never raises."""
+    return _scan_account(client, plan, cid, name, store, ttl)[0]
+
+
+def _scan_account(client, plan: KpiPlan, cid: str, name: str, store, ttl):
+    """scan_account, also returning whether any query was sent (for schedules)."""
+    row = {"customer_id": cid, "account_name": name}
+    span, error, queried = RECORDER.start("account", "scan", cid), None, False
+    try:
+        with RECORDER.active(span):
+            if store is None:
+                # a failing query blanks only the KPIs that share it
+                pending = [s.name for s in plan.specs]
+                results, errors = evaluate_plan(plan, client, cid)
+                row.update(merge_results(plan, results))
+                status = _status(plan, pending, errors)
+                error = next(iter(errors.values()), None)
+                queried = _queried(pending, errors)
+            else:
+                kpis, status, queried = _evaluate_incremental(client, plan, cid, store, ttl)
+                row.update(kpis)
+    except Exception as exc:
+        # Leave KPI fields blank on failure; keep account in sheet
+        status, error = f"FAIL {exc}", exc
+    RECORDER.finish(span, error)
+    with _PRINT_LOCK:
+        print(f"▶ {name} ({cid}) … {status}")
+    return row, queried
+
+
+def scan_accounts(
+    client,
+    plan: KpiPlan,
+    leaves: dict[str, str],
+    *,
+    workers: int = 1,
+    store=None,
+    ttl: float | None = None,
+    schedule=None,
+):
+    """
+    Yield one row per `{cid: name}` entry, in input order.
+
+    workers  – number of accounts processed concurrently (1 = serial)
+    store    – optional ResultStore for incremental re-runs
+    ttl      – max age (seconds) of a stored result before it is recomputed
+    schedule – optional AccountSchedule: accounts are dispatched
+               longest-expected-first; the durations of those that sent
+               queries (not store hits or breaker skips) are recorded
+    """
+    def _scan(item):
+        cid, name = item
+        start = time.perf_counter()
+        row, queried = _scan_account(client, plan, cid, name, store, ttl)
+        if schedule is not None:
+            schedule.observe(cid, time.perf_counter() - start, queried=queried)
+        return row
+
+    order = None if schedule is None else schedule.order(leaves, workers)
+    if workers <= 1:
+        yield from map(_scan, leaves.items())
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kpi") as pool:
+        if order is None:
+            # map() preserves submission order regardless of completion order
+            yield from pool.map(_scan, leaves.items())
+            return
+        futures = {cid: pool.submit(_scan, (cid, leaves[cid])) for cid in order}
+        try:
+            for cid in leaves:
+                yield futures.pop(cid).result()
+        finally:
+            # closed early or failed: don't wait for accounts not started yet
+            for future in futures.values():
+                future.cancel()
@@ -0,0 +1,136 @@
+"""
+schedule.py – longest-expected-first dispatch of accounts
+
+Accounts are scanned in whatever order `list_leaf_accounts` returns. With a
+pool of workers, a big account that happens to start last sets the length of
+the whole run. `AccountSchedule` remembers how long each account took (an
+EWMA over past runs, kept on disk under KPI_CACHE_DIR) and hands accounts
+to the workers longest-expected-first (LPT). Accounts never seen before get
+the median of the known durations as their prior.
+
+Only the dispatch order changes: scan_accounts / scan_accounts_async still
+yield rows in input order (finished rows wait for their turn).
+
+`report()` compares the makespan LPT predicted for this many workers with
+the actual one, next to the lower bound (the longest single account, or the
+total work spread evenly, whichever is larger).
+
+Env:
+    KPI_SCHEDULE   0 to keep the input order (default 1)
+
+Typical use:
+    schedule = AccountSchedule.load()
+    for row in scan_accounts(client, plan, leaves, workers=8, schedule=schedule):
+        out.write(row)
+    schedule.save()
+    print(schedule.report())
+"""
+
+import heapq
+import os
+import statistics
+import threading
+import time
+
+from packages.google_ads_kpi.cache import read_json, write_json
+
+CACHE_NAME = "account_durations"
+ALPHA = 0.3                     # EWMA weight of the newest run
+DEFAULT_PRIOR = 1.0             # seconds, while no account has been timed
+
+
+def makespan(durations, workers: int) -> float:
+    """Finish time of greedy list scheduling of `durations`, in order."""
+    finish = [0.0] * max(1, workers)
+    for seconds in durations:
+        heapq.heapreplace(finish, finish[0] + seconds)
+    return max(finish)
+
+
+class AccountSchedule:
+    """Thread-safe per-account duration estimates and the LPT order."""
+
+    def __init__(self, durations: dict[str, float] | None = None, *, name: str = CACHE_NAME):
+        self.name = name
+        self.durations: dict[str, float] = dict(durations or {})
+        self._observed: dict[str, float] = {}      # this run
+        self._saved = False
+        self._lock = threading.Lock()
+        self.workers = 1
+        self.expected: float | None = None
+        self.started: float | None = None
+        self.finished: float | None = None
+
+    @classmethod
+    def load(cls, name: str = CACHE_NAME) -> "AccountSchedule":
+        return cls(read_json(name) or {}, name=name)
+
+    def prior(self) -> float:
+        """Expected seconds for an account with no history."""
+        if not self.durations:
+            return DEFAULT_PRIOR
+        return statistics.median(self.durations.values())
+
+    def expect(self, customer_id: str, prior: float | None = None) -> float:
+        seconds = self.durations.get(customer_id)
+        return seconds if seconds is not None else (self.prior() if prior is None else prior)
+
+    def order(self, customer_ids, workers: int = 1) -> list[str]:
+        """`customer_ids` longest-expected-first (ties keep input order);
+        starts the run clock and the expected makespan for `workers`."""
+        customer_ids = list(customer_ids)
+        prior = self.prior()
+        expected = {cid: self.expect(cid, prior) for cid in customer_ids}
+        ordered = sorted(customer_ids, key=lambda cid: -expected[cid])
+        with self._lock:
+            self.workers = max(1, workers)
+            self.expected = makespan((expected[c] for c in ordered), self.workers)
+            self.started, self.finished = time.time(), None
+            self._observed, self._saved = {}, False
+        return ordered
+
+    def observe(self, customer_id: str, seconds: float, *, queried: bool = True) -> None:
+        """Note one finished account. Only accounts that sent queries are
+        timed: a store hit or a breaker skip says nothing about how long the
+        account takes to scan, and would drag its EWMA towards zero."""
+        with self._lock:
+            if queried:
+                self._observed[customer_id] = seconds
+            self.finished = time.time()
+
+    def save(self) -> None:
+        """Fold this run's durations into the EWMA and write them to disk
+        (merged with what other processes saved meanwhile)."""
+        with self._lock:
+            if self._saved:
+                return
+            merged = {**self.durations, **(read_json(self.name) or {})}
+            for cid, seconds in self._observed.items():
+                old = merged.get(cid)
+                merged[cid] = seconds if old is None else ALPHA * seconds + (1 - ALPHA) * old
+            self.durations, self._saved = merged, True
+            write_json(self.name, {cid: round(s, 3) for cid, s in merged.items()})
+
+    def report(self) -> dict:
+        """Expected vs actual makespan of the last ordered run."""
+        with self._lock:
+            if self.started is None:
+                return {}
+            actual = None if self.finished is None else self.finished - self.started
+            observed = self._observed.values()
+            return {
+                "accounts": len(observed),
+                "workers": self.workers,
+                "expected_makespan_s": round(self.expected, 1),
+                "actual_makespan_s": None if actual is None else round(actual, 1),
+                "lower_bound_s": round(max(
+                    max(observed, default=0.0), sum(observed) / self.workers
+                ), 1),
+            }
+
+
+def schedule_from_env() -> AccountSchedule | None:
+    """AccountSchedule.load(), unless KPI_SCHEDULE=0."""
+    if os.getenv("KPI_SCHEDULE", "1").lower() in ("0", "false", "no"):
+        return None
+    return AccountSchedule.load()
@@ -0,0 +1,226 @@
+"""
+service.py – long-lived local KPI service (HTTP on localhost)
+
+Every `run_kpi.py` invocation pays for interpreter start-up, the OAuth token
+refresh and channel set-up before its first query, and users auditing the
+same account at the same time each repeat the whole computation.
+`KpiService` keeps one warm client (and its pooled channels) instead:
+
+  • a result younger than `ttl` seconds is served from memory
+  • concurrent requests for the same CID share one in-flight computation
+    (single flight); the followers get the leader's row, or its error
+
+`serve()` puts it behind a ThreadingHTTPServer (one thread per request):
+
+    GET /kpis/<cid>             {"customer_id", "source", "age_s", "elapsed_ms", "kpis"}
+    GET /kpis/<cid>?refresh=1   recompute unless a computation is already running
+    GET /stats                  service counters, rate limiter, channels, latencies
+
+`source` is "cache", "computed" or "shared" (joined an in-flight computation).
+Failures come back as 502 {"customer_id", "error"} and are not cached.
+
+Env:
+    KPI_SERVICE_HOST   bind address (default 127.0.0.1)
+    KPI_SERVICE_PORT   port (default 8765)
+    KPI_SERVICE_TTL    seconds a result is served from memory (default 300)
+
+Typical use:
+    service = KpiService(get_client(), PLAN)
+    row, source, age = service.get("7192753145")
+    serve(service)                                   # blocks
+
+    row = fetch_kpis("http://127.0.0.1:8765", "7192753145")
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from packages.google_ads_kpi.auth import pool_stats
+from packages.google_ads_kpi.metrics import RECORDER
+from packages.google_ads_kpi.ratelimit import RATE_LIMITER
+from packages.kpis.breaker import BREAKER
+from packages.kpis.spec import KpiPlan, execute_plan
+
+SERVICE_HOST = os.getenv("KPI_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("KPI_SERVICE_PORT", "8765"))
+SERVICE_TTL = float(os.getenv("KPI_SERVICE_TTL", "300"))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Warm, coalescing KPI runner
+# ──────────────────────────────────────────────────────────────────────────────
+class KpiService:
+    """Thread-safe `execute_plan` with a TTL result cache and single flight."""
+
+    def __init__(self, client, plan: KpiPlan, *, ttl: float = SERVICE_TTL, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.client = client
+        self.plan = plan
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._results: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._in_flight: dict[str, Future] = {}
+        self.started = time.time()
+        self.hits = 0
+        self.shared = 0
+        self.computed = 0
+        self.errors = 0
+
+    def get(self, customer_id: str, *, refresh: bool = False) -> tuple[dict, str, float]:
+        """(row, source, age in seconds) for `customer_id`; see module docstring."""
+        with self._lock:
+            cached = None if refresh else self._results.get(customer_id)
+            if cached is not None and time.time() - cached[0] <= self.ttl:
+                self._results.move_to_end(customer_id)
+                self.hits += 1
+                return dict(cached[1]), "cache", time.time() - cached[0]
+            future = self._in_flight.get(customer_id)
+            leader = future is None
+            if leader:
+                future = self._in_flight[customer_id] = Future()
+            else:
+                self.shared += 1
+
+        if not leader:
+            at, row = future.result()           # re-raises the leader's error
+            return dict(row), "shared", time.time() - at
+
+        try:
+            row = execute_plan(self.plan, self.client, customer_id)
+        except BaseException as exc:
+            with self._lock:
+                self.errors += 1
+                del self._in_flight[customer_id]
+            future.set_exception(exc)
+            raise
+
+        at = time.time()
+        with self._lock:
+            self._results[customer_id] = (at, row)
+            self._results.move_to_end(customer_id)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+            self.computed += 1
+            del self._in_flight[customer_id]
+        future.set_result((at, row))
+        return dict(row), "computed", 0.0
+
+    def forget(self, customer_id: str | None = None) -> None:
+        """Drop one cached result (or all of them)."""
+        with self._lock:
+            if customer_id is None:
+                self._results.clear()
+            else:
+                self._results.pop(customer_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "hits": self.hits,
+                "shared": self.shared,
+                "computed": self.computed,
+                "errors": self.errors,
+                "cached": len(self._results),
+                "in_flight": len(self._in_flight),
+                "ttl": self.ttl,
+            }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# HTTP front end
+# ──────────────────────────────────────────────────────────────────────────────
+class _Handler(BaseHTTPRequestHandler):
+    service: KpiService                         # bound by make_server
+    protocol_version = "HTTP/1.1"               # keep-alive for repeat callers
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["stats"]:
+            self._send(200, {
+                "service": self.service.stats(),
+                "rate_limiter": RATE_LIMITER.stats(),
+                "channels": pool_stats(self.service.client),
+                "breaker": BREAKER.stats(),
+                "metrics": RECORDER.summary(),
+            })
+        elif len(parts) == 2 and parts[0] == "kpis":
+            self._kpis(parts[1].replace("-", ""), parse_qs(url.query))
+        else:
+            self._send(404, {"error": f"unknown path {url.path}"})
+
+    def _kpis(self, cid: str, query: dict) -> None:
+        if not cid.isdigit():
+            self._send(400, {"error": f"not a customer ID: {cid!r}"})
+            return
+        refresh = query.get("refresh", [""])[0].lower() in ("1", "true", "yes")
+        start = time.perf_counter()
+        try:
+            row, source, age = self.service.get(cid, refresh=refresh)
+        except Exception as exc:
+            self._send(502, {"customer_id": cid, "error": str(exc)})
+            return
+        self._send(200, {
+            "customer_id": cid,
+            "source": source,
+            "age_s": round(age, 1),
+            "elapsed_ms": round(1000 * (time.perf_counter() - start), 1),
+            "kpis": row,
+        })
+
+    def _send(self, status: int, body: dict) -> None:
+        data = json.dumps(body, default=str, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(
+    service: KpiService, host: str = SERVICE_HOST, port: int = SERVICE_PORT
+) -> ThreadingHTTPServer:
+    """HTTP server for `service` (not started; port=0 picks a free port)."""
+    handler = type("KpiHandler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(service: KpiService, host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> None:
+    """Serve `service` until interrupted."""
+    with make_server(service, host, port) as server:
+        print(f"🛰  KPI service on http://{host}:{server.server_address[1]} (ttl {service.ttl:g}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Client
+# ──────────────────────────────────────────────────────────────────────────────
+def fetch_kpis(url: str, customer_id: str, *, refresh: bool = False, timeout: float = 300.0) -> dict:
+    """The KPI row for `customer_id` from a running service at `url`."""
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+
+    target = f"{url.rstrip('/')}/kpis/{customer_id}" + ("?refresh=1" if refresh else "")
+    try:
+        with urlopen(target, timeout=timeout) as resp:
+            return json.load(resp)["kpis"]
+    except HTTPError as exc:
+        try:
+            error = json.load(exc).get("error", exc.reason)
+        except ValueError:
+            error = exc.reason
+        raise RuntimeError(f"KPI service: {error}") from None
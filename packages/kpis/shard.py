@@ -0,0 +1,172 @@
+"""
+shard.py – split a scan across processes / hosts and merge the partial outputs
+
+Leaf accounts are assigned to one of N shards by a stable hash of the CID, so
+every host computes the same split without coordination. Each shard writes a
+partial JSONL file (header + one line per account, tagged with the account's
+position in the full leaf list); `merge_partials` checks that every shard is
+present and built from the same account list, then streams the rows back in
+position order into the final report – identical to a single-process run.
+
+Typical use:
+    # on host i of N
+    mine = shard_leaves(leaves, i, n)
+    with PartialWriter(partial_path("kpi_parts", i, n), columns, leaves, i, n) as out:
+        for row in scan_accounts(client, plan, mine):
+            out.write(row)
+
+    # anywhere, once all shards are done
+    merge_partials("kpi_parts", "kpi_all_accounts.xlsx")
+"""
+
+import glob
+import hashlib
+import heapq
+import json
+import os
+from pathlib import Path
+
+from packages.google_ads_kpi.report import open_table
+
+
+def shard_of(customer_id: str, shards: int) -> int:
+    """Stable shard index for a CID (same on every host and Python run)."""
+    digest = hashlib.sha1(str(customer_id).encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """'2/8' -> (2, 8); shard indices are 0-based."""
+    try:
+        index, shards = (int(p) for p in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard spec must look like 'i/N', got {spec!r}") from None
+    if not 0 <= index < shards:
+        raise ValueError(f"shard index {index} out of range for {shards} shards")
+    return index, shards
+
+
+def shard_leaves(leaves: dict[str, str], index: int, shards: int) -> dict[str, str]:
+    """The `{cid: name}` entries of `leaves` that belong to shard `index`."""
+    return {cid: name for cid, name in leaves.items() if shard_of(cid, shards) == index}
+
+
+def fingerprint(leaves) -> str:
+    """Hash of the ordered CID list; partials must agree on it to be merged."""
+    return hashlib.sha1(",".join(leaves).encode()).hexdigest()[:16]
+
+
+def partial_path(directory: str, index: int, shards: int) -> str:
+    return os.path.join(directory, f"kpi_part_{index:03d}_of_{shards:03d}.jsonl")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Partial files
+# ──────────────────────────────────────────────────────────────────────────────
+class PartialWriter:
+    """
+    JSONL partial output of one shard, written to a temp file and renamed on
+    a clean close – an interrupted shard never leaves a mergeable file.
+    """
+
+    def __init__(self, path, columns, leaves: dict[str, str], index: int, shards: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        self._positions = {cid: pos for pos, cid in enumerate(leaves)}
+        self._fh = open(self._tmp, "w", encoding="utf-8")
+        self.rows = 0
+        self._expected = len(shard_leaves(leaves, index, shards))
+        header = {
+            "shard": index,
+            "shards": shards,
+            "total": len(leaves),
+            "expected": self._expected,
+            "fingerprint": fingerprint(leaves),
+            "columns": list(columns),
+        }
+        self._fh.write(json.dumps(header) + "\n")
+
+    def write(self, row: dict) -> None:
+        line = {"pos": self._positions[row["customer_id"]], "row": row}
+        self._fh.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+        self.rows += 1
+
+    def close(self, commit: bool = True) -> None:
+        self._fh.close()
+        if commit and self.rows != self._expected:
+            self._tmp.unlink(missing_ok=True)
+            raise ValueError(f"shard wrote {self.rows} rows, expected {self._expected}")
+        if commit:
+            os.replace(self._tmp, self.path)
+        else:
+            self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(commit=exc_type is None)
+
+
+def _read_header(path: str) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return json.loads(fh.readline())
+
+
+def _iter_rows(path: str):
+    """(position, row) for every account line of one partial, in file order."""
+    with open(path, encoding="utf-8") as fh:
+        fh.readline()                                   # header
+        for line in fh:
+            item = json.loads(line)
+            yield item["pos"], item["row"]
+
+
+def merge_partials(source, output: str) -> int:
+    """
+    Merge every shard's partial file into `output` (.xlsx/.csv/.parquet).
+
+    `source` is a directory or an explicit list of partial paths. Raises
+    ValueError if a shard is missing, incomplete or built from a different
+    account list; `output` is then left as it was. Returns the number of rows
+    written.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        paths = sorted(glob.glob(os.path.join(source, "kpi_part_*.jsonl")))
+    else:
+        paths = list(source)
+    if not paths:
+        raise ValueError(f"no partial files in {source}")
+
+    headers = {p: _read_header(p) for p in paths}
+    first = next(iter(headers.values()))
+    for path, h in headers.items():
+        for key in ("shards", "total", "fingerprint", "columns"):
+            if h[key] != first[key]:
+                raise ValueError(
+                    f"{path}: {key} differs from {paths[0]} – shards saw different "
+                    "account lists or plans (share KPI_CACHE_DIR or rerun them)"
+                )
+    seen = sorted(h["shard"] for h in headers.values())
+    if seen != list(range(first["shards"])):
+        missing = sorted(set(range(first["shards"])) - set(seen))
+        raise ValueError(f"missing or duplicate shards: have {seen}, missing {missing}")
+
+    # every partial is already in position order: k-way merge, constant memory.
+    # The rows are counted while they stream, so they go to a temp file that
+    # only replaces `output` once the count is right.
+    target = Path(output)
+    tmp = target.with_name(f"{target.stem}.{os.getpid()}.tmp{target.suffix}")
+    merged = heapq.merge(*(_iter_rows(p) for p in paths), key=lambda item: item[0])
+    try:
+        with open_table(tmp, first["columns"]) as out:
+            for _, row in merged:
+                out.write(row)
+        if out.rows != first["total"]:
+            raise ValueError(f"merged {out.rows} rows, expected {first['total']}")
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, target)
+    return out.rows
@@ -0,0 +1,255 @@
+"""
+spec.py – declarative KPI specs and the GAQL query-fusion compiler
+
+A KPI is declared as the resource and fields it reads plus a pure
+`evaluate(customer_id, rows) -> dict` function. `rows` are compact records
+of the (fused) SELECT fields (see google_ads_kpi.records) and may be a
+one-pass stream, so evaluators read them once. `compile_plan()` merges every
+spec that reads the same resource (with the same WHERE/ORDER/LIMIT clauses)
+into one fused query, so adding a KPI over an already-queried resource costs
+no extra round trip. Each fused query's GAQL syntax is checked when the plan
+is compiled; `validate_plan()` checks its fields against the API's field
+catalog before a run sends it to every account. `plan_fingerprints()` hashes
+each KPI's definition so stored results (kpis.store) of a changed KPI are
+recomputed.
+
+Typical use:
+    plan = compile_plan(KPI_SPECS)
+    validate_plan(plan, client)                  # GaqlError if a field is wrong
+    row  = execute_plan(plan, client, "7192753145")
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterable
+
+from packages.google_ads_kpi.auth import get_service
+from packages.google_ads_kpi.gaql import parse, validate_queries
+from packages.google_ads_kpi.metrics import RECORDER, Span
+from packages.google_ads_kpi.query import paged_search
+from packages.kpis.breaker import BREAKER
+
+
+@dataclass(frozen=True)
+class KpiSpec:
+    name: str                                  # unique KPI id
+    resource: str                              # GAQL FROM resource
+    fields: tuple[str, ...]                    # GAQL SELECT fields it reads
+    columns: tuple[str, ...]                   # output keys it produces
+    evaluate: Callable[[str, Iterable], dict]  # (customer_id, records) -> dict
+    clauses: str = ""                          # WHERE / ORDER BY / LIMIT
+
+
+@dataclass(frozen=True)
+class FusedQuery:
+    resource: str
+    clauses: str
+    fields: tuple[str, ...]
+    specs: tuple[KpiSpec, ...]
+
+    @property
+    def gaql(self) -> str:
+        return build_query(self.resource, self.fields, self.clauses)
+
+
+@dataclass(frozen=True)
+class KpiPlan:
+    specs: tuple[KpiSpec, ...]                 # original order (= column order)
+    queries: tuple[FusedQuery, ...]
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        """Every output key, in the order `execute_plan` fills them."""
+        cols = {"customer_id": None}
+        for spec in self.specs:
+            cols.update(dict.fromkeys(spec.columns))
+        return tuple(cols)
+
+
+def build_query(resource: str, fields, clauses: str = "") -> str:
+    """Render a GAQL string from its parts."""
+    select = ",\n        ".join(fields)
+    query = f"""
+      SELECT
+        {select}
+      FROM {resource}"""
+    if clauses.strip():
+        query += "\n      " + " ".join(clauses.split())
+    return query + "\n"
+
+
+def compile_plan(specs) -> KpiPlan:
+    """Group specs by (resource, clauses) and union their fields."""
+    specs = tuple(specs)
+    names = [s.name for s in specs]
+    if len(names) != len(set(names)):
+        raise ValueError(f"duplicate KPI names in {names}")
+
+    groups: dict[tuple[str, str], list[KpiSpec]] = {}
+    for spec in specs:
+        key = (spec.resource, " ".join(spec.clauses.split()))
+        groups.setdefault(key, []).append(spec)
+
+    queries = []
+    for (resource, clauses), members in groups.items():
+        fields = tuple(dict.fromkeys(f for s in members for f in s.fields))
+        queries.append(FusedQuery(resource, clauses, fields, tuple(members)))
+    for fused in queries:
+        parse(fused.gaql)                       # GaqlError on malformed GAQL
+    return KpiPlan(specs, tuple(queries))
+
+
+@lru_cache(maxsize=None)
+def _module_source(module: str) -> str:
+    import inspect
+    import sys
+
+    try:
+        return inspect.getsource(sys.modules[module])
+    except (KeyError, OSError, TypeError):
+        return ""
+
+
+def spec_fingerprint(spec: KpiSpec) -> str:
+    """
+    Hash of everything that shapes a KPI's result: its query parts and the
+    source of the module its evaluator lives in (a whole module, so an edit to
+    a helper the evaluator calls counts too).
+    """
+    evaluate = spec.evaluate
+    module = getattr(evaluate, "__module__", None) or ""
+    parts = (
+        spec.resource, *spec.fields, "|", *spec.columns, "|",
+        " ".join(spec.clauses.split()),
+        f"{module}.{getattr(evaluate, '__qualname__', repr(evaluate))}",
+        _module_source(module),
+    )
+    return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+
+def plan_fingerprints(plan: KpiPlan) -> dict[str, str]:
+    """{kpi_name: spec_fingerprint} for every spec in `plan`."""
+    return {spec.name: spec_fingerprint(spec) for spec in plan.specs}
+
+
+def validate_plan(plan: KpiPlan, client, *, cached_only: bool = False) -> None:
+    """Check every fused query against the field catalog (gaql.validate_queries)."""
+    validate_queries(client, {
+        f"{q.resource} ({', '.join(s.name for s in q.specs)})": q.gaql
+        for q in plan.queries
+    }, cached_only=cached_only)
+
+
+def run_query(fused: FusedQuery, ga_service, customer_id: str) -> dict[str, dict]:
+    """
+    Issue one fused query and evaluate every spec that shares it.
+
+    Evaluators receive compact records of the fused fields (records.project).
+    A query read by a single spec is streamed straight into its evaluator and
+    never held in memory; a shared one is materialised once, as records.
+
+    Each spec is recorded as a "kpi" sample whose wall time is the shared
+    query plus its own evaluation.
+    """
+    if len(fused.specs) == 1:
+        return _run_streaming(fused, ga_service, customer_id)
+
+    fetch = Span("query", fused.resource, customer_id)
+    try:
+        with RECORDER.active(fetch):
+            rows = list(paged_search(ga_service, customer_id, fused.gaql, fields=fused.fields))
+    except Exception as exc:
+        for spec in fused.specs:
+            failed = Span("kpi", spec.name, customer_id, retries=fetch.retries, start=fetch.start)
+            RECORDER.finish(failed, exc)
+        raise
+    fetched = time.perf_counter() - fetch.start
+
+    results = {}
+    for spec in fused.specs:
+        with RECORDER.span("kpi", spec.name, customer_id) as span:
+            span.start -= fetched
+            span.rows, span.retries = len(rows), fetch.retries
+            results[spec.name] = spec.evaluate(customer_id, rows)
+    return results
+
+
+def _run_streaming(fused: FusedQuery, ga_service, customer_id: str) -> dict[str, dict]:
+    (spec,) = fused.specs
+    rows = paged_search(ga_service, customer_id, fused.gaql, fields=fused.fields)
+    with RECORDER.span("kpi", spec.name, customer_id) as span:
+        def _counted():
+            for row in rows:
+                span.rows += 1
+                yield row
+
+        try:
+            result = spec.evaluate(customer_id, _counted())
+        finally:
+            rows.close()                      # evaluator may stop early
+    return {spec.name: result}
+
+
+def evaluate_plan(
+    plan: KpiPlan, client, customer_id: str, *, raise_errors: bool = False
+) -> tuple[dict[str, dict], dict[str, BaseException]]:
+    """
+    Run every fused query for one account.
+
+    Returns ({kpi_name: result}, {kpi_name: exception}). A failing query marks
+    only the specs that share it as failed, unless `raise_errors` is set.
+    Once the account's circuit is open (kpis.breaker) the remaining queries
+    are not sent and their specs fail with AccountUnavailable.
+    """
+    ga_service = get_service(client)
+    probe = BREAKER.suspect(customer_id)
+
+    results: dict[str, dict] = {}
+    errors: dict[str, BaseException] = {}
+    for fused in plan.queries:
+        try:
+            BREAKER.check(customer_id)
+            results.update(run_query(fused, ga_service, customer_id))
+        except Exception as exc:
+            BREAKER.record(customer_id, exc)
+            if raise_errors:
+                raise
+            errors.update(dict.fromkeys((s.name for s in fused.specs), exc))
+        else:
+            if probe:
+                BREAKER.clear(customer_id)
+                probe = False
+    return results, errors
+
+
+def merge_results(plan: KpiPlan, results: dict[str, dict]) -> dict:
+    """Merge per-KPI dicts into one row, in spec order (missing KPIs skipped)."""
+    row = {}
+    for spec in plan.specs:
+        row.update(results.get(spec.name, {}))
+    return row
+
+
+def subplan(plan: KpiPlan, names) -> KpiPlan:
+    """Recompile `plan` restricted to the KPIs in `names`."""
+    names = set(names)
+    return compile_plan(s for s in plan.specs if s.name in names)
+
+
+def execute_plan(plan: KpiPlan, client, customer_id: str) -> dict:
+    """
+    Run every fused query for one account and merge results in spec order.
+
+    Raises the first query error, dropping every result (run_kpi.py and the
+    KPI service report one account); scans use evaluate_plan instead and keep
+    the KPIs whose queries succeeded.
+    """
+    results, _ = evaluate_plan(plan, client, customer_id, raise_errors=True)
+    return merge_results(plan, results)
+
+
+def run_spec(spec: KpiSpec, client, customer_id: str) -> dict:
+    """Evaluate a single KPI on its own (one query)."""
+    return execute_plan(compile_plan([spec]), client, customer_id)
@@ -0,0 +1,103 @@
+"""
+store.py – persistent KPI result store (SQLite)
+
+Keeps the latest result of every (customer_id, KPI) pair with the time it was
+computed and whether it succeeded, so a rerun only recomputes what is stale,
+failed or new and merges everything else from disk.
+
+Each result also carries its KPI's fingerprint (spec.plan_fingerprints); a
+result whose KPI has since changed is not fresh, whatever its age. A store
+file written with an older table layout is emptied when it is opened.
+
+Typical use:
+    store = ResultStore("kpi_results.sqlite", fingerprints=plan_fingerprints(plan))
+    fresh = store.fresh(cid, ttl=24 * 3600)        # {kpi_name: result_dict}
+    store.save(cid, results={...}, errors={...})
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA_VERSION = 2                  # PRAGMA user_version; bump with _SCHEMA
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kpi_results (
+    customer_id  TEXT NOT NULL,
+    kpi          TEXT NOT NULL,
+    computed_at  REAL NOT NULL,     -- unix seconds
+    status       TEXT NOT NULL,     -- 'ok' | 'failed'
+    payload      TEXT,              -- JSON result dict (ok only)
+    error        TEXT,              -- exception text (failed only)
+    fingerprint  TEXT NOT NULL,     -- of the KPI definition that computed it
+    PRIMARY KEY (customer_id, kpi)
+)
+"""
+
+
+class ResultStore:
+    """Thread-safe wrapper around one SQLite connection."""
+
+    def __init__(self, path: str, *, fingerprints: dict[str, str] | None = None):
+        """
+        fingerprints – {kpi_name: fingerprint} of the current KPI definitions;
+                       KPIs not listed are stored and matched with "".
+        """
+        self.path = path
+        self.fingerprints = dict(fingerprints or {})
+        self._lock = threading.Lock()
+        # timeout: shard processes may share one store file and wait on its lock
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")      # one process migrates
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS kpi_results")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute(_SCHEMA)
+
+    def fresh(self, customer_id: str, ttl: float | None = None) -> dict[str, dict]:
+        """Successful results for `customer_id` computed within `ttl` seconds
+        by the current definition of their KPI."""
+        cutoff = 0.0 if ttl is None else time.time() - ttl
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kpi, payload, fingerprint FROM kpi_results "
+                "WHERE customer_id = ? AND status = 'ok' AND computed_at >= ?",
+                (customer_id, cutoff),
+            ).fetchall()
+        return {
+            kpi: json.loads(payload)
+            for kpi, payload, fingerprint in rows
+            if fingerprint == self.fingerprints.get(kpi, "")
+        }
+
+    def save(
+        self,
+        customer_id: str,
+        results: dict[str, dict],
+        errors: dict[str, BaseException] | None = None,
+    ) -> None:
+        """Upsert successful results and failures for one account (one commit)."""
+        now, fp = time.time(), self.fingerprints
+        records = [
+            (customer_id, kpi, now, "ok", json.dumps(result, default=str), None,
+             fp.get(kpi, ""))
+            for kpi, result in results.items()
+        ] + [
+            (customer_id, kpi, now, "failed", None, f"{type(exc).__name__}: {exc}",
+             fp.get(kpi, ""))
+            for kpi, exc in (errors or {}).items()
+        ]
+        if not records:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kpi_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
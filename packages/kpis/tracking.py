@@ -1,65 +1,98 @@
 # kpi_core/tracking.py
-import datetime
-from packages.google_ads_kpi.query import paged_search, DEFAULT_RETRY
-from google.ads.googleads.errors import GoogleAdsException
+from packages.google_ads_kpi.query import paged_search
+from packages.google_ads_kpi.records import Collect, Count, fold
+from packages.kpis.spec import KpiSpec, build_query, run_spec
+
+# Every conversion-action KPI reads this field set, so they fuse into one query
+_CONVERSION_ACTION_FIELDS = (
+    "conversion_action.id",
+    "conversion_action.name",
+    "conversion_action.type",
+    "conversion_action.status",
+    "conversion_action.primary_for_goal",
+    "conversion_action.value_settings.default_value",
+    "conversion_action.attribution_model_settings.attribution_model",
+)
+
+CONVERSION_ACTION_QUERY = build_query("conversion_action", _CONVERSION_ACTION_FIELDS)
+
+# Enum names the KPIs look for (shared with the vectorized engine); these are
+# the AttributionModel / ConversionActionType names the API returns
+LAST_CLICK_MODELS = frozenset({"GOOGLE_ADS_LAST_CLICK"})
+CALL_TYPES = frozenset({
+    "AD_CALL",
+    "CLICK_TO_CALL",
+    "UPLOAD_CALLS",
+    "WEBSITE_CALL",
+    "SMART_CAMPAIGN_AD_CLICKS_TO_CALL",
+    "SMART_CAMPAIGN_MAP_CLICKS_TO_CALL",
+    "SMART_CAMPAIGN_TRACKED_CALLS",
+})
+STORE_VISIT_TYPES = frozenset({"STORE_VISITS"})
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Helper: pull every conversion-action once so we don’t hit the API repeatedly
+# Helpers. The conversion-action KPIs share one fused query per account only
+# through a plan (spec.compile_plan / execute_plan). The kpi_* wrappers below
+# are deliberately unshared: each one sends its own query.
 # ──────────────────────────────────────────────────────────────────────────────
-def _get_conversion_actions(ga_service, cid: str):
-    query = """
-      SELECT
-        conversion_action.id,
-        conversion_action.name,
-        conversion_action.type,
-        conversion_action.status,
-        conversion_action.primary_for_goal,
-        conversion_action.value_settings.default_value,
-        conversion_action.attribution_model_settings.attribution_model
-      FROM conversion_action
-    """
-    return list(paged_search(ga_service, cid, query, timeout=15.0))
+def _fetch_conversion_actions(ga_service, cid: str):
+    """Compact records (records.project) of every conversion action of `cid`."""
+    return list(paged_search(
+        ga_service, cid, CONVERSION_ACTION_QUERY, fields=_CONVERSION_ACTION_FIELDS
+    ))
+
+
+def _first(rows):
+    return next(iter(rows), None)
+
+
+def _enabled(action) -> bool:
+    return action.status == "ENABLED"
+
+
+def _name(action) -> str:
+    return action.name
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 1 – Enabled conversion actions & how many have values
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_enabled_conversion_actions(client, customer_id: str, days: int = 30):
-    ga_service = client.get_service("GoogleAdsService")
-
-    action_q = """
-      SELECT conversion_action.status,
-             conversion_action.value_settings.default_value
-      FROM conversion_action
-      WHERE conversion_action.status = 'ENABLED'
-    """
-    enabled, with_value = 0, 0
-    for row in paged_search(ga_service, customer_id, action_q):
-        enabled += 1
-        if row.conversion_action.value_settings.default_value:
-            with_value += 1
+def _enabled_conversion_actions(customer_id: str, actions) -> dict:
+    counts = fold(
+        actions,
+        enabled=Count(_enabled),
+        with_value=Count(lambda a: _enabled(a) and a.value_settings_default_value),
+    )
 
     return {
         "customer_id": customer_id,
-        "enabled_actions": enabled,
-        "enabled_with_value": with_value,
+        "enabled_actions": counts["enabled"],
+        "enabled_with_value": counts["with_value"],
     }
 
 
+ENABLED_CONVERSION_ACTIONS = KpiSpec(
+    name="enabled_conversion_actions",
+    resource="conversion_action",
+    fields=_CONVERSION_ACTION_FIELDS,
+    columns=("enabled_actions", "enabled_with_value"),
+    evaluate=_enabled_conversion_actions,
+)
+
+
+def kpi_enabled_conversion_actions(client, customer_id: str, days: int = 30):
+    return run_spec(ENABLED_CONVERSION_ACTIONS, client, customer_id)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 2 – Primary conversion must contain “purchase”
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_primary_is_purchase(client, customer_id: str):
-    ga_service = client.get_service("GoogleAdsService")
-    actions = _get_conversion_actions(ga_service, customer_id)
-
-    primary = [
-        a.conversion_action.name.lower()
-        for a in actions
-        if a.conversion_action.primary_for_goal
-        and a.conversion_action.status.name == "ENABLED"
-    ]
+def _primary_is_purchase(customer_id: str, actions) -> dict:
+    primary = fold(
+        actions,
+        names=Collect(lambda a: a.name.lower(), where=lambda a: a.primary_for_goal and _enabled(a)),
+    )["names"]
     ok = any("purchase" in n for n in primary)
 
     return {
@@ -69,21 +102,30 @@ def kpi_primary_is_purchase(client, customer_id: str):
     }
 
 
+PRIMARY_IS_PURCHASE = KpiSpec(
+    name="primary_is_purchase",
+    resource="conversion_action",
+    fields=_CONVERSION_ACTION_FIELDS,
+    columns=("primary_is_purchase", "primary_actions"),
+    evaluate=_primary_is_purchase,
+)
+
+
+def kpi_primary_is_purchase(client, customer_id: str):
+    return run_spec(PRIMARY_IS_PURCHASE, client, customer_id)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 3 – Any goals still on Last-Click?
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_last_click_present(client, customer_id: str):
-    ga_service = client.get_service("GoogleAdsService")
-    actions = _get_conversion_actions(ga_service, customer_id)
-
-    last_click = [
-        a.conversion_action.name
-        for a in actions
-        if (
-                a.conversion_action.attribution_model_settings.attribution_model == "LAST_CLICK"
-                and a.conversion_action.status.name == "ENABLED"
-        )
-    ]
+def _last_click_present(customer_id: str, actions) -> dict:
+    last_click = fold(
+        actions,
+        names=Collect(_name, where=lambda a: (
+            a.attribution_model_settings_attribution_model in LAST_CLICK_MODELS
+            and _enabled(a)
+        )),
+    )["names"]
     return {
         "customer_id": customer_id,
         "has_last_click_goals": bool(last_click),
@@ -91,28 +133,26 @@ def kpi_last_click_present(client, customer_id: str):
     }
 
 
+LAST_CLICK_PRESENT = KpiSpec(
+    name="last_click_present",
+    resource="conversion_action",
+    fields=_CONVERSION_ACTION_FIELDS,
+    columns=("has_last_click_goals", "last_click_list"),
+    evaluate=_last_click_present,
+)
+
+
+def kpi_last_click_present(client, customer_id: str):
+    return run_spec(LAST_CLICK_PRESENT, client, customer_id)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 4 – Enhanced conversions enabled at account level?
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_enhanced_conversions(client, customer_id: str):
-    ga = client.get_service("GoogleAdsService")
-    query = """
-      SELECT
-        customer.conversion_tracking_setting.enhanced_conversions_for_leads_enabled
-      FROM customer
-      LIMIT 1
-    """
-    response = ga.search(
-        customer_id=customer_id,
-        query=query,
-        retry=DEFAULT_RETRY,
-        timeout=15.0,
-    )
-
-    row = next(iter(response), None)  # ← fix
-
+def _enhanced_conversions(customer_id: str, rows) -> dict:
+    row = _first(rows)
     enabled = (
-        row.customer.conversion_tracking_setting.enhanced_conversions_for_leads_enabled
+        row.conversion_tracking_setting_enhanced_conversions_for_leads_enabled
         if row else False
     )
 
@@ -122,19 +162,30 @@ def kpi_enhanced_conversions(client, customer_id: str):
     }
 
 
+ENHANCED_CONVERSIONS = KpiSpec(
+    name="enhanced_conversions",
+    resource="customer",
+    fields=(
+        "customer.conversion_tracking_setting.enhanced_conversions_for_leads_enabled",
+    ),
+    columns=("enhanced_conversions_on",),
+    evaluate=_enhanced_conversions,
+    clauses="LIMIT 1",
+)
+
+
+def kpi_enhanced_conversions(client, customer_id: str):
+    return run_spec(ENHANCED_CONVERSIONS, client, customer_id)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 5 – Call-tracking conversion actions present?
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_call_tracking(client, customer_id: str):
-    ga_service = client.get_service("GoogleAdsService")
-    actions = _get_conversion_actions(ga_service, customer_id)
-
-    calls = [
-        a.conversion_action.name
-        for a in actions
-        if a.conversion_action.type.name.startswith("CALL_")
-        and a.conversion_action.status.name == "ENABLED"
-    ]
+def _call_tracking(customer_id: str, actions) -> dict:
+    calls = fold(
+        actions,
+        names=Collect(_name, where=lambda a: a.type in CALL_TYPES and _enabled(a)),
+    )["names"]
     return {
         "customer_id": customer_id,
         "call_tracking_present": bool(calls),
@@ -142,19 +193,27 @@ def kpi_call_tracking(client, customer_id: str):
     }
 
 
+CALL_TRACKING = KpiSpec(
+    name="call_tracking",
+    resource="conversion_action",
+    fields=_CONVERSION_ACTION_FIELDS,
+    columns=("call_tracking_present", "call_goal_list"),
+    evaluate=_call_tracking,
+)
+
+
+def kpi_call_tracking(client, customer_id: str):
+    return run_spec(CALL_TRACKING, client, customer_id)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 6 – Store-visit goal present?
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_store_visits(client, customer_id: str):
-    ga_service = client.get_service("GoogleAdsService")
-    actions = _get_conversion_actions(ga_service, customer_id)
-
-    stores = [
-        a.conversion_action.name
-        for a in actions
-        if a.conversion_action.type.name == "STORE_VISIT"
-        and a.conversion_action.status.name == "ENABLED"
-    ]
+def _store_visits(customer_id: str, actions) -> dict:
+    stores = fold(
+        actions,
+        names=Collect(_name, where=lambda a: a.type in STORE_VISIT_TYPES and _enabled(a)),
+    )["names"]
     return {
         "customer_id": customer_id,
         "store_visits_present": bool(stores),
@@ -162,59 +221,93 @@ def kpi_store_visits(client, customer_id: str):
     }
 
 
+STORE_VISITS = KpiSpec(
+    name="store_visits",
+    resource="conversion_action",
+    fields=_CONVERSION_ACTION_FIELDS,
+    columns=("store_visits_present", "store_visit_list"),
+    evaluate=_store_visits,
+)
+
+
+def kpi_store_visits(client, customer_id: str):
+    return run_spec(STORE_VISITS, client, customer_id)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 7 – Auto-tagging on?
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_auto_tagging(client, customer_id: str):
-    ga_service = client.get_service("GoogleAdsService")
-
-    query = """
-      SELECT customer.auto_tagging_enabled
-      FROM customer
-      LIMIT 1
-    """
-
-    row = next(
-        iter(
-            ga_service.search(
-                customer_id=customer_id,
-                query=query,
-                retry=DEFAULT_RETRY,
-                timeout=15.0,
-            )
-        ),
-        None,
-    )
-
-    enabled = row.customer.auto_tagging_enabled if row else False
+def _auto_tagging(customer_id: str, rows) -> dict:
+    row = _first(rows)
+    enabled = row.auto_tagging_enabled if row else False
     return {
         "customer_id": customer_id,
         "auto_tagging_enabled": bool(enabled),
     }
 
+
+AUTO_TAGGING = KpiSpec(
+    name="auto_tagging",
+    resource="customer",
+    fields=("customer.auto_tagging_enabled",),
+    columns=("auto_tagging_enabled",),
+    evaluate=_auto_tagging,
+    clauses="LIMIT 1",
+)
+
+
+def kpi_auto_tagging(client, customer_id: str):
+    return run_spec(AUTO_TAGGING, client, customer_id)
+
 # ──────────────────────────────────────────────────────────────────────────────
 # KPI 8 – Offline conversion import success (past 30 days)
 # ──────────────────────────────────────────────────────────────────────────────
-def kpi_offline_import(client, customer_id: str, check_jobs: int = 20):
-    """Count last N offline-import jobs and how many succeeded."""
-    ga = client.get_service("GoogleAdsService")
-
-    query = f"""
-      SELECT
-        offline_user_data_job.status
-      FROM offline_user_data_job
-      WHERE offline_user_data_job.type = 'STORE_SALES_UPLOAD_FIRST_PARTY'
-      ORDER BY offline_user_data_job.id DESC
-      LIMIT {check_jobs}
-    """
-
-    jobs = list(paged_search(ga, customer_id, query, timeout=15.0))
-    success = [j for j in jobs if j.offline_user_data_job.status.name == "SUCCESS"]
+def _offline_import(customer_id: str, jobs) -> dict:
+    # one pass over the stream: jobs are counted, never kept
+    counts = fold(jobs, checked=Count(), success=Count(lambda j: j.status == "SUCCESS"))
 
     return {
         "customer_id": customer_id,
-        "offline_jobs_checked": len(jobs),
-        "offline_success": len(success),
-        "offline_import_ok": bool(success),
+        "offline_jobs_checked": counts["checked"],
+        "offline_success": counts["success"],
+        "offline_import_ok": bool(counts["success"]),
     }
 
+
+def offline_import_spec(check_jobs: int = 20) -> KpiSpec:
+    """KPI 8 spec for the last `check_jobs` store-sales upload jobs."""
+    return KpiSpec(
+        name="offline_import",
+        resource="offline_user_data_job",
+        fields=("offline_user_data_job.status",),
+        columns=("offline_jobs_checked", "offline_success", "offline_import_ok"),
+        evaluate=_offline_import,
+        clauses=f"""
+          WHERE offline_user_data_job.type = 'STORE_SALES_UPLOAD_FIRST_PARTY'
+          ORDER BY offline_user_data_job.id DESC
+          LIMIT {check_jobs}
+        """,
+    )
+
+
+OFFLINE_IMPORT = offline_import_spec()
+
+
+def kpi_offline_import(client, customer_id: str, check_jobs: int = 20):
+    """Count last N offline-import jobs and how many succeeded."""
+    return run_spec(offline_import_spec(check_jobs), client, customer_id)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Every tracking KPI, in output-column order (compile with spec.compile_plan)
+# ──────────────────────────────────────────────────────────────────────────────
+KPI_SPECS = [
+    ENABLED_CONVERSION_ACTIONS,
+    PRIMARY_IS_PURCHASE,
+    LAST_CLICK_PRESENT,
+    ENHANCED_CONVERSIONS,
+    CALL_TRACKING,
+    STORE_VISITS,
+    AUTO_TAGGING,
+    OFFLINE_IMPORT,
+]
@@ -0,0 +1,230 @@
+"""
+vectorized.py – cross-account, columnar evaluation of the conversion-action KPIs
+
+Instead of looping over proto-plus rows per account, every account's
+conversion actions are flattened into one pandas table (customer_id and enum
+columns as categoricals) and the five conversion-action KPIs are computed for
+all accounts at once with grouped boolean masks. Results are identical to the
+row-by-row evaluators in kpis.tracking.
+
+The remaining KPIs (customer settings, offline imports) still run per account
+through the normal plan, and `scan_accounts_vectorized` yields the same rows,
+in the same order, as `scan.scan_accounts`.
+
+Typical use:
+    frame, failed = load_conversion_actions(client, leaves, workers=8)
+    results = evaluate_frame(frame, leaves)      # {cid: {kpi_name: result}}
+
+    for row in scan_accounts_vectorized(client, plan, leaves, workers=8):
+        out.write(row)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from packages.google_ads_kpi.auth import get_service
+from packages.google_ads_kpi.flatten import rows_to_columns
+from packages.google_ads_kpi.query import paged_search
+from packages.kpis.breaker import BREAKER
+from packages.kpis.scan import scan_accounts
+from packages.kpis.spec import KpiPlan, merge_results, subplan
+from packages.kpis.tracking import (
+    CALL_TRACKING,
+    CALL_TYPES,
+    CONVERSION_ACTION_QUERY,
+    ENABLED_CONVERSION_ACTIONS,
+    LAST_CLICK_MODELS,
+    LAST_CLICK_PRESENT,
+    PRIMARY_IS_PURCHASE,
+    STORE_VISIT_TYPES,
+    STORE_VISITS,
+    _CONVERSION_ACTION_FIELDS,
+)
+
+VECTORIZED_SPECS = (
+    ENABLED_CONVERSION_ACTIONS,
+    PRIMARY_IS_PURCHASE,
+    LAST_CLICK_PRESENT,
+    CALL_TRACKING,
+    STORE_VISITS,
+)
+VECTORIZED_KPIS = frozenset(s.name for s in VECTORIZED_SPECS)
+
+_ENUM_COLUMNS = (
+    "conversion_action.type",
+    "conversion_action.status",
+    "conversion_action.attribution_model_settings.attribution_model",
+)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Load: every account's conversion actions into one columnar table
+# ──────────────────────────────────────────────────────────────────────────────
+def load_conversion_actions(client, customer_ids, *, workers: int = 1):
+    """
+    Fetch conversion actions for all `customer_ids` into one DataFrame.
+
+    Returns (frame, failed) where `failed` maps customer_id -> exception for
+    accounts whose query raised or whose circuit is open (kpis.breaker); they
+    are absent from the frame. As in evaluate_plan, an account that was dead
+    on a past run is probed by this query and cleared if it succeeds.
+    """
+    import pandas as pd
+
+    ga_service = get_service(client)
+    customer_ids = list(customer_ids)
+
+    def _load(cid):
+        # rows go straight from the stream into columns, never held as protos
+        probe = BREAKER.suspect(cid)
+        try:
+            BREAKER.check(cid)
+            rows = paged_search(ga_service, cid, CONVERSION_ACTION_QUERY)
+            cols = rows_to_columns(rows, _CONVERSION_ACTION_FIELDS)
+        except Exception as exc:
+            BREAKER.record(cid, exc)
+            return cid, None, exc
+        if probe:
+            BREAKER.clear(cid)
+        return cid, cols, None
+
+    columns = {f: [] for f in ("customer_id",) + _CONVERSION_ACTION_FIELDS}
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for cid, cols, exc in pool.map(_load, customer_ids):
+            if exc is not None:
+                failed[cid] = exc
+                continue
+            n = len(cols[_CONVERSION_ACTION_FIELDS[0]])
+            columns["customer_id"].extend([cid] * n)
+            for field, values in cols.items():
+                columns[field].extend(values)
+
+    frame = pd.DataFrame(columns)
+    frame["customer_id"] = pd.Categorical(
+        frame["customer_id"], categories=[c for c in customer_ids if c not in failed]
+    )
+    frame["conversion_action.name"] = frame["conversion_action.name"].astype(str)
+    for field in _ENUM_COLUMNS:
+        frame[field] = frame[field].astype("category")
+    return frame, failed
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Evaluate: grouped masks over the whole table
+# ──────────────────────────────────────────────────────────────────────────────
+def evaluate_frame(frame, customer_ids) -> dict[str, dict[str, dict]]:
+    """{customer_id: {kpi_name: result}} for every VECTORIZED_SPECS KPI."""
+    ca = "conversion_action."
+    cid = frame["customer_id"]
+    names = frame[ca + "name"]
+    enabled = frame[ca + "status"] == "ENABLED"
+    with_value = enabled & (frame[ca + "value_settings.default_value"] != 0)
+    action_type = frame[ca + "type"]
+
+    def _count(mask) -> dict:
+        return mask.groupby(cid, observed=True).sum().to_dict()
+
+    def _listed(mask, values=names) -> dict:
+        return values[mask].groupby(cid[mask], observed=True).agg(", ".join).to_dict()
+
+    primary_mask = enabled & frame[ca + "primary_for_goal"].astype(bool)
+    primary_lower = names.str.lower()
+
+    enabled_n = _count(enabled)
+    with_value_n = _count(with_value)
+    primary = _listed(primary_mask, primary_lower)
+    purchase = _count(primary_mask & primary_lower.str.contains("purchase", regex=False))
+    model = frame[ca + "attribution_model_settings.attribution_model"]
+    last_click = _listed(enabled & model.isin(LAST_CLICK_MODELS))
+    calls = _listed(enabled & action_type.isin(CALL_TYPES))
+    stores = _listed(enabled & action_type.isin(STORE_VISIT_TYPES))
+
+    results = {}
+    for c in customer_ids:
+        results[c] = {
+            ENABLED_CONVERSION_ACTIONS.name: {
+                "customer_id": c,
+                "enabled_actions": int(enabled_n.get(c, 0)),
+                "enabled_with_value": int(with_value_n.get(c, 0)),
+            },
+            PRIMARY_IS_PURCHASE.name: {
+                "customer_id": c,
+                "primary_is_purchase": bool(purchase.get(c, 0)),
+                "primary_actions": primary.get(c) or "none",
+            },
+            LAST_CLICK_PRESENT.name: {
+                "customer_id": c,
+                "has_last_click_goals": c in last_click,
+                "last_click_list": last_click.get(c) or "none",
+            },
+            CALL_TRACKING.name: {
+                "customer_id": c,
+                "call_tracking_present": c in calls,
+                "call_goal_list": calls.get(c) or "none",
+            },
+            STORE_VISITS.name: {
+                "customer_id": c,
+                "store_visits_present": c in stores,
+                "store_visit_list": stores.get(c) or "none",
+            },
+        }
+    return results
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Scan: vectorized KPIs for all accounts, the rest per account
+# ──────────────────────────────────────────────────────────────────────────────
+def scan_accounts_vectorized(
+    client,
+    plan: KpiPlan,
+    leaves: dict[str, str],
+    *,
+    workers: int = 1,
+    store=None,
+    ttl: float | None = None,
+    **kwargs,
+):
+    """
+    Drop-in for `scan_accounts`: same rows, same order.
+
+    Accounts whose conversion-action query failed get those KPI fields blank,
+    as in the row-by-row scan. With a `store`, only accounts with a stale,
+    failed or missing vectorized KPI are loaded, and only those KPIs are
+    saved; the rest are merged from the store.
+    """
+    vectorized = [s.name for s in plan.specs if s.name in VECTORIZED_KPIS]
+    if not vectorized:
+        yield from scan_accounts(
+            client, plan, leaves, workers=workers, store=store, ttl=ttl, **kwargs
+        )
+        return
+
+    stored: dict[str, dict] = {}
+    if store is not None:
+        for cid in leaves:
+            fresh = store.fresh(cid, ttl)
+            stored[cid] = {n: fresh[n] for n in vectorized if n in fresh}
+    pending = {
+        cid: [n for n in vectorized if n not in stored.get(cid, {})] for cid in leaves
+    }
+    todo = [cid for cid in leaves if pending[cid]]
+
+    results, failed = {}, {}
+    if todo:
+        frame, failed = load_conversion_actions(client, todo, workers=workers)
+        results = evaluate_frame(frame, [c for c in todo if c not in failed])
+        del frame
+
+    rest = subplan(plan, [s.name for s in plan.specs if s.name not in VECTORIZED_KPIS])
+    for row in scan_accounts(
+        client, rest, leaves, workers=workers, store=store, ttl=ttl, **kwargs
+    ):
+        cid = row["customer_id"]
+        computed = {n: results[cid][n] for n in pending[cid]} if cid in results else {}
+        row.update(merge_results(plan, {**stored.get(cid, {}), **computed}))
+        if store is not None and pending[cid]:
+            if cid in failed:
+                store.save(cid, {}, dict.fromkeys(pending[cid], failed[cid]))
+            else:
+                store.save(cid, computed)
+        yield row
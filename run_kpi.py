@@ -1,33 +1,25 @@
 """
 Run every Tracking KPI for one CUSTOMER_ID
 and write a single-row Excel sheet.
+
+With KPI_SERVICE_URL set (e.g. http://127.0.0.1:8765), the row comes from a
+running kpi_service.py instead: no client start-up, and recent results are
+served from its memory.
 """
 
 import os
-import pandas as pd
-from packages.google_ads_kpi.auth import get_client
-from packages.kpis.tracking import (
-    kpi_enabled_conversion_actions,
-    kpi_primary_is_purchase,
-    kpi_last_click_present,
-    kpi_enhanced_conversions,
-    kpi_call_tracking,
-    kpi_store_visits,
-    kpi_auto_tagging,
-    kpi_offline_import,
-)
-
-# list of callables to execute in order
-KPI_FUNCS = [
-    kpi_enabled_conversion_actions,
-    kpi_primary_is_purchase,
-    kpi_last_click_present,
-    kpi_enhanced_conversions,
-    kpi_call_tracking,
-    kpi_store_visits,
-    kpi_auto_tagging,
-    kpi_offline_import,
-]
+
+from packages.google_ads_kpi.auth import get_client, load_env
+
+load_env()  # before the modules below read their env defaults
+
+from packages.google_ads_kpi.gaql import GaqlError  # noqa: E402
+from packages.google_ads_kpi.report import open_table  # noqa: E402
+from packages.kpis.spec import compile_plan, execute_plan, validate_plan  # noqa: E402
+from packages.kpis.tracking import KPI_SPECS  # noqa: E402
+
+# KPIs reading the same resource share one GAQL query per account
+PLAN = compile_plan(KPI_SPECS)
 
 
 def main():
@@ -35,15 +27,25 @@ def main():
     if not cid:
         raise SystemExit("Set CUSTOMER_ID in your .env")
 
-    client = get_client()
-
-    # Run each KPI and merge the dicts into one row
-    row = {}
-    for fn in KPI_FUNCS:
-        row.update(fn(client, cid))
-
-    pd.DataFrame([row]).to_excel("kpi_output.xlsx", index=False)
-    print(f"✅ Wrote kpi_output.xlsx with {len(KPI_FUNCS)} KPIs")
+    if os.getenv("KPI_SERVICE_URL"):
+        from packages.kpis.service import fetch_kpis   # http client, this path only
+
+        row = fetch_kpis(os.environ["KPI_SERVICE_URL"], cid)
+    else:
+        client = get_client()
+        try:
+            validate_plan(PLAN, client, cached_only=True)   # never a catalog download
+        except GaqlError as exc:
+            raise SystemExit(f"❌ {exc}") from None
+        # Run the compiled plan; every KPI's dict is merged into one row
+        row = execute_plan(PLAN, client, cid)
+
+    with open_table("kpi_output.xlsx", PLAN.columns) as out:
+        out.write(row)
+    print(
+        f"✅ Wrote kpi_output.xlsx with {len(PLAN.specs)} KPIs "
+        f"from {len(PLAN.queries)} queries"
+    )
 
 
 if __name__ == "__main__":
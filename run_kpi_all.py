@@ -1,62 +1,214 @@
 """
 Scan every client (leaf) account under your MCC, run ALL tracking KPIs,
 and write one Excel sheet with one row per account.
+
+Rows are streamed to KPI_OUTPUT (default kpi_all_accounts.xlsx) as each
+account finishes; use a .csv or .parquet path for those formats instead.
+
+Sharded runs (same report, split across processes or hosts):
+  • KPI_PROCESSES=N   run N shard processes on this machine, then merge
+  • KPI_SHARD=i/N     run only shard i (0-based) of N and write its partial
+                      file to KPI_PARTIAL_DIR; merge with run_kpi_merge.py
+Accounts are assigned to shards by a stable hash of their CID, and each shard
+gets 1/N of GOOGLE_ADS_QPS since they share one developer token.
+
+KPI_RUN_DEADLINE=seconds bounds the whole run: calls still running are cut
+off at the deadline and accounts not reached get blank KPI fields (FAIL in
+the log). KPI_HEDGE=1 duplicates unary reads slower than their p95 (see
+google_ads_kpi.timeouts).
+
+Accounts failing with a permission / not-enabled error get no further
+queries in the run and are skipped for KPI_NEGATIVE_TTL seconds afterwards
+(blank KPI fields, "FAIL skipped: …" in the log; see kpis.breaker).
+
+KPI_ASYNC=1 scans on one asyncio event loop (gRPC aio) with up to
+KPI_CONCURRENCY accounts in flight instead of KPI_WORKERS threads.
+
+Per-KPI / per-query / per-account latency percentiles, rows, retries and
+errors are written to KPI_METRICS_JSON and KPI_METRICS_PROM (Prometheus
+textfile) at the end of the run; set either to an empty string to skip it.
 """
 
+import multiprocessing
 import os
-import pandas as pd
-from packages.google_ads_kpi.auth import get_client
-from packages.google_ads_kpi.hierarchy import list_leaf_accounts
-from packages.kpis.tracking import (
-    kpi_enabled_conversion_actions,
-    kpi_primary_is_purchase,
-    kpi_last_click_present,
-    kpi_enhanced_conversions,
-    kpi_call_tracking,
-    kpi_store_visits,
-    kpi_auto_tagging,
-    kpi_offline_import,
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from packages.google_ads_kpi.auth import get_client, load_env, pool_stats
+
+load_env()  # before the modules below read their env defaults (GOOGLE_ADS_QPS, …)
+
+from packages.google_ads_kpi.gaql import GaqlError  # noqa: E402
+from packages.google_ads_kpi.hierarchy import list_leaf_accounts  # noqa: E402
+from packages.google_ads_kpi.metrics import RECORDER  # noqa: E402
+from packages.google_ads_kpi.ratelimit import RATE_LIMITER  # noqa: E402
+from packages.google_ads_kpi.report import open_table  # noqa: E402
+from packages.google_ads_kpi.timeouts import POLICY, RUN_DEADLINE  # noqa: E402
+from packages.kpis.breaker import BREAKER  # noqa: E402
+from packages.kpis.scan import scan_accounts, scan_columns  # noqa: E402
+from packages.kpis.schedule import schedule_from_env  # noqa: E402
+from packages.kpis.shard import (  # noqa: E402
+    PartialWriter,
+    merge_partials,
+    parse_shard,
+    partial_path,
+    shard_leaves,
 )
+from packages.kpis.spec import compile_plan, plan_fingerprints, validate_plan  # noqa: E402
+from packages.kpis.store import ResultStore  # noqa: E402
+from packages.kpis.tracking import KPI_SPECS  # noqa: E402
+from packages.kpis.vectorized import scan_accounts_vectorized  # noqa: E402
+
+# KPIs reading the same resource share one GAQL query per account
+PLAN = compile_plan(KPI_SPECS)
+
+
+def _enabled(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+def _scan_options() -> dict:
+    """KPI_WORKERS accounts at a time; with KPI_STORE set, fresh results are
+    reused and only stale/failed/new KPIs are recomputed (KPI_RESULT_TTL
+    seconds, default 24h) and computed by the current definition of their KPI.
+    Accounts go to the workers longest-expected-first unless KPI_SCHEDULE=0."""
+    store = os.getenv("KPI_STORE")
+    return {
+        "workers": int(os.getenv("KPI_WORKERS", "1")),
+        "store": ResultStore(store, fingerprints=plan_fingerprints(PLAN)) if store else None,
+        "ttl": float(os.getenv("KPI_RESULT_TTL", str(24 * 3600))),
+        "schedule": schedule_from_env(),
+    }
+
+
+def _close_options(options: dict) -> None:
+    """Close the result store and keep this run's account durations."""
+    if options["store"] is not None:
+        options["store"].close()
+    if options["schedule"] is not None:
+        options["schedule"].save()
+        print("schedule:", options["schedule"].report())
+
+
+def _scan(client, leaves: dict[str, str], options: dict):
+    """Rows for `leaves` in order; KPI_VECTORIZED=1 evaluates the
+    conversion-action KPIs for all accounts at once (pandas)."""
+    if _enabled("KPI_VECTORIZED"):
+        return scan_accounts_vectorized(client, PLAN, leaves, **options)
+    return scan_accounts(client, PLAN, leaves, **options)
+
 
-# Put every KPI function you want to execute in this list
-KPI_FUNCS = [
-    kpi_enabled_conversion_actions,
-    kpi_primary_is_purchase,
-    kpi_last_click_present,
-    kpi_enhanced_conversions,
-    kpi_call_tracking,
-    kpi_store_visits,
-    kpi_auto_tagging,
-    kpi_offline_import,
-]
+async def _write_rows_async(client, leaves: dict[str, str], options: dict, out) -> None:
+    from packages.google_ads_kpi.aio import close_async_services
+    from packages.kpis.aio import scan_accounts_async
+
+    options = {k: v for k, v in options.items() if k != "workers"}
+    try:
+        async for row in scan_accounts_async(client, PLAN, leaves, **options):
+            out.write(row)
+    finally:
+        await close_async_services(client)
+
+
+def _write_rows(client, leaves: dict[str, str], options: dict, out) -> None:
+    """Scan `leaves` into `out`; KPI_ASYNC=1 takes precedence over KPI_VECTORIZED."""
+    if _enabled("KPI_ASYNC"):
+        import asyncio                          # only on this path (start-up time)
+
+        asyncio.run(_write_rows_async(client, leaves, options, out))
+        return
+    for row in _scan(client, leaves, options):
+        out.write(row)
+
+
+def _write_metrics(suffix: str = "") -> None:
+    """Latency / error summary for dashboards and alerting."""
+    metrics_json = os.getenv("KPI_METRICS_JSON", "kpi_metrics.json")
+    metrics_prom = os.getenv("KPI_METRICS_PROM", "kpi_metrics.prom")
+    if metrics_json:
+        stem, ext = os.path.splitext(metrics_json)
+        print("📊 Metrics summary:", RECORDER.write_json(stem + suffix + ext))
+    if metrics_prom:
+        stem, ext = os.path.splitext(metrics_prom)
+        print("📊 Prometheus textfile:", RECORDER.write_prometheus(stem + suffix + ext))
+
+
+def _report_deadline() -> None:
+    print("timeouts:", POLICY.stats())
+    print("circuit breaker:", BREAKER.stats())
+    if RUN_DEADLINE.expired():
+        print("⏱ Run deadline reached: accounts not finished have blank KPI fields")
+
+
+def run_shard(leaves: dict[str, str], index: int, shards: int, partial_dir: str) -> str:
+    """Scan shard `index` of `shards` and write its partial file; returns the path."""
+    client = get_client()
+    RUN_DEADLINE.start_from_env()             # the parent's deadline, if any
+    # shards share one developer token: split the configured ceiling
+    RATE_LIMITER.reset(float(os.getenv("GOOGLE_ADS_QPS", "10")) / shards)
+
+    mine = shard_leaves(leaves, index, shards)
+    options = _scan_options()
+    path = partial_path(partial_dir, index, shards)
+    with PartialWriter(path, scan_columns(PLAN), leaves, index, shards) as out:
+        _write_rows(client, mine, options, out)
+    _close_options(options)
+
+    print(f"✅ Shard {index}/{shards}: {out.rows} rows → {path}")
+    _report_deadline()
+    _write_metrics(suffix=f".shard{index:03d}")
+    return path
 
 
 def main() -> None:
+    RUN_DEADLINE.start_from_env()
     client = get_client()
+    try:
+        validate_plan(PLAN, client)           # fail here, not once per account
+    except GaqlError as exc:
+        raise SystemExit(f"❌ {exc}") from None
 
     # 1️⃣ Pull all leaf accounts
     mcc_cid = os.environ["LOGIN_CUSTOMER_ID"]
     leaves = list_leaf_accounts(client, mcc_cid)
     print(f"Found {len(leaves)} leaf accounts under {mcc_cid}")
+    print(f"{len(PLAN.specs)} KPIs compiled into {len(PLAN.queries)} queries")
+
+    output = os.getenv("KPI_OUTPUT", "kpi_all_accounts.xlsx")
+    partial_dir = os.getenv("KPI_PARTIAL_DIR", "kpi_parts")
+    processes = int(os.getenv("KPI_PROCESSES", "1"))
+
+    # 2️⃣a One shard of a multi-host run: the merge happens elsewhere
+    if os.getenv("KPI_SHARD"):
+        index, shards = parse_shard(os.environ["KPI_SHARD"])
+        run_shard(leaves, index, shards, partial_dir)
+        return
+
+    # 2️⃣b All shards as local processes (spawned: gRPC is not fork-safe)
+    if processes > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(processes, mp_context=context) as pool:
+            paths = list(pool.map(
+                run_shard, repeat(leaves), range(processes),
+                repeat(processes), repeat(partial_dir),
+            ))
+        rows = merge_partials(paths, output)
+        print(f"✅ Saved {output} with", rows, f"rows from {processes} shards")
+        return
+
+    # 2️⃣c Single process: stream each row to the report as its account is done
+    options = _scan_options()
+    with open_table(output, scan_columns(PLAN)) as out:
+        _write_rows(client, leaves, options, out)
+    _close_options(options)
+
+    print(f"✅ Saved {output} with", out.rows, "rows")
+    print("rate limiter:", RATE_LIMITER.stats())
+    print("channels:", pool_stats(client))
+    _report_deadline()
 
-    # 2️⃣ Run every KPI for each leaf
-    rows = []
-    for cid, name in leaves.items():
-        print(f"▶ {name} ({cid})", end=" … ")
-        row = {"customer_id": cid, "account_name": name}
-
-        try:
-            for fn in KPI_FUNCS:
-                row.update(fn(client, cid))
-            print("OK")
-        except Exception as exc:
-            print("FAIL", exc)
-            # Leave KPI fields blank on failure; keep account in sheet
-        rows.append(row)
-
-    # 3️⃣ Save results
-    pd.DataFrame(rows).to_excel("kpi_all_accounts.xlsx", index=False)
-    print("✅ Saved kpi_all_accounts.xlsx with", len(rows), "rows")
+    # 3️⃣ Latency / error summary
+    _write_metrics()
 
 
 if __name__ == "__main__":
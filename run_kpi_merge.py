@@ -0,0 +1,28 @@
+"""
+Merge the partial files of a sharded run_kpi_all.py (KPI_SHARD=i/N on each
+host) into the final report, in the same row order as a single-process run.
+
+Reads every kpi_part_*.jsonl in KPI_PARTIAL_DIR (default kpi_parts) and
+writes KPI_OUTPUT (default kpi_all_accounts.xlsx; .csv / .parquet work too).
+Fails without writing anything if a shard is missing or was built from a
+different account list.
+"""
+
+import os
+
+from packages.google_ads_kpi.auth import load_env
+
+load_env()
+
+from packages.kpis.shard import merge_partials  # noqa: E402
+
+
+def main() -> None:
+    partial_dir = os.getenv("KPI_PARTIAL_DIR", "kpi_parts")
+    output = os.getenv("KPI_OUTPUT", "kpi_all_accounts.xlsx")
+    rows = merge_partials(partial_dir, output)
+    print(f"✅ Saved {output} with", rows, f"rows from {partial_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,71 +7,39 @@ Creates leaf_data_showcase.xlsx with:
   • Keyword_stats      – top 100 keywords
   • Conversion_actions – all goals + meta
   • Audiences          – example audience data
+
+Sample queries run concurrently (SHOWCASE_WORKERS, default 4), each streaming
+its rows straight into its sheet; a failing sample leaves its error in the
+sheet instead of stopping the workbook. The field catalog comes from the
+on-disk cache (see google_ads_kpi.catalog). Every sample is checked against
+that catalog first (google_ads_kpi.gaql), so a bad field stops the run before
+any sample query is sent.
+CUSTOMER_ID may hold several comma-separated CIDs; each gets its own
+leaf_data_showcase_<cid>.xlsx.
+
+Library use:
+    build_showcase(client, "7192753145")
+    build_showcases(client, ["7192753145", "1234567890"], workers=8)
 """
 
 import os
-import pandas as pd
 import datetime as dt
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from google.protobuf.json_format import MessageToDict
-
-from packages.google_ads_kpi.auth import get_client
-
-# ── config ──────────────────────────────────────────────────────────────
-LEAF_CID = os.getenv("CUSTOMER_ID")       # 10-digit, no dashes
-OUTPUT   = "leaf_data_showcase.xlsx"
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-client   = get_client()
-ga       = client.get_service("GoogleAdsService")
+from packages.google_ads_kpi.auth import get_client, get_service, load_env
 
-# ── helpers ─────────────────────────────────────────────────────────────
-def row_to_dict(row):
-    """Flatten GoogleAdsRow -> dict"""
-    return MessageToDict(row._pb, preserving_proto_field_name=True)
+load_env()  # before the modules below read their env defaults (FIELD_CATALOG_TTL, …)
 
-def _scalarize(value):
-    """Turn lists / dicts into a JSON string so Excel can store it."""
-    if isinstance(value, (dict, list)):
-        return json.dumps(value, ensure_ascii=False)
-    return value
+from packages.google_ads_kpi.catalog import load_field_catalog  # noqa: E402
+from packages.google_ads_kpi.flatten import iter_records  # noqa: E402
+from packages.google_ads_kpi.gaql import FieldCatalog, GaqlError, validate_queries  # noqa: E402
+from packages.google_ads_kpi.query import paged_search, select_fields  # noqa: E402
+from packages.google_ads_kpi.report import XlsxWorkbook  # noqa: E402
 
-def dump_field_catalog(wb):
-    """Add a sheet listing every GAQL field"""
-    field_service = client.get_service("GoogleAdsFieldService")
-    query = """
-      SELECT
-        name,
-        category,
-        selectable,
-        filterable,
-        sortable
-    """
-    rows = [
-        {
-            "name": f.name,
-            "category": f.category.name,
-            "selectable": f.selectable,
-            "filterable": f.filterable,
-            "sortable": f.sortable,
-        }
-        for f in field_service.search_google_ads_fields(query=query)
-    ]
-    ws = wb.create_sheet("API_field_catalog")
-    for r in dataframe_to_rows(pd.DataFrame(rows), index=False, header=True):
-        ws.append(r)
-
-
-def run_query_to_sheet(query: str, sheet_name: str, wb):
-    rows = [row_to_dict(r) for r in ga.search(customer_id=LEAF_CID, query=query)]
-    if not rows:
-        return                                     # nothing to write
-
-    df = pd.json_normalize(rows)                  # flatten nested keys
-    ws = wb.create_sheet(sheet_name[:31])
-
-    for row in dataframe_to_rows(df, index=False, header=True):
-        ws.append([_scalarize(v) for v in row])
+# ── config ──────────────────────────────────────────────────────────────
+OUTPUT = "leaf_data_showcase.xlsx"
+CATALOG_COLUMNS = ["name", "category", "selectable", "filterable", "sortable"]
 
 # ── sample queries to showcase data ─────────────────────────────────────
 SAMPLES = {
@@ -132,20 +100,115 @@ SAMPLES = {
     """,
 }
 
-# ── build workbook ──────────────────────────────────────────────────────
-wb = Workbook()
-wb.remove(wb.active)                       # start fresh sheet list
 
-dump_field_catalog(wb)
-
-for name, q in SAMPLES.items():
-    print("Running", name)
-    run_query_to_sheet(q, name, wb)
+# ── helpers ─────────────────────────────────────────────────────────────
+def dump_field_catalog(wb, catalog: list[dict]):
+    """Add a sheet listing every GAQL field"""
+    ws = wb.sheet("API_field_catalog", CATALOG_COLUMNS)
+    for f in catalog:
+        ws.append([f[c] for c in CATALOG_COLUMNS])
 
-# optional front-cover sheet
-cover = wb.create_sheet("README", 0)
-cover["A1"] = f"Leaf account data showcase for CID {LEAF_CID}"
-cover["A2"] = f"Generated {dt.date.today().isoformat()}"
 
-wb.save(OUTPUT)
-print(f"✅ wrote {OUTPUT} for account {LEAF_CID}")
+def stream_sample(ga, cid: str, name: str, query: str, ws) -> bool:
+    """
+    Stream one sample query into its sheet (one column per field). A failure
+    is noted in the sheet and logged, not raised, so the other samples of the
+    workbook are still written.
+    """
+    print(f"Running {name} for {cid}")
+    try:
+        for values in iter_records(paged_search(ga, cid, query), ws.columns):
+            ws.append(values)
+    except Exception as exc:
+        ws.append([f"❌ {type(exc).__name__}: {exc}"])
+        print(f"❌ {name} failed for {cid}: {exc}")
+        return False
+    return True
+
+
+def open_showcase(output: str, cid: str, catalog: list[dict], samples: dict):
+    """Start a workbook: cover, field catalog, then one sheet per sample."""
+    wb = XlsxWorkbook(output)              # write-only: rows go straight to disk
+
+    # optional front-cover sheet (first, since write-only sheets keep their order)
+    cover = wb.sheet("README")
+    cover.append([f"Leaf account data showcase for CID {cid}"])
+    cover.append([f"Generated {dt.date.today().isoformat()}"])
+
+    dump_field_catalog(wb, catalog)
+    return wb, {name: wb.sheet(name, select_fields(q)) for name, q in samples.items()}
+
+
+def build_showcases(
+    client,
+    cids,
+    *,
+    output: str | None = None,
+    workers: int = 4,
+    samples: dict[str, str] = SAMPLES,
+) -> list[str]:
+    """
+    Build one showcase workbook per CID; every (CID, sample) query runs on a
+    shared pool of `workers` threads and streams its rows into its own sheet
+    (a sample with no rows keeps just its header; a failed one, the error).
+    Only as many CIDs are open at once as it takes to keep the pool busy.
+    Returns the written paths.
+    Raises GaqlError, before any sample runs, if a sample is invalid.
+
+    output – file name for a single CID (default leaf_data_showcase.xlsx);
+             several CIDs always get leaf_data_showcase_<cid>.xlsx
+    """
+    cids = [cids] if isinstance(cids, str) else list(cids)
+    ga = get_service(client)
+    catalog = load_field_catalog(client)
+    validate_queries(client, samples, catalog=FieldCatalog(catalog))
+
+    workers = max(1, workers)
+    in_flight = max(1, -(-workers // max(1, len(samples))))    # ceil
+    written: list[str] = []
+
+    def _finish(cid, path, wb, pending):
+        failed = sum(not fut.result() for fut in pending)
+        wb.close()
+        written.append(path)
+        note = f" ({failed} sample(s) failed)" if failed else ""
+        print(f"✅ wrote {path} for account {cid}{note}")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        open_books = deque()
+        for cid in cids:
+            if len(cids) == 1:
+                path = output or OUTPUT
+            else:
+                path = f"{os.path.splitext(OUTPUT)[0]}_{cid}.xlsx"
+            wb, sheets = open_showcase(path, cid, catalog, samples)
+            pending = [
+                pool.submit(stream_sample, ga, cid, name, query, sheets[name])
+                for name, query in samples.items()
+            ]
+            open_books.append((cid, path, wb, pending))
+            if len(open_books) >= in_flight:
+                _finish(*open_books.popleft())
+        while open_books:
+            _finish(*open_books.popleft())
+    return written
+
+
+def build_showcase(client, cid: str, **kwargs) -> str:
+    """Build the showcase workbook for one CID; returns its path."""
+    return build_showcases(client, [cid], **kwargs)[0]
+
+
+def main():
+    cids = [c.strip() for c in os.getenv("CUSTOMER_ID", "").split(",") if c.strip()]
+    if not cids:
+        raise SystemExit("Set CUSTOMER_ID in your .env")      # 10-digit, no dashes
+    workers = int(os.getenv("SHOWCASE_WORKERS", "4"))
+    try:
+        build_showcases(get_client(), cids, workers=workers)
+    except GaqlError as exc:
+        raise SystemExit(f"❌ {exc}") from None
+
+
+if __name__ == "__main__":
+    main()
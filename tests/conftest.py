@@ -0,0 +1,42 @@
+"""
+Offline test setup: every test runs against bench.fake_ads with its own
+KPI_CACHE_DIR and freshly reset process-wide singletons.
+
+test_oauth.py is a live smoke test against the real API; it is only
+collected when credentials are in the environment.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+collect_ignore = [] if os.getenv("GOOGLE_DEVELOPER_TOKEN") else ["test_oauth.py"]
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Private on-disk caches and no carry-over between tests."""
+    from packages.google_ads_kpi.ratelimit import RATE_LIMITER
+    from packages.google_ads_kpi.timeouts import POLICY, RUN_DEADLINE
+    from packages.kpis.breaker import BREAKER
+
+    monkeypatch.setenv("KPI_CACHE_DIR", str(tmp_path / "cache"))
+    RATE_LIMITER.reset(1000.0)
+    POLICY.reset()
+    RUN_DEADLINE.start(None)
+    BREAKER.reset()
+    yield
+    RUN_DEADLINE.start(None)
+    BREAKER.reset()
+
+
+@pytest.fixture
+def client():
+    """A small, instant fake Google Ads client (6 leaf accounts)."""
+    from bench.fake_ads import FakeAdsConfig, FakeGoogleAdsClient
+
+    return FakeGoogleAdsClient(FakeAdsConfig(accounts=6, sub_managers=2, latency=0.0))
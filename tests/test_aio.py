@@ -0,0 +1,114 @@
+import asyncio
+
+from packages.google_ads_kpi.aio import (
+    close_async_services,
+    get_async_service,
+    paged_search_async,
+)
+from packages.google_ads_kpi.ratelimit import AdaptiveRateLimiter
+from packages.kpis.aio import scan_accounts_async
+from packages.kpis.scan import scan_accounts
+from packages.kpis.spec import compile_plan
+from packages.kpis.store import ResultStore
+from packages.kpis.tracking import KPI_SPECS
+
+PLAN = compile_plan(KPI_SPECS)
+
+
+class _CountingLimiter(AdaptiveRateLimiter):
+    def __init__(self):
+        super().__init__(rate=1000.0)
+        self.tokens = 0
+
+    def reserve(self):
+        self.tokens += 1
+        return super().reserve()
+
+
+class _Page:
+    def __init__(self, results, next_page_token):
+        self.results, self.next_page_token = results, next_page_token
+
+
+class _PagedService:
+    """Async GoogleAdsService whose search() returns a three-page pager."""
+
+    def __init__(self):
+        self.searches, self.fetched = 0, 0
+
+    async def search(self, customer_id, query, retry=None, timeout=None, **kwargs):
+        self.searches += 1
+        service = self
+
+        class _Pager:
+            @property
+            async def pages(self):
+                for page in (_Page([1, 2], "p2"), _Page([3], "p3"), _Page([4], "")):
+                    service.fetched += 1
+                    yield page
+
+        return _Pager()
+
+
+def _collect(rows):
+    async def _rows():
+        return [row async for row in rows]
+
+    return asyncio.run(_rows())
+
+
+def _leaves(client):
+    return {cid: f"Account {cid}" for cid in client.leaf_cids()}
+
+
+def _scan_async(client, leaves, **kwargs):
+    return _collect(scan_accounts_async(client, PLAN, leaves, **kwargs))
+
+
+def test_paged_search_async_takes_a_token_per_page():
+    limiter, service = _CountingLimiter(), _PagedService()
+    rows = paged_search_async(
+        service, "1", "SELECT campaign.id FROM campaign", limiter=limiter, stream=False
+    )
+
+    assert _collect(rows) == [1, 2, 3, 4]
+    assert service.searches == 1 and service.fetched == 3
+    assert limiter.tokens == 3                   # the search, then two further pages
+
+
+def test_async_services_are_rebuilt_for_a_new_event_loop(client):
+    async def _services():
+        first, second = get_async_service(client), get_async_service(client)
+        return first, second
+
+    first, same = asyncio.run(_services())
+    assert first is same                         # one loop: one cached service
+    other, _ = asyncio.run(_services())
+    assert other is not first                    # its channels belonged to the old loop
+
+    async def _closed():
+        before = get_async_service(client)
+        await close_async_services(client)
+        return before, get_async_service(client)
+
+    before, after = asyncio.run(_closed())
+    assert after is not before
+
+
+def test_async_scan_yields_the_blocking_scans_rows(client):
+    leaves = _leaves(client)
+    assert _scan_async(client, leaves, concurrency=3) == list(
+        scan_accounts(client, PLAN, leaves, workers=3)
+    )
+
+
+def test_async_scan_reuses_fresh_stored_results(client, tmp_path):
+    leaves = _leaves(client)
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    first = _scan_async(client, leaves, store=store, ttl=3600)
+    calls = dict(client.stats.calls)
+
+    assert _scan_async(client, leaves, store=store, ttl=3600) == first
+    assert client.stats.calls == calls           # every KPI from the store
+    assert first == list(scan_accounts(client, PLAN, leaves))
+    store.close()
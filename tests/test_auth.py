@@ -0,0 +1,50 @@
+from packages.google_ads_kpi.auth import PooledService
+
+
+class _Pager:
+    def __init__(self, pages):
+        self._pages = pages
+
+    @property
+    def pages(self):
+        yield from self._pages
+
+    def __iter__(self):
+        for page in self._pages:
+            yield from page
+
+
+class _Service:
+    def search(self, pages):
+        return _Pager(pages)
+
+    def search_stream(self, batches):
+        return iter(batches)
+
+    def get(self):
+        return "row"
+
+
+def test_a_pager_stays_in_flight_until_it_is_exhausted():
+    member = PooledService(_Service(), 0)
+    pager = member.search([[1, 2], [3]])
+    assert member.in_flight == 1
+    assert list(pager) == [1, 2, 3]
+    assert member.in_flight == 0 and member.calls == 1
+
+
+def test_a_stream_left_early_or_dropped_ends_its_call():
+    member = PooledService(_Service(), 0)
+    pages = member.search([[1], [2]]).pages
+    assert next(pages) == [1] and member.in_flight == 1
+    pages.close()
+    assert member.in_flight == 0
+
+    member.search_stream([["a"], ["b"]])         # never iterated
+    assert member.in_flight == 0 and member.calls == 2
+
+
+def test_a_plain_result_ends_its_call_at_once():
+    member = PooledService(_Service(), 0)
+    assert member.get() == "row"
+    assert member.in_flight == 0 and member.stats()["calls"] == 1
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from google.api_core import exceptions
+
+from packages.google_ads_kpi.cache import read_json, write_json
+from packages.kpis.breaker import CACHE_NAME, AccountBreaker, AccountUnavailable, account_error
+
+CID = "3000000000"
+
+
+def test_only_account_level_errors_condemn_an_account(client):
+    assert account_error(client.account_exception()) == "authorization_error.CUSTOMER_NOT_ENABLED"
+    assert account_error(client.quota_exception()) is None
+    assert account_error(exceptions.ServiceUnavailable("503")) is None
+
+
+def test_account_error_opens_the_circuit(client):
+    breaker = AccountBreaker(ttl=3600)
+    breaker.check(CID)
+
+    assert not breaker.record(CID, exceptions.ServiceUnavailable("503"))
+    breaker.check(CID)
+    assert breaker.record(CID, client.account_exception())
+
+    with pytest.raises(AccountUnavailable, match="circuit open") as exc:
+        breaker.check(CID)
+    assert not exc.value.cached
+    assert breaker.blocked(CID)
+    assert breaker.stats() == {"opened": 1, "skipped_queries": 1, "probes": 0, "open": 1}
+
+
+def test_open_circuits_are_remembered_across_runs(client):
+    AccountBreaker(ttl=3600).record(CID, client.account_exception())
+    assert CID in read_json(CACHE_NAME)
+
+    next_run = AccountBreaker(ttl=3600)
+    with pytest.raises(AccountUnavailable, match="negative cache") as exc:
+        next_run.check(CID)
+    assert exc.value.cached
+    assert not next_run.suspect(CID)
+
+
+def test_expired_entry_is_probed_and_cleared(client):
+    AccountBreaker(ttl=3600).record(CID, client.account_exception())
+    entries = read_json(CACHE_NAME)
+    entries[CID]["at"] = time.time() - 7200
+    write_json(CACHE_NAME, entries)
+    later = AccountBreaker(ttl=3600)
+
+    later.check(CID)                              # expired: not skipped
+    assert later.suspect(CID)
+    later.clear(CID)
+    assert CID not in read_json(CACHE_NAME)
+    assert not AccountBreaker(ttl=3600).suspect(CID)
+
+
+def test_zero_ttl_only_lasts_for_the_run(client):
+    breaker = AccountBreaker(ttl=0)
+    breaker.record(CID, client.account_exception())
+
+    assert breaker.blocked(CID)
+    assert read_json(CACHE_NAME) is None
+    AccountBreaker(ttl=0).check(CID)
@@ -0,0 +1,130 @@
+import pytest
+
+from packages.google_ads_kpi.cassette import Cassette, CassetteMiss
+from packages.google_ads_kpi.query import paged_search
+
+QUERY = """
+  SELECT conversion_action.name, conversion_action.type
+  FROM conversion_action
+"""
+
+
+def _fetch(client, cid):
+    ga = client.get_service("GoogleAdsService")
+    return lambda: iter(ga.search(customer_id=cid, query=QUERY))
+
+
+def test_record_then_replay_round_trip(client, tmp_path):
+    cid = client.leaf_cids()[0]
+    recorded = list(Cassette("record", tmp_path).rows(cid, QUERY, _fetch(client, cid)))
+    calls = sum(client.stats.calls.values())
+
+    replay = Cassette("replay", tmp_path)
+    replayed = list(replay.rows(cid, " ".join(QUERY.split()), _fetch(client, cid)))
+
+    assert replayed == recorded and len(replayed) == client.config.actions_per_account
+    assert sum(client.stats.calls.values()) == calls          # nothing sent
+    assert replay.stats()["replayed"] == 1
+    assert replay.path(cid, QUERY).name.startswith("conversion_action-")
+
+
+def test_replay_without_recording_misses(client, tmp_path):
+    cassette = Cassette("replay", tmp_path)
+    with pytest.raises(CassetteMiss):
+        list(cassette.rows("3000000000", QUERY, _fetch(client, "3000000000")))
+    assert cassette.stats()["misses"] == 1
+
+
+def test_auto_records_only_what_is_missing(client, tmp_path):
+    cid = client.leaf_cids()[0]
+    cassette = Cassette("auto", tmp_path)
+    first = list(cassette.rows(cid, QUERY, _fetch(client, cid)))
+    second = list(cassette.rows(cid, QUERY, _fetch(client, cid)))
+
+    assert first == second
+    assert cassette.stats() == {"mode": "auto", "recorded": 1, "replayed": 1, "misses": 0}
+
+
+def test_abandoned_results_are_not_recorded(client, tmp_path):
+    cid = client.leaf_cids()[0]
+    cassette = Cassette("record", tmp_path)
+    rows = cassette.rows(cid, QUERY, _fetch(client, cid))
+    next(rows)
+    rows.close()
+
+    assert not cassette.path(cid, QUERY).exists()
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_lookup_that_reads_its_whole_limit_is_recorded(client, tmp_path, monkeypatch):
+    from packages.google_ads_kpi import cassette
+    from packages.kpis.spec import run_spec
+    from packages.kpis.tracking import AUTO_TAGGING       # LIMIT 1, reads one row
+
+    cid = client.leaf_cids()[0]
+    monkeypatch.setattr(cassette.CASSETTE, "mode", "record")
+    monkeypatch.setattr(cassette.CASSETTE, "directory", tmp_path)
+    live = run_spec(AUTO_TAGGING, client, cid)
+
+    monkeypatch.setattr(cassette.CASSETTE, "mode", "replay")
+    calls = sum(client.stats.calls.values())
+    assert run_spec(AUTO_TAGGING, client, cid) == live
+    assert sum(client.stats.calls.values()) == calls
+
+
+def test_account_errors_are_replayed(client, tmp_path):
+    def _dead():
+        raise client.account_exception()
+        yield                                                   # generator
+
+    cid = "3000000000"
+    with pytest.raises(Exception) as recorded:
+        list(Cassette("record", tmp_path).rows(cid, QUERY, _dead))
+    with pytest.raises(type(recorded.value)) as replayed:
+        list(Cassette("replay", tmp_path).rows(cid, QUERY, _dead))
+    assert replayed.value.failure == recorded.value.failure
+
+
+def test_paged_search_goes_through_the_cassette(client, tmp_path, monkeypatch):
+    from packages.google_ads_kpi import cassette
+
+    cid = client.leaf_cids()[0]
+    ga = client.get_service("GoogleAdsService")
+    monkeypatch.setattr(cassette.CASSETTE, "mode", "record")
+    monkeypatch.setattr(cassette.CASSETTE, "directory", tmp_path)
+    live = [r.conversion_action.name for r in paged_search(ga, cid, QUERY)]
+
+    monkeypatch.setattr(cassette.CASSETTE, "mode", "replay")
+    calls = sum(client.stats.calls.values())
+    replayed = [r.conversion_action.name for r in paged_search(ga, cid, QUERY)]
+
+    assert replayed == live
+    assert sum(client.stats.calls.values()) == calls
+
+
+@pytest.mark.parametrize("error", [
+    {"quota_error": "RESOURCE_EXHAUSTED"},
+    {"internal_error": "TRANSIENT_ERROR"},
+])
+def test_only_account_errors_are_recorded(client, tmp_path, error):
+    from bench.fake_ads import _ads_exception, _errors
+
+    def _failing():
+        raise _ads_exception(_errors.ErrorCode(**error), "fake: not an account error")
+        yield
+
+    cid = client.leaf_cids()[0]
+    cassette = Cassette("record", tmp_path)
+    with pytest.raises(Exception):
+        list(cassette.rows(cid, QUERY, _failing))
+    assert not cassette.path(cid, QUERY).exists()
+
+
+def test_recordings_only_load_google_ads_types():
+    from packages.google_ads_kpi.cassette import _load_type
+
+    with pytest.raises(ValueError, match="non-Google-Ads"):
+        _load_type("os:system")
+    assert _load_type("google.ads.googleads.errors:GoogleAdsException").__name__ == (
+        "GoogleAdsException"
+    )
@@ -0,0 +1,157 @@
+import pytest
+
+from packages.google_ads_kpi.gaql import (
+    Condition,
+    FieldCatalog,
+    GaqlError,
+    parse,
+    validate_queries,
+)
+
+
+def _field(name, category="ATTRIBUTE", **flags):
+    flags = {"selectable": True, "filterable": True, "sortable": True, **flags}
+    return {"name": name, "category": category, **flags}
+
+
+CATALOG = [
+    {"name": "campaign", "category": "RESOURCE",
+     "selectable_with": ["customer", "segments.date", "segments.week", "metrics.clicks"]},
+    _field("campaign.name"),
+    _field("campaign.status"),
+    _field("campaign.labels", sortable=False),
+    _field("campaign.resource_name", filterable=False),
+    _field("customer.id"),
+    _field("ad_group.id"),
+    _field("segments.date", "SEGMENT"),
+    _field("segments.week", "SEGMENT"),
+    _field("metrics.clicks", "METRIC"),
+    _field("metrics.ctr", "METRIC"),
+]
+
+
+def test_parse_every_clause():
+    q = parse("""
+        select campaign.name, metrics.clicks
+        FROM campaign
+        WHERE campaign.status IN ('ENABLED', 'PAUSED')
+          AND segments.date BETWEEN '2024-01-01' AND '2024-01-31'
+          AND campaign.name IS NOT NULL
+          AND metrics.clicks > 10
+        ORDER BY metrics.clicks DESC, campaign.name
+        LIMIT 5
+        PARAMETERS include_drafts=true
+    """)
+
+    assert q.resource == "campaign"
+    assert q.fields == ("campaign.name", "metrics.clicks")
+    assert q.where == (
+        Condition("campaign.status", "IN", ("'ENABLED'", "'PAUSED'")),
+        Condition("segments.date", "BETWEEN", ("'2024-01-01'", "'2024-01-31'")),
+        Condition("campaign.name", "IS NOT NULL", ()),
+        Condition("metrics.clicks", ">", ("10",)),
+    )
+    assert q.order_by == (("metrics.clicks", "DESC"), ("campaign.name", "ASC"))
+    assert q.limit == 5
+    assert q.parameters == (("include_drafts", "true"),)
+
+
+def test_parse_is_cached_per_normalized_query():
+    assert parse("SELECT campaign.name FROM campaign") is parse(
+        "  SELECT campaign.name\n   FROM campaign "
+    )
+
+
+@pytest.mark.parametrize("query, message", [
+    ("SELECT campaign.name campaign.id FROM campaign", "expected FROM"),
+    ("SELECT campaign.name FROM campaign LIMIT 0", "positive integer"),
+    ("SELECT campaign.name, campaign.name FROM campaign", "selected twice"),
+    ("SELECT campaign.name FROM campaign WHERE campaign.name ~ 'x'", "unexpected character"),
+    ("SELECT campaign.name FROM campaign WHERE campaign.name", "operator"),
+    ("SELECT Campaign.Name FROM campaign", "not a field name"),
+])
+def test_malformed_queries(query, message):
+    with pytest.raises(GaqlError, match=message):
+        parse(query)
+
+
+def test_valid_query_passes_the_catalog():
+    q = FieldCatalog(CATALOG).check(
+        "SELECT campaign.name, customer.id, metrics.clicks FROM campaign "
+        "WHERE segments.date DURING LAST_7_DAYS ORDER BY campaign.name"
+    )
+    assert q.resource == "campaign"
+
+
+@pytest.mark.parametrize("query, message", [
+    ("SELECT campaign.name FROM campaing", "unknown resource 'campaing'"),
+    ("SELECT campaign.nme FROM campaign", "unknown field 'campaign.nme'"),
+    ("SELECT campaign.name FROM campaign ORDER BY campaign.labels", "not sortable"),
+    ("SELECT campaign.name FROM campaign WHERE campaign.resource_name = 'x'", "not filterable"),
+    ("SELECT ad_group.id FROM campaign", "ad_group.id cannot be used with FROM campaign"),
+    ("SELECT metrics.ctr FROM campaign", "metrics.ctr cannot be used"),
+    ("SELECT segments.date, metrics.clicks FROM campaign", "date segments"),
+])
+def test_catalog_problems(query, message):
+    with pytest.raises(GaqlError, match=message):
+        FieldCatalog(CATALOG).check(query)
+
+
+def test_check_result_is_cached():
+    catalog = FieldCatalog(CATALOG)
+    query = "SELECT campaign.name FROM campaign"
+    assert catalog.check(query) is catalog.check(" ".join(query.split(" ")))
+    with pytest.raises(GaqlError) as first:
+        catalog.check("SELECT x.y FROM campaign")
+    with pytest.raises(GaqlError) as second:
+        catalog.check("SELECT x.y FROM campaign")
+    assert first.value is second.value
+
+
+def test_validate_queries_lists_every_invalid_query():
+    with pytest.raises(GaqlError) as exc:
+        validate_queries(None, {
+            "ok": "SELECT campaign.name FROM campaign",
+            "typo": "SELECT campaign.nme FROM campaign",
+            "bad": "SELECT FROM campaign",
+        }, catalog=FieldCatalog(CATALOG))
+    assert "typo:" in str(exc.value) and "bad:" in str(exc.value)
+    assert "ok:" not in str(exc.value)
+
+
+def test_tracking_plan_and_samples_validate_against_the_fake_catalog(client):
+    import show_data
+    from packages.kpis.spec import compile_plan, validate_plan
+    from packages.kpis.tracking import KPI_SPECS
+
+    validate_plan(compile_plan(KPI_SPECS), client)
+    validate_queries(client, show_data.SAMPLES)
+
+
+def test_a_filter_on_any_date_segment_satisfies_the_date_rule():
+    FieldCatalog(CATALOG).check(
+        "SELECT segments.date, metrics.clicks FROM campaign "
+        "WHERE segments.week = '2024-01-01'"
+    )
+
+
+def test_a_catalog_that_cannot_load_skips_validation(capsys):
+    class _Broken:
+        def get_service(self, *args, **kwargs):
+            raise OSError("no network")
+
+    validate_queries(_Broken(), ["SELECT campaign.nme FROM campaign"])
+    assert "not validated" in capsys.readouterr().out
+
+
+def test_cached_only_never_downloads_the_catalog(client):
+    from packages.kpis.spec import compile_plan, validate_plan
+    from packages.kpis.tracking import KPI_SPECS
+
+    plan = compile_plan(KPI_SPECS)
+    validate_plan(plan, client, cached_only=True)                # cold: skipped
+    assert "google_ads_field" not in client.stats.calls
+    validate_plan(plan, client)                                  # fetches, caches
+    calls = dict(client.stats.calls)
+    validate_plan(plan, client, cached_only=True)
+    assert client.stats.calls == calls
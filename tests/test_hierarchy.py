@@ -0,0 +1,71 @@
+import json
+import time
+
+from packages.google_ads_kpi.cache import cache_path
+from packages.google_ads_kpi.hierarchy import (
+    HIERARCHY_TTL,
+    _cache_key,
+    list_leaf_accounts,
+    resolve_hierarchy,
+)
+
+ROOT = "1000000000"
+SUB_0, SUB_1 = "2000000000", "2000000001"
+
+
+def _tree_calls(client) -> int:
+    return client.stats.calls.get("customer_client", 0)
+
+
+def test_one_query_builds_the_tree(client):
+    nodes = resolve_hierarchy(client, ROOT)
+    by_cid = {n.cid: n for n in nodes}
+
+    assert _tree_calls(client) == 1
+    assert [n.level for n in nodes] == sorted(n.level for n in nodes)   # shallowest first
+    assert by_cid[ROOT].level == 0 and by_cid[ROOT].manager
+    assert by_cid[SUB_0].parent == ROOT and by_cid[SUB_0].manager
+    assert by_cid["3000000000"].parent == ROOT                         # level 1
+    assert by_cid["3000000001"].level == 2
+    assert by_cid["3000000001"].parent is None                         # not resolved
+    assert list_leaf_accounts(client, ROOT) == {
+        cid: f"Account {int(cid) - 3000000000}" for cid in client.leaf_cids()
+    }
+
+
+def test_resolve_parents_asks_each_sub_manager(client):
+    nodes = resolve_hierarchy(client, ROOT, resolve_parents=True)
+    parents = {n.cid: n.parent for n in nodes}
+
+    assert _tree_calls(client) == 1 + 2                                 # root + sub-managers
+    assert parents["3000000001"] == SUB_0 and parents["3000000004"] == SUB_0
+    assert parents["3000000002"] == SUB_1 and parents["3000000005"] == SUB_1
+    assert parents["3000000003"] == ROOT and parents[ROOT] is None
+
+
+def test_tree_is_cached_on_disk_until_the_ttl(client):
+    first = resolve_hierarchy(client, ROOT)
+    assert resolve_hierarchy(client, ROOT) == first
+    assert list_leaf_accounts(client, ROOT)
+    assert _tree_calls(client) == 1                                     # warm: no API
+
+    resolve_hierarchy(client, ROOT, resolve_parents=True)               # its own entry
+    assert _tree_calls(client) == 1 + 3
+
+    path = cache_path(_cache_key(ROOT, False))
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    entry["saved_at"] = time.time() - HIERARCHY_TTL - 1
+    path.write_text(json.dumps(entry), encoding="utf-8")
+
+    assert resolve_hierarchy(client, ROOT) == first                     # expired: refetched
+    assert _tree_calls(client) == 5
+    assert resolve_hierarchy(client, ROOT, ttl=2 * HIERARCHY_TTL) == first
+    assert _tree_calls(client) == 5                                     # rewritten: fresh
+
+
+def test_refresh_ignores_the_cache(client):
+    resolve_hierarchy(client, ROOT)
+    resolve_hierarchy(client, ROOT, refresh=True)
+    resolve_hierarchy(client, ROOT)
+
+    assert _tree_calls(client) == 2
@@ -0,0 +1,21 @@
+from packages.google_ads_kpi import metrics
+from packages.google_ads_kpi.metrics import Recorder, Span
+
+
+def _record(recorder, seconds, error=None):
+    recorder.record(Span("query", "campaign", "1", rows=2, seconds=seconds, error=error))
+
+
+def test_summary_keeps_exact_totals_over_a_bounded_window(monkeypatch):
+    monkeypatch.setattr(metrics, "LATENCY_WINDOW", 10)
+    recorder = Recorder()
+    for i in range(1, 101):
+        _record(recorder, float(i), error="Timeout" if i % 50 == 0 else None)
+
+    series = recorder._series[("query", "campaign")]
+    assert len(series.latencies) == 10
+    s = recorder.summary()["query"]["campaign"]
+    assert s["count"] == 100 and s["total_s"] == 5050.0 and s["max_s"] == 100.0
+    assert s["p50_s"] == 95.0                        # quantiles: the last 10 only
+    assert s["rows"] == 200 and s["errors"] == {"Timeout": 2}
+    assert recorder.summary()["slowest"]["query"][0]["seconds"] == 100.0
@@ -0,0 +1,117 @@
+import pytest
+from google.api_core import exceptions
+
+from packages.google_ads_kpi.query import rate_limited
+from packages.google_ads_kpi.ratelimit import AdaptiveRateLimiter, is_quota_error, retry_delay
+
+
+def test_bucket_allows_a_burst_then_spaces_calls():
+    limiter = AdaptiveRateLimiter(rate=10.0, burst=2)
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() == 0.0
+    assert limiter.reserve() == pytest.approx(0.1, abs=0.02)
+
+
+def test_quota_error_cuts_the_rate_and_pauses_everyone():
+    limiter = AdaptiveRateLimiter(rate=10.0, decrease=0.5, increase=1.0)
+
+    assert limiter.on_quota_error(2.0) == 2.0
+    assert limiter.rate == 5.0
+    assert limiter.reserve() == pytest.approx(2.0, abs=0.05)
+
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.rate == 10.0                      # back up to the ceiling
+    limiter.reset(20.0)
+    assert limiter.stats()["max_rate"] == 20.0 and limiter.quota_errors == 0
+
+
+def test_quota_errors_are_recognised(client):
+    quota = client.quota_exception()
+    assert is_quota_error(quota)
+    assert retry_delay(quota) == client.config.quota_retry_delay
+    assert is_quota_error(exceptions.ResourceExhausted("slow down"))
+    assert is_quota_error(exceptions.TooManyRequests("slow down"))
+    assert not is_quota_error(exceptions.ServiceUnavailable("503"))
+
+
+def test_rate_limited_retries_quota_errors():
+    limiter = AdaptiveRateLimiter(rate=1000.0, default_delay=0.0)
+    calls = []
+
+    def _call():
+        calls.append(1)
+        if len(calls) == 1:
+            raise exceptions.ResourceExhausted("slow down")
+        return "ok"
+
+    assert rate_limited(_call, limiter=limiter) == "ok"
+    assert len(calls) == 2 and limiter.quota_errors == 1
+
+
+def test_rate_limited_does_not_retry_other_errors():
+    limiter = AdaptiveRateLimiter(rate=1000.0)
+    calls = []
+
+    def _call():
+        calls.append(1)
+        raise exceptions.ServiceUnavailable("503")
+
+    with pytest.raises(exceptions.ServiceUnavailable):
+        rate_limited(_call, limiter=limiter)
+    assert len(calls) == 1
+
+
+class _Page:
+    def __init__(self, results, next_page_token):
+        self.results, self.next_page_token = results, next_page_token
+
+
+class _Pager:
+    def __init__(self, pages):
+        self._pages, self.fetched = pages, 0
+
+    @property
+    def pages(self):
+        for page in self._pages:
+            self.fetched += 1
+            yield page
+
+
+class _CountingLimiter(AdaptiveRateLimiter):
+    def __init__(self):
+        super().__init__(rate=1000.0)
+        self.tokens = 0
+
+    def reserve(self):
+        self.tokens += 1
+        return super().reserve()
+
+
+def test_every_further_search_page_takes_a_token():
+    from packages.google_ads_kpi.query import _paged_rows
+
+    limiter = _CountingLimiter()
+    pager = _Pager([_Page([1, 2], "p2"), _Page([3], "p3"), _Page([4], "")])
+    assert list(_paged_rows(pager, limiter)) == [1, 2, 3, 4]
+    assert limiter.tokens == 2                   # the first page came with search()
+    assert list(_paged_rows(iter([5, 6]), limiter)) == [5, 6]
+    assert limiter.tokens == 2
+
+
+def test_async_pages_take_tokens_too():
+    import asyncio
+    from packages.google_ads_kpi.aio import _paged_rows_async
+
+    class _AsyncPager:
+        @property
+        async def pages(self):
+            for page in (_Page([1], "p2"), _Page([2], "")):
+                yield page
+
+    async def _rows():
+        return [row async for row in _paged_rows_async(_AsyncPager(), limiter)]
+
+    limiter = _CountingLimiter()
+    assert asyncio.run(_rows()) == [1, 2]
+    assert limiter.tokens == 1
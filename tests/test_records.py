@@ -0,0 +1,88 @@
+import pytest
+
+from bench.fake_ads import GoogleAdsRow
+from packages.google_ads_kpi.records import (
+    Collect,
+    Count,
+    First,
+    attribute_names,
+    fold,
+    project,
+    record_type,
+)
+
+FIELDS = (
+    "conversion_action.name",
+    "conversion_action.type",
+    "conversion_action.value_settings.default_value",
+    "metrics.all_conversions",
+)
+
+
+def _row(name, type_, value, conversions):
+    row = GoogleAdsRow()
+    row.conversion_action.name = name
+    row.conversion_action.type_ = type_
+    row.conversion_action.value_settings.default_value = value
+    row.metrics.all_conversions = conversions
+    return row
+
+
+def test_attribute_names_drop_the_resource():
+    assert attribute_names(FIELDS) == (
+        "name", "type", "value_settings_default_value", "metrics_all_conversions",
+    )
+    with pytest.raises(ValueError, match="duplicate"):
+        attribute_names(("campaign.a_b", "campaign.a.b"))
+
+
+def test_record_type_is_built_once_per_field_list():
+    assert record_type(FIELDS) is record_type(tuple(FIELDS))
+    assert record_type(FIELDS).__name__ == "ConversionActionRecord"
+
+
+def test_project_converts_values_once():
+    rows = [_row("Purchase", "WEBPAGE", 12.5, 3.0), _row("Call", "AD_CALL", 0.0, 1.0)]
+
+    first, second = project(rows, FIELDS)
+
+    assert (first.name, first.type, first.value_settings_default_value) == (
+        "Purchase", "WEBPAGE", 12.5,
+    )
+    assert second["conversion_action.type"] == "AD_CALL"
+    assert first.as_dict()["metrics.all_conversions"] == 3.0
+    with pytest.raises(AttributeError):
+        first.name = "other"
+
+
+def test_fold_aggregates_in_one_pass():
+    records = list(project(
+        [_row(f"a{i}", "WEBPAGE" if i % 2 else "AD_CALL", float(i), 0.0) for i in range(6)],
+        FIELDS,
+    ))
+    consumed = []
+
+    def _stream():
+        for rec in records:
+            consumed.append(rec)
+            yield rec
+
+    out = fold(
+        _stream(),
+        total=Count(),
+        calls=Count(lambda r: r.type == "AD_CALL"),
+        names=Collect(lambda r: r.name, where=lambda r: r.value_settings_default_value > 2),
+        two=Collect(lambda r: r.name, limit=2),
+        first_web=First(lambda r: r.name, where=lambda r: r.type == "WEBPAGE"),
+        missing=First(where=lambda r: False, default="none"),
+    )
+
+    assert consumed == records
+    assert out == {
+        "total": 6,
+        "calls": 3,
+        "names": ["a3", "a4", "a5"],
+        "two": ["a0", "a1"],
+        "first_web": "a1",
+        "missing": "none",
+    }
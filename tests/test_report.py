@@ -0,0 +1,35 @@
+import csv
+
+import pytest
+
+from packages.google_ads_kpi.report import open_table
+
+
+def test_csv_blanks_missing_values_and_serialises_lists(tmp_path):
+    path = tmp_path / "out.csv"
+    with open_table(path, ["a", "b"]) as out:
+        out.write({"a": 1, "b": ["x", "y"]})
+        out.write({"a": None})
+    with open(path, newline="", encoding="utf-8") as fh:
+        assert list(csv.reader(fh)) == [["a", "b"], ["1", '["x", "y"]'], ["", ""]]
+
+
+def test_parquet_column_empty_in_the_first_row_group(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "x.parquet"
+    with open_table(path, ["a", "b"], batch_size=2) as out:
+        for a, b in ((1, None), (2, None), (3, True)):
+            out.write({"a": a, "b": b})
+
+    table = pq.read_table(path)
+    assert table.column("a").to_pylist() == [1, 2, 3]
+    assert table.column("b").to_pylist() == [None, None, "True"]
+
+
+def test_parquet_rejects_values_that_do_not_fit_a_typed_column(tmp_path):
+    pytest.importorskip("pyarrow")
+    out = open_table(tmp_path / "x.parquet", ["a"], batch_size=1)
+    out.write({"a": True})
+    with pytest.raises(TypeError, match="'a'"):
+        out.write({"a": "maybe"})
+    out.close()
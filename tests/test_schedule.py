@@ -0,0 +1,88 @@
+import pytest
+
+from packages.google_ads_kpi.cache import read_json
+from packages.kpis.schedule import ALPHA, CACHE_NAME, DEFAULT_PRIOR, AccountSchedule, makespan
+
+
+def test_makespan_is_greedy_list_scheduling():
+    assert makespan([], 4) == 0.0
+    assert makespan([3, 3, 2, 2, 2], 2) == 7
+    assert makespan([1, 1, 2], 2) == 3             # input order matters
+    assert makespan([2, 1, 1], 2) == 2
+    assert makespan([5, 1], 0) == 6                # at least one worker
+
+
+def test_order_is_longest_expected_first_with_median_prior():
+    schedule = AccountSchedule({"a": 1.0, "b": 9.0, "c": 3.0})
+
+    assert schedule.prior() == 3.0
+    assert schedule.order(["a", "new", "b", "c"], workers=2) == ["b", "new", "c", "a"]
+    assert schedule.expected == makespan([9, 3, 3, 1], 2)
+    assert AccountSchedule().prior() == DEFAULT_PRIOR
+
+
+def test_save_folds_observations_into_the_ewma():
+    schedule = AccountSchedule({"a": 10.0})
+    schedule.order(["a", "b"])
+    schedule.observe("a", 20.0)
+    schedule.observe("b", 4.0)
+    schedule.save()
+    schedule.save()                                  # once per run
+
+    assert read_json(CACHE_NAME) == {"a": pytest.approx(ALPHA * 20 + (1 - ALPHA) * 10), "b": 4.0}
+    assert AccountSchedule.load().durations["b"] == 4.0
+
+
+def test_report_compares_with_the_lower_bound():
+    schedule = AccountSchedule()
+    assert schedule.report() == {}
+    schedule.order(["a", "b", "c"], workers=2)
+    for cid, seconds in (("a", 4.0), ("b", 1.0), ("c", 1.0)):
+        schedule.observe(cid, seconds)
+
+    report = schedule.report()
+    assert report["accounts"] == 3 and report["workers"] == 2
+    assert report["lower_bound_s"] == 4.0
+
+
+def test_only_accounts_that_sent_queries_are_timed(client, tmp_path):
+    from packages.kpis.breaker import BREAKER
+    from packages.kpis.scan import scan_accounts
+    from packages.kpis.spec import compile_plan
+    from packages.kpis.store import ResultStore
+    from packages.kpis.tracking import KPI_SPECS
+
+    plan = compile_plan(KPI_SPECS)
+    leaves = {cid: cid for cid in client.leaf_cids()}
+    dead, *alive = leaves
+    BREAKER.record(dead, client.account_exception())
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+
+    def _run():
+        schedule = AccountSchedule(name="test_durations")
+        schedule.order(leaves)
+        list(scan_accounts(client, plan, leaves, store=store, ttl=3600, schedule=schedule))
+        return schedule
+
+    first = _run()
+    assert sorted(first._observed) == sorted(alive)      # breaker skip: not timed
+    second = _run()                                      # every KPI from the store
+    assert second._observed == {} and second.finished is not None
+    store.close()
+
+
+def test_closing_a_scheduled_scan_cancels_accounts_not_started():
+    from bench.fake_ads import FakeAdsConfig, FakeGoogleAdsClient
+    from packages.kpis.scan import scan_accounts
+    from packages.kpis.spec import compile_plan
+    from packages.kpis.tracking import KPI_SPECS
+
+    client = FakeGoogleAdsClient(FakeAdsConfig(accounts=40, sub_managers=2, latency=0.01))
+    leaves = {cid: cid for cid in client.leaf_cids()}
+    schedule = AccountSchedule(name="test_durations")
+
+    rows = scan_accounts(client, compile_plan(KPI_SPECS), leaves, workers=2, schedule=schedule)
+    next(rows)
+    rows.close()
+
+    assert client.stats.calls["customer"] <= 4           # not all 40 accounts
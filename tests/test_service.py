@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from packages.kpis import service as service_module
+from packages.kpis.service import KpiService, fetch_kpis, make_server
+from packages.kpis.spec import compile_plan
+from packages.kpis.tracking import KPI_SPECS
+
+PLAN = compile_plan(KPI_SPECS)
+CALLERS = 16
+
+
+def _gated(monkeypatch, outcome):
+    """Replace execute_plan with one that blocks until released, then returns
+    or raises `outcome`; returns (calls, release)."""
+    calls, release = [], threading.Event()
+
+    def execute_plan(plan, client, customer_id):
+        calls.append(customer_id)
+        assert release.wait(5)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return dict(outcome)
+
+    monkeypatch.setattr(service_module, "execute_plan", execute_plan)
+    return calls, release
+
+
+def _ask_concurrently(service, customer_id, release):
+    """CALLERS threads get `customer_id`; released once all but the leader
+    joined the computation. Returns each caller's (source, row) or exception."""
+    outcomes, lock = [], threading.Lock()
+
+    def ask():
+        try:
+            row, source, _ = service.get(customer_id)
+            outcome = (source, row)
+        except Exception as exc:
+            outcome = exc
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=ask) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while service.stats()["shared"] < CALLERS - 1 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_concurrent_requests_share_one_computation(monkeypatch):
+    calls, release = _gated(monkeypatch, {"customer_id": "1", "kpi": 42})
+    service = KpiService(None, PLAN)
+
+    outcomes = _ask_concurrently(service, "1", release)
+
+    assert calls == ["1"]
+    assert sorted(source for source, _ in outcomes) == ["computed"] + ["shared"] * (CALLERS - 1)
+    assert all(row == {"customer_id": "1", "kpi": 42} for _, row in outcomes)
+    assert service.get("1")[1] == "cache"
+    assert service.stats()["in_flight"] == 0
+
+
+def test_followers_get_the_leaders_error_and_it_is_not_cached(monkeypatch):
+    boom = RuntimeError("upstream down")
+    calls, release = _gated(monkeypatch, boom)
+    service = KpiService(None, PLAN)
+
+    outcomes = _ask_concurrently(service, "1", release)
+
+    assert calls == ["1"]
+    assert outcomes == [boom] * CALLERS
+    stats = service.stats()
+    assert stats["errors"] == 1 and stats["cached"] == 0 and stats["in_flight"] == 0
+
+    with pytest.raises(RuntimeError):
+        service.get("1")                                  # retried, not replayed
+    assert calls == ["1", "1"]
+
+
+def test_http_round_trip_on_the_fake(client):
+    cid = client.leaf_cids()[0]
+    service = KpiService(client, PLAN)
+    server = make_server(service, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        row = fetch_kpis(url, cid)
+        assert row["customer_id"] == cid
+        assert fetch_kpis(url, cid) == row and service.stats()["hits"] == 1
+        with pytest.raises(RuntimeError, match="not a customer ID"):
+            fetch_kpis(url, "abc")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,83 @@
+import csv
+
+import pytest
+
+from packages.kpis.shard import (
+    PartialWriter,
+    merge_partials,
+    parse_shard,
+    partial_path,
+    shard_leaves,
+    shard_of,
+)
+
+LEAVES = {str(3000000000 + i): f"Account {i}" for i in range(25)}
+COLUMNS = ("customer_id", "account_name", "value")
+
+
+def _write_shards(directory, shards, leaves=LEAVES, skip=()):
+    for index in range(shards):
+        if index in skip:
+            continue
+        with PartialWriter(partial_path(directory, index, shards), COLUMNS, leaves, index, shards) as out:
+            for cid, name in shard_leaves(leaves, index, shards).items():
+                out.write({"customer_id": cid, "account_name": name, "value": int(cid) % 7})
+
+
+def test_shards_partition_the_accounts():
+    parts = [shard_leaves(LEAVES, i, 4) for i in range(4)]
+    assert sorted(cid for part in parts for cid in part) == sorted(LEAVES)
+    assert shard_of("3000000007", 4) == shard_of("3000000007", 4)
+
+
+@pytest.mark.parametrize("spec", ["3", "4/4", "-1/4", "a/b"])
+def test_parse_shard_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_shard(spec)
+
+
+def test_merge_restores_the_input_order(tmp_path):
+    _write_shards(tmp_path, 3)
+    output = tmp_path / "merged.csv"
+
+    assert merge_partials(str(tmp_path), str(output)) == len(LEAVES)
+
+    with open(output, newline="", encoding="utf-8") as fh:
+        rows = list(csv.DictReader(fh))
+    assert [r["customer_id"] for r in rows] == list(LEAVES)
+
+
+def test_missing_or_mismatched_shards_are_refused(tmp_path):
+    _write_shards(tmp_path, 3, skip={1})
+    with pytest.raises(ValueError, match="missing"):
+        merge_partials(str(tmp_path), str(tmp_path / "out.csv"))
+
+    other = {**LEAVES, "3999999999": "Late account"}
+    _write_shards(tmp_path, 3, leaves=other, skip={0, 2})
+    with pytest.raises(ValueError, match="different account lists"):
+        merge_partials(str(tmp_path), str(tmp_path / "out.csv"))
+
+
+def test_incomplete_shard_is_not_published(tmp_path):
+    path = partial_path(tmp_path, 0, 2)
+    with pytest.raises(ValueError, match="expected"):
+        with PartialWriter(path, COLUMNS, LEAVES, 0, 2):
+            pass
+    assert not (tmp_path / path).exists()
+    assert not list(tmp_path.iterdir())
+
+
+def test_short_merge_leaves_the_output_untouched(tmp_path):
+    _write_shards(tmp_path, 2)
+    part = partial_path(tmp_path, 1, 2)
+    with open(part, encoding="utf-8") as fh:
+        lines = fh.readlines()
+    with open(part, "w", encoding="utf-8") as fh:
+        fh.writelines(lines[:-1])                          # lose a row
+    output = tmp_path / "out.csv"
+    output.write_text("previous report\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="expected"):
+        merge_partials(str(tmp_path), str(output))
+    assert output.read_text(encoding="utf-8") == "previous report\n"
+    assert not list(tmp_path.glob("*.tmp*"))
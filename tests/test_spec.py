@@ -0,0 +1,108 @@
+import pytest
+
+from packages.google_ads_kpi.gaql import GaqlError
+from packages.kpis.scan import scan_accounts, scan_columns
+from packages.kpis.spec import (
+    KpiSpec,
+    compile_plan,
+    evaluate_plan,
+    execute_plan,
+    merge_results,
+    subplan,
+)
+from packages.kpis.tracking import KPI_SPECS
+
+
+def _boom(customer_id, rows):
+    raise RuntimeError("boom")
+
+
+BROKEN = KpiSpec(
+    name="broken",
+    resource="campaign",
+    fields=("campaign.id",),
+    columns=("broken_value",),
+    evaluate=_boom,
+)
+
+
+def test_specs_on_one_resource_fuse_into_one_query():
+    plan = compile_plan(KPI_SPECS)
+
+    assert [q.resource for q in plan.queries] == [
+        "conversion_action", "customer", "offline_user_data_job",
+    ]
+    fused = plan.queries[0]
+    assert len(fused.specs) == 5
+    assert len(set(fused.fields)) == len(fused.fields)
+    customer = plan.queries[1]
+    assert customer.fields == (
+        "customer.conversion_tracking_setting.enhanced_conversions_for_leads_enabled",
+        "customer.auto_tagging_enabled",
+    )
+    assert "LIMIT 1" in customer.gaql
+
+
+def test_columns_follow_spec_order():
+    plan = compile_plan(KPI_SPECS)
+    expected = ["customer_id"]
+    for spec in KPI_SPECS:
+        expected += [c for c in spec.columns if c not in expected]
+    assert list(plan.columns) == expected
+    assert scan_columns(plan)[:2] == ("customer_id", "account_name")
+
+
+def test_duplicate_names_are_rejected():
+    with pytest.raises(ValueError, match="duplicate"):
+        compile_plan([BROKEN, BROKEN])
+
+
+def test_malformed_clauses_fail_at_compile_time():
+    bad = KpiSpec("bad", "campaign", ("campaign.id",), ("x",), _boom, clauses="WHERE")
+    with pytest.raises(GaqlError):
+        compile_plan([bad])
+
+
+def test_subplan_keeps_only_named_kpis():
+    plan = compile_plan(KPI_SPECS)
+    sub = subplan(plan, ["auto_tagging"])
+    assert [s.name for s in sub.specs] == ["auto_tagging"]
+    assert sub.queries[0].fields == ("customer.auto_tagging_enabled",)
+
+
+def test_execute_plan_fills_every_column(client):
+    plan = compile_plan(KPI_SPECS)
+    cid = client.leaf_cids()[0]
+
+    row = execute_plan(plan, client, cid)
+
+    assert list(row) == list(plan.columns)
+    assert row["customer_id"] == cid
+    assert row["offline_jobs_checked"] == 20
+    assert sum(client.stats.calls.values()) == len(plan.queries)
+
+
+def test_failing_query_only_fails_its_own_specs(client):
+    plan = compile_plan([*KPI_SPECS, BROKEN])
+    cid = client.leaf_cids()[0]
+
+    results, errors = evaluate_plan(plan, client, cid)
+
+    assert set(errors) == {"broken"}
+    assert set(results) == {s.name for s in KPI_SPECS}
+    assert "broken_value" not in merge_results(plan, results)
+    with pytest.raises(RuntimeError, match="boom"):
+        execute_plan(plan, client, cid)
+
+
+def test_scan_keeps_partial_results_in_input_order(client, capsys):
+    plan = compile_plan([*KPI_SPECS, BROKEN])
+    leaves = {cid: f"Account {cid}" for cid in reversed(client.leaf_cids())}
+
+    rows = list(scan_accounts(client, plan, leaves, workers=3))
+
+    assert [r["customer_id"] for r in rows] == list(leaves)
+    for row in rows:
+        assert row["offline_jobs_checked"] == 20
+        assert "broken_value" not in row
+    assert capsys.readouterr().out.count("… FAIL boom") == len(leaves)
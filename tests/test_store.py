@@ -0,0 +1,101 @@
+import sqlite3
+import threading
+import time
+from dataclasses import replace
+
+from packages.kpis.spec import compile_plan, plan_fingerprints
+from packages.kpis.store import SCHEMA_VERSION, ResultStore
+from packages.kpis.tracking import KPI_SPECS
+
+
+def _age(path, seconds: float) -> None:
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE kpi_results SET computed_at = computed_at - ?", (seconds,))
+
+
+def test_saved_results_are_fresh_until_the_ttl(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    store = ResultStore(path)
+    store.save("1", {"a": {"x": 1}, "b": {"y": [2]}}, errors={"c": RuntimeError("boom")})
+
+    assert store.fresh("1") == {"a": {"x": 1}, "b": {"y": [2]}}   # failures are not
+    assert store.fresh("1", ttl=60) == store.fresh("1")
+    assert store.fresh("2") == {}
+
+    _age(path, 120)
+    assert store.fresh("1", ttl=60) == {}
+    assert store.fresh("1") == {"a": {"x": 1}, "b": {"y": [2]}}   # no ttl: any age
+
+    store.save("1", {}, errors={"a": RuntimeError("later")})
+    assert store.fresh("1") == {"b": {"y": [2]}}                  # failure replaces
+    store.close()
+
+
+def test_changed_kpi_definition_invalidates_its_results(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    store = ResultStore(path, fingerprints={"a": "v1", "b": "v1"})
+    store.save("1", {"a": {"x": 1}, "b": {"y": 2}})
+    store.close()
+
+    store = ResultStore(path, fingerprints={"a": "v2", "b": "v1"})
+    assert store.fresh("1") == {"b": {"y": 2}}
+    assert ResultStore(path).fresh("1") == {}                     # unfingerprinted
+    store.close()
+
+
+def test_plan_fingerprints_follow_the_spec():
+    spec = KPI_SPECS[0]
+    before = plan_fingerprints(compile_plan([spec]))
+    assert before == plan_fingerprints(compile_plan([spec]))      # stable
+
+    changed = replace(spec, clauses=spec.clauses + " LIMIT 1")
+    assert plan_fingerprints(compile_plan([changed])) != before
+    assert len(set(plan_fingerprints(compile_plan(KPI_SPECS)).values())) == len(KPI_SPECS)
+
+
+def test_store_written_with_an_older_schema_is_emptied(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE kpi_results (customer_id TEXT, kpi TEXT, computed_at REAL, "
+            "status TEXT, payload TEXT, error TEXT, PRIMARY KEY (customer_id, kpi))"
+        )
+        conn.execute(
+            "INSERT INTO kpi_results VALUES ('1', 'a', ?, 'ok', '{}', NULL)", (time.time(),)
+        )
+
+    store = ResultStore(path)
+    assert store.fresh("1") == {}
+    store.save("1", {"a": {"x": 1}})
+    assert store.fresh("1") == {"a": {"x": 1}}
+    store.close()
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert ResultStore(path).fresh("1") == {"a": {"x": 1}}        # current: kept
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    shared, other = ResultStore(path), ResultStore(path)          # e.g. two shards
+
+    def write(store, prefix):
+        for i in range(50):
+            store.save(f"{prefix}{i}", {"a": {"i": i}}, errors={"b": RuntimeError(str(i))})
+
+    threads = [
+        threading.Thread(target=write, args=(store, prefix))
+        for store, prefix in ((shared, "s"), (shared, "t"), (other, "o"))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for prefix in "sto":
+        for i in range(50):
+            assert shared.fresh(f"{prefix}{i}") == {"a": {"i": i}}
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM kpi_results").fetchone()[0] == 300
+    shared.close()
+    other.close()
@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.api_core.retry import Retry
+
+from packages.google_ads_kpi.aio import hedged_async
+from packages.google_ads_kpi.query import call_timeout
+from packages.google_ads_kpi.timeouts import (
+    MIN_SAMPLES,
+    POLICY,
+    RUN_DEADLINE,
+    TIMEOUT_FLOOR,
+    RunDeadlineExceeded,
+    TimeoutPolicy,
+    hedged,
+)
+
+
+def _slow_then_fast(first_delay: float):
+    """A call whose first attempt takes `first_delay` s; later ones return at once."""
+    attempts, lock = [], threading.Lock()
+
+    def call():
+        with lock:
+            attempts.append(1)
+            n = len(attempts)
+        if n == 1:
+            time.sleep(first_delay)
+        return n
+
+    return call, attempts
+
+
+# ── hedged (blocking) ────────────────────────────────────────────────────────
+def test_fast_call_is_not_hedged():
+    policy = TimeoutPolicy(hedge=True)
+    call, attempts = _slow_then_fast(0.0)
+
+    assert hedged(call, 0.5, policy=policy) == 1
+    assert len(attempts) == 1 and policy.hedges == 0
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    policy, tokens = TimeoutPolicy(hedge=True), []
+    call, attempts = _slow_then_fast(1.0)
+
+    start = time.perf_counter()
+    assert hedged(call, 0.05, before_hedge=lambda: tokens.append(1), policy=policy) == 2
+    assert time.perf_counter() - start < 0.5               # did not wait for the loser
+    assert len(attempts) == 2 and tokens == [1]
+    assert policy.hedges == 1 and policy.hedge_wins == 1
+
+
+def test_failed_attempt_falls_back_to_the_other():
+    policy = TimeoutPolicy(hedge=True)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            time.sleep(0.1)
+            raise RuntimeError("primary failed")
+        time.sleep(0.2)
+        return "hedge"
+
+    assert hedged(call, 0.05, policy=policy) == "hedge"
+
+    def always_fails():
+        time.sleep(0.1)
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError, match="down"):
+        hedged(always_fails, 0.05, policy=policy)
+
+
+def test_calls_in_flight_are_not_capped_by_the_pool():
+    barrier = threading.Barrier(100, timeout=5)
+
+    def call():
+        barrier.wait()                                     # all 100 must run at once
+        return "ok"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(hedged(call, 10.0)))
+        for _ in range(100)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["ok"] * 100
+
+
+# ── hedged_async ─────────────────────────────────────────────────────────────
+def test_async_hedge_wins_and_the_loser_is_cancelled():
+    policy, cancelled = TimeoutPolicy(hedge=True), []
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        n = len(attempts)
+        try:
+            await asyncio.sleep(1.0 if n == 1 else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return n
+
+    async def main():
+        result = await hedged_async(call, 0.05, policy=policy)
+        await asyncio.sleep(0)                             # let the cancellation land
+        return result
+
+    assert asyncio.run(main()) == 2
+    assert cancelled == [1]
+    assert policy.hedges == 1 and policy.hedge_wins == 1
+
+
+def test_async_fast_call_is_not_hedged():
+    policy = TimeoutPolicy(hedge=True)
+
+    async def call():
+        return "ok"
+
+    assert asyncio.run(hedged_async(call, 0.5, policy=policy)) == "ok"
+    assert policy.hedges == 0
+
+
+def test_cancelling_the_caller_cancels_both_attempts():
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        task = asyncio.ensure_future(hedged_async(call, 0.01, policy=TimeoutPolicy(hedge=True)))
+        await asyncio.sleep(0.1)                           # primary and hedge running
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert len(cancelled) == 2
+
+
+# ── run deadline ─────────────────────────────────────────────────────────────
+def test_retry_budget_is_cut_to_the_deadline():
+    retry = Retry(timeout=60.0)
+    assert RUN_DEADLINE.cap_retry(retry) is retry          # no deadline: unchanged
+
+    RUN_DEADLINE.start(5.0)
+    assert 4.0 < RUN_DEADLINE.cap_retry(retry).timeout <= 5.0
+    assert RUN_DEADLINE.cap_retry(None) is None
+
+    RUN_DEADLINE.start(-1.0)
+    with pytest.raises(RunDeadlineExceeded):
+        RUN_DEADLINE.cap_retry(retry)
+
+
+# ── adaptive timeouts ────────────────────────────────────────────────────────
+def test_call_timeout_adapts_to_the_shape_p99():
+    shape = "conversion_action:test"
+    assert call_timeout(shape, None, 15.0) == 15.0         # too few samples yet
+
+    for _ in range(MIN_SAMPLES):
+        POLICY.observe(shape, 0.1)
+    assert call_timeout(shape, None, 15.0) == TIMEOUT_FLOOR
+
+    for _ in range(MIN_SAMPLES):
+        POLICY.observe(shape, 2.0)
+    assert call_timeout(shape, None, 15.0) == pytest.approx(6.0)
+    assert call_timeout(shape, None, 4.0) == 4.0           # never above the default
+    assert call_timeout(shape, 30.0, 15.0) == 30.0         # the caller's own timeout
+
+
+def test_call_timeout_is_cut_to_the_deadline_then_fails_fast():
+    RUN_DEADLINE.start(1.0)
+    assert call_timeout("customer:test", None, 15.0) <= 1.0
+    assert call_timeout("customer:test", 30.0, 15.0) <= 1.0
+
+    RUN_DEADLINE.start(-1.0)
+    with pytest.raises(RunDeadlineExceeded):
+        call_timeout("customer:test", None, 15.0)
@@ -0,0 +1,88 @@
+import importlib
+
+import pytest
+
+from bench.fake_ads import VERSION, GoogleAdsRow
+from packages.google_ads_kpi.records import project
+from packages.kpis.tracking import (
+    CALL_TRACKING,
+    LAST_CLICK_PRESENT,
+    STORE_VISITS,
+    _CONVERSION_ACTION_FIELDS,
+)
+from packages.kpis.vectorized import evaluate_frame, load_conversion_actions
+
+CID = "1234567890"
+
+
+def _enum(module, name):
+    enums = importlib.import_module(f"google.ads.googleads.{VERSION}.enums.types.{module}")
+    return getattr(getattr(enums, f"{name}Enum"), name)
+
+
+Model = _enum("attribution_model", "AttributionModel")
+Type = _enum("conversion_action_type", "ConversionActionType")
+Status = _enum("conversion_action_status", "ConversionActionStatus")
+
+
+def _action(name, type_=Type.WEBPAGE, model=Model.GOOGLE_SEARCH_ATTRIBUTION_DATA_DRIVEN,
+            status=Status.ENABLED):
+    row = GoogleAdsRow()
+    ca = row.conversion_action
+    ca.name, ca.type_, ca.status = name, type_, status
+    ca.attribution_model_settings.attribution_model = model
+    return row
+
+
+ROWS = [
+    _action("Purchase"),
+    _action("Last click", model=Model.GOOGLE_ADS_LAST_CLICK),
+    _action("Old last click", model=Model.GOOGLE_ADS_LAST_CLICK, status=Status.REMOVED),
+    _action("Calls from ads", Type.AD_CALL),
+    _action("Website calls", Type.WEBSITE_CALL),
+    _action("Smart campaign calls", Type.SMART_CAMPAIGN_TRACKED_CALLS),
+    _action("Store visits", Type.STORE_VISITS),
+    _action("Store sales", Type.STORE_SALES),
+]
+
+
+class _Service:
+    def search(self, customer_id, query, **kwargs):
+        return iter(ROWS)
+
+
+class _Client:
+    def get_service(self, name, **kwargs):
+        return _Service()
+
+
+def _evaluate(spec):
+    return spec.evaluate(CID, list(project(ROWS, _CONVERSION_ACTION_FIELDS)))
+
+
+@pytest.fixture(scope="module")
+def vectorized():
+    frame, failed = load_conversion_actions(_Client(), [CID])
+    assert not failed
+    return evaluate_frame(frame, [CID])[CID]
+
+
+def test_last_click_matches_the_google_ads_last_click_model(vectorized):
+    result = _evaluate(LAST_CLICK_PRESENT)
+    assert result["has_last_click_goals"] is True
+    assert result["last_click_list"] == "Last click"
+    assert vectorized[LAST_CLICK_PRESENT.name] == result
+
+
+def test_call_tracking_matches_every_call_conversion_type(vectorized):
+    result = _evaluate(CALL_TRACKING)
+    assert result["call_tracking_present"] is True
+    assert result["call_goal_list"] == "Calls from ads, Website calls, Smart campaign calls"
+    assert vectorized[CALL_TRACKING.name] == result
+
+
+def test_store_visits_matches_store_visits_not_store_sales(vectorized):
+    result = _evaluate(STORE_VISITS)
+    assert result["store_visits_present"] is True
+    assert result["store_visit_list"] == "Store visits"
+    assert vectorized[STORE_VISITS.name] == result
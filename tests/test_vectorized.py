@@ -0,0 +1,63 @@
+import time
+
+from packages.google_ads_kpi.cache import read_json, write_json
+from packages.kpis.breaker import BREAKER, CACHE_NAME
+from packages.kpis.scan import scan_accounts
+from packages.kpis.spec import compile_plan, subplan
+from packages.kpis.store import ResultStore
+from packages.kpis.tracking import KPI_SPECS
+from packages.kpis.vectorized import VECTORIZED_KPIS, scan_accounts_vectorized
+
+PLAN = compile_plan(KPI_SPECS)
+
+
+def _leaves(client):
+    return {cid: f"Account {cid}" for cid in client.leaf_cids()}
+
+
+def test_same_rows_as_the_row_by_row_scan(client):
+    leaves = _leaves(client)
+    assert list(scan_accounts_vectorized(client, PLAN, leaves, workers=3)) == list(
+        scan_accounts(client, PLAN, leaves, workers=3)
+    )
+
+
+def test_fresh_stored_results_are_not_loaded_again(client, tmp_path):
+    leaves = _leaves(client)
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    first = list(scan_accounts_vectorized(client, PLAN, leaves, store=store, ttl=3600))
+    calls = dict(client.stats.calls)
+
+    second = list(scan_accounts_vectorized(client, PLAN, leaves, store=store, ttl=3600))
+
+    assert second == first
+    assert client.stats.calls == calls                    # every KPI from the store
+    store.close()
+
+
+def test_open_circuits_are_not_loaded(client):
+    leaves = _leaves(client)
+    dead, *alive = leaves
+    BREAKER.record(dead, client.account_exception())
+
+    rows = list(scan_accounts_vectorized(client, PLAN, leaves))
+
+    assert client.stats.calls["conversion_action"] == len(alive)
+    assert "enabled_actions" not in rows[0]
+    assert all("enabled_actions" in row for row in rows[1:])
+
+
+def test_expired_dead_account_is_probed_and_cleared(client):
+    cid = client.leaf_cids()[0]
+    BREAKER.record(cid, client.account_exception())
+    entries = read_json(CACHE_NAME)
+    entries[cid]["at"] = time.time() - 2 * BREAKER.ttl
+    write_json(CACHE_NAME, entries)
+    BREAKER.reset()
+
+    only_vectorized = subplan(PLAN, VECTORIZED_KPIS)        # the load is the only query
+    (row,) = scan_accounts_vectorized(client, only_vectorized, {cid: "revived"})
+
+    assert "enabled_actions" in row
+    assert BREAKER.stats()["probes"] == 1
+    assert cid not in read_json(CACHE_NAME)